@@ -0,0 +1,352 @@
+"""Serve the read-heavy user and message endpoints on asyncio, under uvicorn.
+
+A request waiting on the database here yields to others instead of holding a worker
+thread, so one process can keep many more inbox reads in flight than the gunicorn
+workers.  It runs alongside the Flask app rather than replacing it: point it at the
+same DATABASE_URL, which must be a database file and should be an absolute path,
+and route these endpoints to it.
+
+The Flask app owns the database: it migrates it and runs the background purges, so
+start it first.  This one only connects, on lifespan startup, and refuses to start
+on a database that is not migrated.  Messages are sent by the Flask handler, in a
+thread, so a send takes the same repository path, group commit included.  Streams
+are served by the gunicorn workers, though, whose inbox hubs are in other processes:
+they only hear of a message sent here when they next read the inbox.  Users are read
+from the database every time, as the user cache of the Flask workers never hears of
+changes made here or by the other workers.
+
+    GET  /users
+    GET  /user/<id>
+    GET  /user/<id>/messages
+    POST /user/<id>/messages
+
+Requests and responses are the same as in the Flask app, validated with the same
+schemas, except that there are no entity tags.  It needs the async extra:
+pip install aloysius_parker[async].
+"""
+
+import argparse
+import asyncio
+import json
+import re
+from http import HTTPStatus
+from typing import Any, Callable
+from urllib.parse import parse_qsl
+
+from flask import Flask
+from marshmallow import EXCLUDE, Schema, ValidationError
+from sqlalchemy import URL, Engine, event, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from werkzeug.http import HTTP_STATUS_CODES
+
+from aloysius_parker.config import database as database_config
+from aloysius_parker.config.json_provider import dumps_bytes
+from aloysius_parker.database import migrations
+from aloysius_parker.database.async_user_repository import AsyncUserRepository
+from aloysius_parker.database.db import database
+from aloysius_parker.handler import user as user_handler
+from aloysius_parker.models.cursor import encode_cursor
+from aloysius_parker.models.message import GetMessageSchemaArguments, PostMessageSchema
+from aloysius_parker.models.user import GetUsersSchemaArguments
+
+try:
+    import uvicorn
+except ImportError:  # pragma: no cover - uvicorn is only needed to serve
+    uvicorn = None
+
+DEFAULT_BIND: str = "0.0.0.0:5002"
+DEFAULT_LIMIT: int = 50
+
+Response = tuple[Any, HTTPStatus, dict[str, str]]
+
+
+class Request:
+    """The parts of an HTTP request the handlers use."""
+
+    def __init__(self, scope: dict, body: bytes, path_args: dict[str, str]):
+        """Pick the query string and path arguments out of the ASGI scope."""
+        self.query: dict[str, str] = dict(parse_qsl(scope["query_string"].decode()))
+        self.body: bytes = body
+        self.path_args: dict[str, str] = path_args
+
+    def load(self, schema: Schema, location: str) -> dict:
+        """Load the query or JSON body with the schema, as flask-smorest would."""
+        if location == "query":
+            return schema.load(self.query, unknown=EXCLUDE)
+
+        try:
+            data: Any = json.loads(self.body or b"{}")
+        except ValueError as e:
+            raise ValidationError({"_schema": ["Invalid JSON body."]}) from e
+        return schema.load(data)
+
+
+def async_url(url: str) -> URL:
+    """Return the URL with the asyncio driver for SQLite, aiosqlite."""
+    parsed: URL = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite")
+
+    return parsed
+
+
+def create_engine(url: str) -> AsyncEngine:
+    """Create an asyncio engine set up as the Flask app sets up its own."""
+    engine: AsyncEngine = create_async_engine(
+        async_url(url), **database_config.engine_options()
+    )
+    if database_config.is_sqlite_file(engine):
+        event.listen(
+            engine.sync_engine,
+            "connect",
+            database_config.pragma_listener(database_config.SQLITE_PRAGMAS),
+        )
+    return engine
+
+
+class AsyncApp:
+    """ASGI application routing requests to the asyncio handlers."""
+
+    def __init__(self, flask_factory: Callable[[], Flask] | None = None):
+        """Define how to create the Flask app, which is done on startup."""
+        self.flask_factory: Callable[[], Flask] = flask_factory or create_flask_app
+        self.flask_api: Flask | None = None
+        self.engine: AsyncEngine | None = None
+        self.users: AsyncUserRepository | None = None
+        self.routes: list[tuple[str, re.Pattern, Callable]] = [
+            ("GET", re.compile(r"/users"), self.get_users),
+            ("GET", re.compile(r"/user/(?P<user_id>[^/]+)"), self.get_user),
+            (
+                "GET",
+                re.compile(r"/user/(?P<user_id>[^/]+)/messages"),
+                self.get_user_messages,
+            ),
+            (
+                "POST",
+                re.compile(r"/user/(?P<user_id>[^/]+)/messages"),
+                self.send_user_message,
+            ),
+        ]
+
+    async def startup(self) -> None:
+        """Create the Flask app and connect to its database, if it is migrated."""
+        self.flask_api = await asyncio.to_thread(self.flask_factory)
+        with self.flask_api.app_context():
+            flask_engine: Engine = database.engine
+        if database_config.is_in_memory(flask_engine.url):
+            raise ValueError("The asyncio app needs a database file in DATABASE_URL")
+        with flask_engine.connect() as connection:
+            if not migrations.is_up_to_date(connection):
+                raise ValueError("Migrate the database, or start the Flask app, first")
+
+        self.engine = create_engine(
+            flask_engine.url.render_as_string(hide_password=False)
+        )
+        self.users = AsyncUserRepository(
+            async_sessionmaker(self.engine, expire_on_commit=False)
+        )
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        """Handle an ASGI lifespan or HTTP event."""
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+
+        body: bytes = b""
+        more_body: bool = True
+        while more_body:
+            message: dict = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        if self.users is None:
+            data, status, headers = _error(HTTPStatus.SERVICE_UNAVAILABLE)
+        else:
+            data, status, headers = await self._dispatch(scope, body)
+        content: bytes = b"" if status == HTTPStatus.NO_CONTENT else dumps_bytes(data)
+        raw_headers: list[tuple[bytes, bytes]] = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(content)).encode()),
+        ] + [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+        await send(
+            {
+                "type": "http.response.start",
+                "status": int(status),
+                "headers": raw_headers,
+            }
+        )
+        await send({"type": "http.response.body", "body": content})
+
+    async def _lifespan(self, receive: Callable, send: Callable) -> None:
+        """Connect to the database on startup and close its connections on shutdown."""
+        while True:
+            message: dict = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:  # reported to the server, which stops
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.engine is not None:
+                    await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _dispatch(self, scope: dict, body: bytes) -> Response:
+        """Route the request to its handler, turning schema errors into a 422."""
+        path_found: bool = False
+        for method, pattern, handler in self.routes:
+            if not (match := pattern.fullmatch(scope["path"])):
+                continue
+
+            path_found = True
+            if method == scope["method"]:
+                try:
+                    return await handler(Request(scope, body, match.groupdict()))
+                except ValidationError as e:
+                    location: str = "query" if method == "GET" else "json"
+                    return _error(
+                        HTTPStatus.UNPROCESSABLE_ENTITY, {location: e.messages}
+                    )
+
+        if path_found:
+            return _error(HTTPStatus.METHOD_NOT_ALLOWED)
+        return _error(HTTPStatus.NOT_FOUND)
+
+    async def get_users(self, request: Request) -> Response:
+        """Retrieve a page of users, with the next cursor in X-Pagination."""
+        args: dict = request.load(GetUsersSchemaArguments(), "query")
+        limit: int = args.get("limit", DEFAULT_LIMIT)
+        cursor: tuple[str] | None = args.get("cursor")
+        if not (users := await self.users.get_users(limit + 1, cursor and cursor[0])):
+            return "", HTTPStatus.NO_CONTENT, {}
+
+        next_cursor: str | None = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = encode_cursor(users[-1].id)
+
+        return users, HTTPStatus.OK, _pagination(next_cursor)
+
+    async def get_user(self, request: Request) -> Response:
+        """Retrieve user information based on id."""
+        if not (user := await self.users.get_user(request.path_args["user_id"])):
+            return {"error": "user not found"}, HTTPStatus.NOT_FOUND, {}
+
+        return user, HTTPStatus.OK, {}
+
+    async def get_user_messages(self, request: Request) -> Response:
+        """Retrieve a page of messages for a user, as the Flask handler does."""
+        user_id: str = request.path_args["user_id"]
+        args: dict = request.load(GetMessageSchemaArguments(), "query")
+        limit: int = args.get("limit", DEFAULT_LIMIT)
+
+        # Fetch one extra message to find out whether there is another page.
+        if "q" in args:
+            if not await self.users.get_user(user_id):
+                return {"error": "user not found"}, HTTPStatus.NOT_FOUND, {}
+            page: list[tuple[Any, float | str]] = await self.users.search_user_messages(
+                user_id, args["q"].split(), limit + 1, args.get("cursor")
+            )
+        else:
+            if not (
+                result := await self.users.get_user_messages(
+                    user_id,
+                    limit + 1,
+                    cursor=args.get("cursor"),
+                    before=args.get("before"),
+                    after=args.get("after"),
+                )
+            ):
+                return {"error": "user not found"}, HTTPStatus.NOT_FOUND, {}
+
+            page = [(message, message.timestamp.isoformat()) for message in result[1]]
+
+        if not page:
+            return "", HTTPStatus.NO_CONTENT, {}
+
+        next_cursor: str | None = None
+        if len(page) > limit:
+            page = page[:limit]
+            last_message, last_key = page[-1]
+            next_cursor = encode_cursor(last_key, last_message.id)
+
+        return (
+            [message for message, _ in page],
+            HTTPStatus.OK,
+            _pagination(next_cursor),
+        )
+
+    async def send_user_message(self, request: Request) -> Response:
+        """Send a new message to an existing user, through the Flask handler."""
+        data: dict = request.load(PostMessageSchema(), "json")
+        body, status = await asyncio.to_thread(
+            self._in_flask,
+            user_handler.send_user_message,
+            data["author_id"],
+            request.path_args["user_id"],
+            data["content"],
+        )
+        return body, status, {}
+
+    def _in_flask(self, handler: Callable, *args) -> Any:
+        """Call a Flask handler in the Flask app's context."""
+        with self.flask_api.app_context():
+            return handler(*args)
+
+
+def create_flask_app() -> Flask:
+    """Create a Flask app to send messages through, with no routes or background work.
+
+    Unlike main.create_app, it neither migrates the database nor purges messages,
+    which the Flask app does once for every process.
+    """
+    flask_api = Flask(__name__)
+    flask_api.config["MESSAGE_RETENTION"] = None
+    database_config.configure_database(flask_api)
+    return flask_api
+
+
+def _pagination(next_cursor: str | None) -> dict[str, str]:
+    """Return the X-Pagination header for a page."""
+    return {"X-Pagination": json.dumps({"next_cursor": next_cursor})}
+
+
+def _error(status: HTTPStatus, errors: dict | None = None) -> Response:
+    """Return an error body in the shape flask-smorest uses."""
+    body: dict = {"code": status.value, "status": HTTP_STATUS_CODES[status]}
+    if errors:
+        body["errors"] = errors
+    return body, status, {}
+
+
+def create_app() -> AsyncApp:
+    """Create the ASGI app for the database in DATABASE_URL."""
+    return AsyncApp()
+
+
+def main() -> None:
+    """Serve the asyncio endpoints with uvicorn."""
+    if uvicorn is None:
+        raise SystemExit("uvicorn is needed: pip install aloysius_parker[async]")
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--bind", default=DEFAULT_BIND, help="host:port")
+    parser.add_argument("--workers", type=int, default=1)
+    arguments = parser.parse_args()
+
+    host, port = arguments.bind.rsplit(":", 1)
+    uvicorn.run(
+        "aloysius_parker.asgi:create_app",
+        factory=True,
+        host=host,
+        port=int(port),
+        workers=arguments.workers,
+        lifespan="on",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Handle requests to /admin/ endpoints."""
+
+from http import HTTPStatus
+
+import flask
+import flask_smorest
+from flask import views
+
+from aloysius_parker.handler import admin
+from aloysius_parker.models.admin import ProfilingSchema
+
+SMOREST_ADMIN_BLUEPRINT = flask_smorest.Blueprint(
+    "admin", __name__, description="Diagnostics for operators, behind ADMIN_TOKEN."
+)
+
+
+@SMOREST_ADMIN_BLUEPRINT.before_request
+def require_admin_token():
+    """Refuse requests without the admin token as a bearer token."""
+    return admin.check_token(flask.request.headers.get("Authorization"))
+
+
+@SMOREST_ADMIN_BLUEPRINT.route("/admin/slow-queries")
+class SlowQueriesEndpoint(views.MethodView):
+    """Define the endpoint for /admin/slow-queries.
+
+    This endpoint lists the most recent SQL statements slower than the threshold,
+    with their query plans.
+    """
+
+    @SMOREST_ADMIN_BLUEPRINT.response(HTTPStatus.OK)
+    def get(self):
+        """List the recent slow queries, the most recent first."""
+        return admin.get_slow_queries()
+
+
+@SMOREST_ADMIN_BLUEPRINT.route("/admin/profiling")
+class ProfilingEndpoint(views.MethodView):
+    """Define the endpoint for /admin/profiling.
+
+    This endpoint shows and changes which requests this process profiles, and lists
+    the profiles written so far.
+    """
+
+    @SMOREST_ADMIN_BLUEPRINT.response(HTTPStatus.OK)
+    def get(self):
+        """Show the profiler's settings and profiles."""
+        return admin.get_profiling()
+
+    @SMOREST_ADMIN_BLUEPRINT.response(HTTPStatus.OK)
+    @SMOREST_ADMIN_BLUEPRINT.arguments(ProfilingSchema)
+    def post(self, data: dict):
+        """Profile the next requests, or change the sampling rate."""
+        return admin.set_profiling(data)
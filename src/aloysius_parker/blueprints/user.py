@@ -2,16 +2,20 @@
 
 from http import HTTPStatus
 
+import flask
 import flask_smorest
 from flask import views
 
+from aloysius_parker.extensions import ndjson
 from aloysius_parker.handler import user
 from aloysius_parker.models.message import (
     DeleteMessageSchemaArguments,
+    DeleteMessagesSchema,
     GetMessageSchemaArguments,
     PostMessageSchema,
+    StreamMessagesSchemaArguments,
 )
-from aloysius_parker.models.user import UserPatchSchema
+from aloysius_parker.models.user import GetUserSchemaArguments, UserPatchSchema
 
 SMOREST_USER_BLUEPRINT = flask_smorest.Blueprint(
     "user", __name__, description="Management of individual users."
@@ -26,13 +30,15 @@ class UserEndpoint(views.MethodView):
     """
 
     @SMOREST_USER_BLUEPRINT.response(HTTPStatus.OK)
-    def get(self, user_id: str):
+    @SMOREST_USER_BLUEPRINT.arguments(GetUserSchemaArguments, location="query")
+    def get(self, args: dict, user_id: str):
         """Retrieve user information based on id."""
-        return user.fetch_user(user_id)
+        return user.fetch_user(user_id, flask.request.if_none_match, args["counts"])
 
     @SMOREST_USER_BLUEPRINT.response(HTTPStatus.NO_CONTENT)
+    @SMOREST_USER_BLUEPRINT.alt_response(HTTPStatus.ACCEPTED)
     def delete(self, user_id: str):
-        """Delete an existing user based on id."""
+        """Delete an existing user based on id, and their messages."""
         return user.delete_user(user_id)
 
     @SMOREST_USER_BLUEPRINT.response(HTTPStatus.OK)
@@ -42,6 +48,20 @@ class UserEndpoint(views.MethodView):
         return user.edit_user(user_id, data)
 
 
+@SMOREST_USER_BLUEPRINT.route("/user/<string:user_id>/deletion")
+class UserDeletionEndpoint(views.MethodView):
+    """Define the endpoint for /users/<id>/deletion.
+
+    This endpoint reports the progress of deleting a user's messages, which happens
+    in the background for users with many of them.
+    """
+
+    @SMOREST_USER_BLUEPRINT.response(HTTPStatus.OK)
+    def get(self, user_id: str):
+        """Follow the deletion of a user."""
+        return user.get_user_deletion(user_id)
+
+
 @SMOREST_USER_BLUEPRINT.route("/user/<string:user_id>/messages")
 class UserMessagesEndpoint(views.MethodView):
     """Define the endpoint for /users/<id>/messages.
@@ -53,7 +73,7 @@ class UserMessagesEndpoint(views.MethodView):
     @SMOREST_USER_BLUEPRINT.arguments(GetMessageSchemaArguments, location="query")
     def get(self, args: dict, user_id: str):
         """GET all messages for a user."""
-        return user.get_user_messages(user_id, args)
+        return user.get_user_messages(user_id, args, flask.request.if_none_match)
 
     # todo: consider specifying location="json" for each blueprint arg
     @SMOREST_USER_BLUEPRINT.response(HTTPStatus.CREATED)
@@ -67,3 +87,68 @@ class UserMessagesEndpoint(views.MethodView):
     def delete(self, args: dict, user_id: str):
         """Delete a message for a user."""
         return user.delete_user_message(user_id, args)
+
+
+@SMOREST_USER_BLUEPRINT.route("/user/<string:user_id>/messages/delete")
+class UserMessagesDeleteEndpoint(views.MethodView):
+    """Define the endpoint for /users/<id>/messages/delete.
+
+    This endpoint deletes many messages for a user in one request, listed by ID or
+    everything sent before a time.  IDs that are not found are reported rather than
+    failing the delete.
+    """
+
+    @SMOREST_USER_BLUEPRINT.response(HTTPStatus.OK)
+    @SMOREST_USER_BLUEPRINT.arguments(DeleteMessagesSchema)
+    def post(self, data: dict, user_id: str):
+        """Delete many messages for a user via a POST request."""
+        return user.delete_user_messages(user_id, data)
+
+
+@SMOREST_USER_BLUEPRINT.route("/user/<string:user_id>/messages/count")
+class UserMessagesCountEndpoint(views.MethodView):
+    """Define the endpoint for /users/<id>/messages/count.
+
+    This endpoint is used to retrieve how many messages a user has received and sent.
+    """
+
+    @SMOREST_USER_BLUEPRINT.response(HTTPStatus.OK)
+    def get(self, user_id: str):
+        """Count the messages for a user."""
+        return user.count_user_messages(user_id)
+
+
+@SMOREST_USER_BLUEPRINT.route("/user/<string:user_id>/messages/export")
+class UserMessagesExportEndpoint(views.MethodView):
+    """Define the endpoint for /users/<id>/messages/export.
+
+    This endpoint streams every message for a user as newline-delimited JSON, gzipped
+    if the client accepts it.
+    """
+
+    @SMOREST_USER_BLUEPRINT.response(HTTPStatus.OK, content_type=ndjson.MIMETYPE)
+    def get(self, user_id: str):
+        """Export all messages for a user."""
+        return user.export_user_messages(
+            user_id, "gzip" in flask.request.accept_encodings
+        )
+
+
+@SMOREST_USER_BLUEPRINT.route("/user/<string:user_id>/messages/stream")
+class UserMessagesStreamEndpoint(views.MethodView):
+    """Define the endpoint for /users/<id>/messages/stream.
+
+    This endpoint pushes new messages for a user as server-sent events when the
+    client accepts text/event-stream, and otherwise long polls for them.
+    """
+
+    @SMOREST_USER_BLUEPRINT.response(HTTPStatus.OK)
+    @SMOREST_USER_BLUEPRINT.arguments(StreamMessagesSchemaArguments, location="query")
+    def get(self, args: dict, user_id: str):
+        """Wait for new messages for a user."""
+        return user.stream_user_messages(
+            user_id,
+            args,
+            flask.request.headers.get("Last-Event-ID"),
+            "text/event-stream" in flask.request.accept_mimetypes.values(),
+        )
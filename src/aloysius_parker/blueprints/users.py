@@ -2,11 +2,14 @@
 
 from http import HTTPStatus
 
+import flask
 import flask_smorest
 from flask import views
 
+from aloysius_parker.extensions import ndjson
 from aloysius_parker.handler import users
-from aloysius_parker.models.user import UserSchema
+from aloysius_parker.models.message import BroadcastMessageSchema
+from aloysius_parker.models.user import GetUsersSchemaArguments, UserSchema
 
 SMOREST_USERS_BLUEPRINT = flask_smorest.Blueprint(
     "users", __name__, description="Management of the users."
@@ -22,12 +25,64 @@ class UsersEndpoint(views.MethodView):
     """
 
     @SMOREST_USERS_BLUEPRINT.response(200)
-    def get(self):
-        """Retrieve all users."""
-        return users.get_users()
+    @SMOREST_USERS_BLUEPRINT.arguments(GetUsersSchemaArguments, location="query")
+    def get(self, args: dict):
+        """Retrieve a page of users."""
+        return users.get_users(args)
 
     @SMOREST_USERS_BLUEPRINT.response(HTTPStatus.CREATED)
     @SMOREST_USERS_BLUEPRINT.arguments(UserSchema)
     def post(self, data: dict):
         """Create a new user via a POST request."""
         return users.create_user(data)
+
+
+@SMOREST_USERS_BLUEPRINT.route("/users/export")
+class UsersExportEndpoint(views.MethodView):
+    """Define the endpoint for /users/export.
+
+    This endpoint streams every user as newline-delimited JSON, gzipped if the client
+    accepts it, so bulk consumers do not need to page through /users.
+    """
+
+    @SMOREST_USERS_BLUEPRINT.response(HTTPStatus.OK, content_type=ndjson.MIMETYPE)
+    def get(self):
+        """Export all users."""
+        return users.export_users("gzip" in flask.request.accept_encodings)
+
+
+@SMOREST_USERS_BLUEPRINT.route("/users/batch")
+class UsersBatchEndpoint(views.MethodView):
+    """Define the endpoint for /users/batch.
+
+    This endpoint creates many users in one request from a JSON array, or from
+    newline-delimited JSON when sent as application/x-ndjson.
+    """
+
+    @SMOREST_USERS_BLUEPRINT.response(HTTPStatus.CREATED)
+    def post(self):
+        """Create a batch of users via a POST request."""
+        if flask.request.mimetype != ndjson.MIMETYPE:
+            return users.create_users(flask.request.get_json())
+
+        try:
+            rows: list = ndjson.loads(flask.request.get_data())
+        except ValueError as e:
+            flask_smorest.abort(HTTPStatus.BAD_REQUEST, message=str(e))
+
+        return users.create_users(rows)
+
+
+@SMOREST_USERS_BLUEPRINT.route("/users/messages")
+class UsersMessagesEndpoint(views.MethodView):
+    """Define the endpoint for /users/messages.
+
+    This endpoint sends one message to many users, or to all of them, in a single
+    request.  Recipients that do not exist are reported rather than failing the send.
+    """
+
+    @SMOREST_USERS_BLUEPRINT.response(HTTPStatus.CREATED)
+    @SMOREST_USERS_BLUEPRINT.arguments(BroadcastMessageSchema)
+    def post(self, data: dict):
+        """Broadcast a message via a POST request."""
+        return users.broadcast_message(data)
@@ -3,7 +3,7 @@
 import flask_smorest
 from flask import app
 
-from aloysius_parker.blueprints import convenience, home, user, users
+from aloysius_parker.blueprints import admin, convenience, home, user, users
 
 
 def configure_blueprints(flask_api: app.Flask) -> None:
@@ -13,3 +13,4 @@ def configure_blueprints(flask_api: app.Flask) -> None:
     flask_api.register_blueprint(user.SMOREST_USER_BLUEPRINT)
     flask_api.register_blueprint(users.SMOREST_USERS_BLUEPRINT)
     flask_api.register_blueprint(convenience.SMOREST_CONVENIENCE_BLUEPRINT)
+    flask_api.register_blueprint(admin.SMOREST_ADMIN_BLUEPRINT)
@@ -0,0 +1,166 @@
+"""Configure the database connection from the environment.
+
+DATABASE_URL chooses the database, by default an in-memory SQLite database that is
+lost on restart and private to each gunicorn worker.  Relative SQLite paths are
+relative to the Flask instance folder.  The connection pool of a file or server
+database can be tuned with DATABASE_POOL_SIZE, DATABASE_MAX_OVERFLOW,
+DATABASE_POOL_TIMEOUT, DATABASE_POOL_RECYCLE and DATABASE_POOL_PRE_PING.
+
+Every connection to a SQLite file is set up with the SQLITE_PRAGMAS: write-ahead
+logging so readers do not block the writer and the writer does not block readers,
+synchronous=NORMAL which is durable in WAL mode except on power loss, a busy timeout
+so writers queue rather than fail, and a larger page cache and memory map.
+
+MESSAGE_GROUP_COMMIT=true commits concurrently sent messages together, in batches
+of up to MESSAGE_GROUP_COMMIT_MAX_BATCH collected for MESSAGE_GROUP_COMMIT_MAX_WAIT_MS.
+
+MESSAGE_RETENTION_MAX_AGE_DAYS and MESSAGE_RETENTION_MAX_PER_RECIPIENT start a
+background purge of older messages every MESSAGE_RETENTION_INTERVAL_SECONDS, deleting
+MESSAGE_RETENTION_CHUNK_SIZE at a time, or only counting them with
+MESSAGE_RETENTION_DRY_RUN=true.
+"""
+
+import os
+from datetime import timedelta
+
+from flask import app
+from sqlalchemy import URL, Engine, event, make_url
+
+from aloysius_parker.database import group_commit, retention
+from aloysius_parker.database.db import database
+
+DEFAULT_DATABASE_URL: str = "sqlite:///:memory:"
+
+# Values are in the units SQLite uses: milliseconds, bytes, and KiB when negative.
+SQLITE_PRAGMAS: dict[str, str | int] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -64_000,
+    "mmap_size": 256 * 1024 * 1024,
+}
+
+# The environment variable and type of each engine option that can be set.
+_POOL_OPTIONS: dict[str, tuple[str, type]] = {
+    "pool_size": ("DATABASE_POOL_SIZE", int),
+    "max_overflow": ("DATABASE_MAX_OVERFLOW", int),
+    "pool_timeout": ("DATABASE_POOL_TIMEOUT", float),
+    "pool_recycle": ("DATABASE_POOL_RECYCLE", int),
+    "pool_pre_ping": ("DATABASE_POOL_PRE_PING", lambda value: value.lower() == "true"),
+}
+
+
+def is_in_memory(url: URL) -> bool:
+    """Return True if the URL is for an in-memory SQLite database."""
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def is_sqlite_file(engine: Engine) -> bool:
+    """Return True if the engine connects to a SQLite database file."""
+    return engine.dialect.name == "sqlite" and not is_in_memory(engine.url)
+
+
+def engine_options() -> dict:
+    """Return the pool options given in the environment."""
+    return {
+        option: convert(os.environ[variable])
+        for option, (variable, convert) in _POOL_OPTIONS.items()
+        if variable in os.environ
+    }
+
+
+def pragma_listener(pragmas: dict[str, str | int]):
+    """Return a connect event listener that sets the pragmas on each connection."""
+
+    def set_pragmas(dbapi_connection, _connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+    return set_pragmas
+
+
+def retention_policy() -> retention.RetentionPolicy:
+    """Return the retention policy given in the environment."""
+    max_age: str | None = os.environ.get("MESSAGE_RETENTION_MAX_AGE_DAYS")
+    max_per_recipient: str | None = os.environ.get(
+        "MESSAGE_RETENTION_MAX_PER_RECIPIENT"
+    )
+    return retention.RetentionPolicy(
+        timedelta(days=float(max_age)) if max_age else None,
+        int(max_per_recipient) if max_per_recipient else None,
+    )
+
+
+def configure_database(flask_api: app.Flask) -> None:
+    """Connect the app to the database in DATABASE_URL, tuning SQLite files."""
+    url: str = os.environ.get("DATABASE_URL", DEFAULT_DATABASE_URL)
+    flask_api.config.setdefault("SQLALCHEMY_DATABASE_URI", url)
+    flask_api.config.setdefault("SQLITE_PRAGMAS", SQLITE_PRAGMAS)
+    flask_api.config.setdefault(
+        "MESSAGE_GROUP_COMMIT",
+        os.environ.get("MESSAGE_GROUP_COMMIT", "").lower() == "true",
+    )
+    flask_api.config.setdefault(
+        "MESSAGE_GROUP_COMMIT_MAX_BATCH",
+        int(
+            os.environ.get(
+                "MESSAGE_GROUP_COMMIT_MAX_BATCH", group_commit.DEFAULT_MAX_BATCH_SIZE
+            )
+        ),
+    )
+    flask_api.config.setdefault(
+        "MESSAGE_GROUP_COMMIT_MAX_WAIT_MS",
+        float(
+            os.environ.get(
+                "MESSAGE_GROUP_COMMIT_MAX_WAIT_MS",
+                group_commit.DEFAULT_MAX_WAIT_SECONDS * 1000,
+            )
+        ),
+    )
+    flask_api.config.setdefault("MESSAGE_RETENTION", retention_policy())
+    flask_api.config.setdefault(
+        "MESSAGE_RETENTION_INTERVAL_SECONDS",
+        float(
+            os.environ.get(
+                "MESSAGE_RETENTION_INTERVAL_SECONDS", retention.DEFAULT_INTERVAL_SECONDS
+            )
+        ),
+    )
+    flask_api.config.setdefault(
+        "MESSAGE_RETENTION_CHUNK_SIZE",
+        int(
+            os.environ.get("MESSAGE_RETENTION_CHUNK_SIZE", retention.DEFAULT_CHUNK_SIZE)
+        ),
+    )
+    flask_api.config.setdefault(
+        "MESSAGE_RETENTION_DRY_RUN",
+        os.environ.get("MESSAGE_RETENTION_DRY_RUN", "").lower() == "true",
+    )
+    # In-memory databases have a single, static connection rather than a pool.
+    if not is_in_memory(make_url(url)):
+        flask_api.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options())
+
+    database.init_app(flask_api)
+    with flask_api.app_context():
+        if is_sqlite_file(database.engine):
+            event.listen(
+                database.engine,
+                "connect",
+                pragma_listener(flask_api.config["SQLITE_PRAGMAS"]),
+            )
+        if flask_api.config["MESSAGE_GROUP_COMMIT"]:
+            group_commit.enable(
+                database.engine,
+                flask_api.config["MESSAGE_GROUP_COMMIT_MAX_BATCH"],
+                flask_api.config["MESSAGE_GROUP_COMMIT_MAX_WAIT_MS"] / 1000,
+            )
+        if flask_api.config["MESSAGE_RETENTION"]:
+            retention.enable(
+                database.engine,
+                flask_api.config["MESSAGE_RETENTION"],
+                flask_api.config["MESSAGE_RETENTION_INTERVAL_SECONDS"],
+                flask_api.config["MESSAGE_RETENTION_CHUNK_SIZE"],
+                flask_api.config["MESSAGE_RETENTION_DRY_RUN"],
+            )
@@ -0,0 +1,75 @@
+"""Configure how responses are encoded as JSON.
+
+orjson is used when it is installed (pip install aloysius_parker[fast]), otherwise
+the standard library encoder.  Either way handlers may return model objects and
+SQLAlchemy Row tuples as they are; the encoder asks each for its fields while it
+writes the body, so no list of dictionaries is built up front, and datetimes are
+written in ISO 8601 by the encoder rather than by the models.
+"""
+
+import json
+from datetime import date
+from typing import Any
+
+from flask import app
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import Row
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+# Validation errors of list fields are keyed by the integer index of the item, which
+# orjson only writes with OPT_NON_STR_KEYS.
+ORJSON_OPTIONS: int = orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+def _default(o: Any) -> Any:
+    """Return a JSON encodable stand in for an object the encoder does not know."""
+    if isinstance(o, date):
+        return o.isoformat()
+    if hasattr(o, "__json__"):
+        return o.__json__()
+    if isinstance(o, Row):
+        return o._asdict()
+    return DefaultJSONProvider.default(o)
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Encode data as compact JSON, with orjson when it is installed."""
+    if orjson is None:
+        return json.dumps(obj, default=_default, separators=(",", ":")).encode()
+
+    return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider encoding with orjson when available, and models directly."""
+
+    default = staticmethod(_default)
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """Serialize data as JSON, with orjson unless stdlib options are asked for."""
+        if orjson is None or kwargs:
+            kwargs.setdefault("separators", (",", ":"))
+            return super().dumps(obj, **kwargs)
+
+        return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS).decode()
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        """Deserialize data as JSON."""
+        if orjson is None or kwargs:
+            return json.loads(s, **kwargs)
+
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Any:
+        """Serialize the arguments as JSON and return a response with the bytes."""
+        body: bytes = dumps_bytes(self._prepare_response_obj(args, kwargs))
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+
+def configure_json_provider(flask_api: app.Flask) -> None:
+    """Encode the app's JSON responses with the FastJSONProvider."""
+    flask_api.json = FastJSONProvider(flask_api)
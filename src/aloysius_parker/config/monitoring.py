@@ -1,9 +1,41 @@
-"""Configure the monitoring."""
+"""Configure the monitoring.
+
+SLOW_QUERY_SECONDS sets how long a SQL statement may take before it is logged with
+its query plan, and SLOW_QUERY_LOG_SIZE how many of the latest are kept for
+/admin/slow-queries.  The admin endpoints need ADMIN_TOKEN to be set, and the token
+sent as a bearer token.
+"""
+
+import os
 
 import prometheus_flask_exporter
 from flask import app
 
+from aloysius_parker.database.db import database
+from aloysius_parker.extensions import query_metrics, slow_queries
+
 
 def configure_monitoring(flask_api: app.Flask) -> None:
-    """Configure the Prometheus instrumentation and root logger."""
+    """Configure the Prometheus instrumentation of requests and their SQL statements.
+
+    The database must be configured first, as its engine is instrumented.
+    """
+    flask_api.config.setdefault("ADMIN_TOKEN", os.environ.get("ADMIN_TOKEN"))
+    flask_api.config.setdefault(
+        "SLOW_QUERY_SECONDS",
+        float(
+            os.environ.get("SLOW_QUERY_SECONDS", slow_queries.DEFAULT_THRESHOLD_SECONDS)
+        ),
+    )
+    flask_api.config.setdefault(
+        "SLOW_QUERY_LOG_SIZE",
+        int(os.environ.get("SLOW_QUERY_LOG_SIZE", slow_queries.DEFAULT_CAPACITY)),
+    )
     prometheus_flask_exporter.PrometheusMetrics(flask_api)
+    slow_query_log = slow_queries.SlowQueryLog(
+        flask_api.config["SLOW_QUERY_SECONDS"], flask_api.config["SLOW_QUERY_LOG_SIZE"]
+    )
+    flask_api.extensions["slow_queries"] = slow_query_log
+    with flask_api.app_context():
+        query_metrics.instrument(flask_api, database.engine)
+        slow_query_log.instrument(database.engine)
@@ -13,6 +13,5 @@ def configure_open_api(flask_api: app.Flask) -> None:
         "OPENAPI_URL_PREFIX": "/",
         "OPENAPI_SWAGGER_UI_PATH": "/swagger-ui",
         "OPENAPI_SWAGGER_UI_URL": "https://cdn.jsdelivr.net/npm/swagger-ui-dist/",
-        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
     }
     flask_api.config.update(config)
@@ -0,0 +1,49 @@
+"""Configure the opt-in profiling of single requests.
+
+Profiles are written to PROFILE_DIR, by default aloysius-profiles in the temporary
+directory, as pstats or speedscope files as PROFILE_FORMAT says.  PROFILE_SAMPLE_RATE
+profiles that fraction of all requests with the low overhead stack sampler, and only
+the latest PROFILE_MAX_FILES profiles are kept.  The X-Profile header is signed with
+ADMIN_TOKEN, so it is refused without one, and so configure_monitoring must run
+first to read it.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+from flask import app
+
+from aloysius_parker.extensions import profiling
+
+
+def configure_profiling(flask_api: app.Flask) -> None:
+    """Run requests under a profiler when they ask for it or are sampled."""
+    flask_api.config.setdefault(
+        "PROFILE_DIR",
+        os.environ.get(
+            "PROFILE_DIR", str(Path(tempfile.gettempdir()) / "aloysius-profiles")
+        ),
+    )
+    flask_api.config.setdefault(
+        "PROFILE_FORMAT", os.environ.get("PROFILE_FORMAT", profiling.PSTATS)
+    )
+    flask_api.config.setdefault(
+        "PROFILE_SAMPLE_RATE", float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+    )
+    flask_api.config.setdefault(
+        "PROFILE_MAX_FILES",
+        int(os.environ.get("PROFILE_MAX_FILES", profiling.DEFAULT_MAX_PROFILES)),
+    )
+    if flask_api.config["PROFILE_FORMAT"] not in profiling.FORMATS:
+        raise ValueError(f"PROFILE_FORMAT must be one of {profiling.FORMATS}")
+
+    profiler = profiling.RequestProfiler(
+        flask_api.config["PROFILE_DIR"],
+        flask_api.config.get("ADMIN_TOKEN"),
+        flask_api.config["PROFILE_SAMPLE_RATE"],
+        flask_api.config["PROFILE_FORMAT"],
+        flask_api.config["PROFILE_MAX_FILES"],
+    )
+    flask_api.extensions["profiler"] = profiler
+    profiling.instrument(flask_api, profiler)
@@ -0,0 +1,32 @@
+"""Configure the cache of users read by the handlers.
+
+USER_CACHE_SIZE users are kept for up to USER_CACHE_TTL seconds each.  The cache is
+off by default, and whenever either is 0, because each process has a cache of its
+own: a user changed or deleted through one gunicorn worker is only dropped from that
+worker's cache, and the other workers go on serving the user as it was for up to
+USER_CACHE_TTL seconds.  Turn it on with a single worker, or where reading a user
+that stale is acceptable.
+"""
+
+import os
+
+from flask import app
+
+from aloysius_parker.database import user_cache
+from aloysius_parker.handler import user as user_handler
+
+
+def configure_user_cache(flask_api: app.Flask) -> None:
+    """Cache the users the handlers read, as USER_CACHE_SIZE and USER_CACHE_TTL say."""
+    flask_api.config.setdefault(
+        "USER_CACHE_SIZE", int(os.environ.get("USER_CACHE_SIZE", "0"))
+    )
+    flask_api.config.setdefault(
+        "USER_CACHE_TTL",
+        float(os.environ.get("USER_CACHE_TTL", user_cache.DEFAULT_TTL_SECONDS)),
+    )
+    size: int = flask_api.config["USER_CACHE_SIZE"]
+    ttl: float = flask_api.config["USER_CACHE_TTL"]
+    user_handler.USERS.cache = (
+        user_cache.UserCache(size, ttl) if size > 0 and ttl > 0 else None
+    )
@@ -0,0 +1,75 @@
+"""Handles database logic for the asyncio request path.
+
+The statements are the ones UserRepository uses, executed on an AsyncSession so a
+request waiting on the database does not hold a thread.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from aloysius_parker.database import search
+from aloysius_parker.database.message import Message
+from aloysius_parker.database.user import User
+from aloysius_parker.database.user_repository import select_user_messages
+
+
+class AsyncUserRepository:
+    """Repository class for user database operations on an asyncio engine."""
+
+    def __init__(self, sessions: async_sessionmaker[AsyncSession]):
+        """Define the session factory."""
+        self.sessions = sessions
+
+    async def get_user(self, user_id: str) -> User | None:
+        """Fetch a user based on their ID."""
+        async with self.sessions() as session:
+            return await session.get(User, user_id)
+
+    async def get_users(
+        self, limit: int | None = None, cursor: str | None = None
+    ) -> list[User]:
+        """Fetch users ordered by ID, seeking past the cursor ID if given."""
+        query = select(User).order_by(User.id).limit(limit)
+        if cursor:
+            query = query.where(User.id > cursor)
+
+        async with self.sessions() as session:
+            return list(await session.scalars(query))
+
+    async def get_user_messages(
+        self,
+        user_id: str,
+        limit: int,
+        cursor: tuple[datetime, str] | None = None,
+        before: datetime | None = None,
+        after: datetime | None = None,
+    ) -> tuple[int, list[Message]] | None:
+        """Fetch the user's inbox version and a page of messages, newest first.
+
+        Returns None if there is no such user.  See UserRepository.get_user_messages.
+        """
+        async with self.sessions() as session:
+            rows = (
+                await session.execute(
+                    select_user_messages(user_id, limit, cursor, before, after)
+                )
+            ).all()
+        if not rows:
+            return None
+
+        return rows[0][0], [message for _, message in rows if message is not None]
+
+    async def search_user_messages(
+        self,
+        user_id: str,
+        terms: list[str],
+        limit: int,
+        cursor: tuple[float, str] | None = None,
+    ) -> list[tuple[Message, float]]:
+        """Search the messages sent to a user, best match first, with their scores."""
+        async with self.sessions() as session:
+            return await session.run_sync(
+                search.search_messages, user_id, terms, limit, cursor
+            )
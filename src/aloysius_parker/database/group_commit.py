@@ -0,0 +1,214 @@
+"""Group commit of message inserts, so concurrent sends share one transaction.
+
+Each commit to a SQLite file waits for the disk, so under bursts of messages the
+commits rather than the inserts limit throughput.  With group commit a request
+hands its INSERT to a writer thread and waits.  The writer collects the inserts
+that arrive within max_wait seconds of the first, up to max_batch_size, runs them in
+one transaction and commits once.  Only then are the requests released, so a 201
+still means the message is committed.
+
+If a batch fails as a whole its inserts are retried in a transaction each, so one
+bad message does not fail the others.  Any other error fails the whole batch rather
+than the writer thread, and a request waits at most timeout seconds before giving
+up, though its insert may still be committed afterwards.  The writer thread is
+started on first use in each process, as threads do not survive a gunicorn fork.
+
+An in-memory database has a single connection shared by every thread, so group
+commit is refused for it.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+import weakref
+
+import prometheus_client
+from sqlalchemy import Engine, Insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import StaticPool
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH_SIZE: int = 64
+DEFAULT_MAX_WAIT_SECONDS: float = 0.005
+DEFAULT_TIMEOUT_SECONDS: float = 10.0
+
+BATCH_SIZE = prometheus_client.Histogram(
+    "message_group_commit_batch_size",
+    "Messages inserted by each group commit",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+COMMIT_SECONDS = prometheus_client.Histogram(
+    "message_group_commit_seconds", "Time to insert and commit a batch of messages"
+)
+WAIT_SECONDS = prometheus_client.Histogram(
+    "message_group_commit_wait_seconds",
+    "Time from queueing a message until its batch was committed",
+)
+
+_STOP: object = object()
+
+# The queue for each engine that has group commit enabled.
+_QUEUES: weakref.WeakKeyDictionary[Engine, "GroupCommitQueue"] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+class _PendingInsert:
+    """An insert waiting for its batch to be committed."""
+
+    __slots__ = ("statement", "queued", "done", "inserted", "error")
+
+    def __init__(self, statement: Insert):
+        """Hold the statement until the writer has run it."""
+        self.statement: Insert = statement
+        self.queued: float = time.perf_counter()
+        self.done = threading.Event()
+        self.inserted: bool = False
+        self.error: Exception | None = None
+
+
+class GroupCommitQueue:
+    """Writer thread committing queued inserts in batches."""
+
+    def __init__(
+        self,
+        engine: Engine,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait: float = DEFAULT_MAX_WAIT_SECONDS,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+    ):
+        """Define the database, how long and large a batch may grow and the wait."""
+        self.engine: Engine = engine
+        self.max_batch_size: int = max_batch_size
+        self.max_wait: float = max_wait
+        self.timeout: float = timeout
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, statement: Insert) -> bool:
+        """Queue the insert and wait until it is committed.
+
+        Returns True if the statement inserted a row, raises the error if it failed
+        and raises TimeoutError if it was not committed within the timeout.
+        """
+        self._start_writer()
+        pending = _PendingInsert(statement)
+        self._queue.put(pending)
+        if not pending.done.wait(self.timeout):
+            raise TimeoutError(f"Message not committed within {self.timeout}s")
+        if pending.error:
+            raise pending.error
+
+        return pending.inserted
+
+    def close(self) -> None:
+        """Commit what is queued and stop the writer thread."""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                self._queue.put(_STOP)
+                self._thread.join()
+            self._thread = None
+
+    def _start_writer(self) -> None:
+        """Start the writer thread if this process does not have one yet."""
+        with self._lock:
+            if (
+                self._thread is None
+                or self._pid != os.getpid()
+                or not self._thread.is_alive()
+            ):
+                self._queue = queue.SimpleQueue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._write, name="message-group-commit", daemon=True
+                )
+                self._thread.start()
+
+    def _write(self) -> None:
+        """Commit batches as inserts arrive, until told to stop."""
+        stopping: bool = False
+        while not stopping:
+            if (first := self._queue.get()) is _STOP:
+                return
+
+            batch: list[_PendingInsert] = [first]
+            deadline: float = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    pending = self._queue.get(
+                        timeout=max(0.0, deadline - time.monotonic())
+                    )
+                except queue.Empty:
+                    break
+                if pending is _STOP:
+                    stopping = True
+                    break
+                batch.append(pending)
+
+            try:
+                self._commit(batch)
+            except Exception as e:  # handed to the waiting requests to raise
+                LOG.exception("Group commit of %s messages failed", len(batch))
+                for pending in batch:
+                    if not pending.done.is_set():
+                        pending.error = e
+                        pending.done.set()
+
+    def _commit(self, batch: list[_PendingInsert]) -> None:
+        """Run the batch in one transaction, or one by one if that fails."""
+        started: float = time.perf_counter()
+        try:
+            with self.engine.begin() as connection:
+                inserted: list[bool] = [
+                    connection.execute(pending.statement).rowcount > 0
+                    for pending in batch
+                ]
+        except SQLAlchemyError:
+            LOG.warning(
+                "Group commit of %s messages failed, retrying them one at a time",
+                len(batch),
+                exc_info=True,
+            )
+            for pending in batch:
+                self._commit_one(pending)
+        else:
+            for pending, row_inserted in zip(batch, inserted):
+                pending.inserted = row_inserted
+
+        committed: float = time.perf_counter()
+        COMMIT_SECONDS.observe(committed - started)
+        BATCH_SIZE.observe(len(batch))
+        for pending in batch:
+            WAIT_SECONDS.observe(committed - pending.queued)
+            pending.done.set()
+
+    def _commit_one(self, pending: _PendingInsert) -> None:
+        """Run a single insert in its own transaction, keeping any error."""
+        try:
+            with self.engine.begin() as connection:
+                pending.inserted = connection.execute(pending.statement).rowcount > 0
+        except Exception as e:  # handed to the waiting request to raise
+            pending.error = e
+
+
+def enable(
+    engine: Engine,
+    max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    max_wait: float = DEFAULT_MAX_WAIT_SECONDS,
+    timeout: float = DEFAULT_TIMEOUT_SECONDS,
+) -> GroupCommitQueue:
+    """Send message inserts on the engine through a group commit queue."""
+    if isinstance(engine.pool, StaticPool):
+        raise ValueError("Group commit needs a database file, not an in-memory one")
+    _QUEUES[engine] = GroupCommitQueue(engine, max_batch_size, max_wait, timeout)
+    return _QUEUES[engine]
+
+
+def queue_for(engine: Engine) -> GroupCommitQueue | None:
+    """Return the engine's group commit queue, None if group commit is not enabled."""
+    return _QUEUES.get(engine)
@@ -3,7 +3,7 @@
 from datetime import datetime, timezone
 from uuid import uuid4
 
-from sqlalchemy import Column, DateTime, ForeignKey, String
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from aloysius_parker.database.db import database
@@ -19,12 +19,29 @@ class Message(database.Model):
     """
 
     __tablename__ = "messages"
+    __table_args__ = (
+        # Inbox pages are sought by recipient in (timestamp, id) order.
+        Index("ix_messages_recipient_timestamp_id", "recipient_id", "timestamp", "id"),
+        # Sent messages, optionally narrowed to a single recipient.
+        Index(
+            "ix_messages_author_recipient_timestamp",
+            "author_id",
+            "recipient_id",
+            "timestamp",
+        ),
+        # Expired messages are sought by age for the retention purge.
+        Index("ix_messages_timestamp_id", "timestamp", "id"),
+        # Streams catch up on an inbox by sequence.
+        Index("ix_messages_recipient_sequence", "recipient_id", "sequence"),
+    )
 
     id: Column[String] = Column(String, primary_key=True)
     content: Column[String] = Column(String(MAX_MESSAGE_LENGTH), nullable=False)
     author_id: Column[String] = Column(String, ForeignKey("users.id"))
     recipient_id: Column[String] = Column(String, ForeignKey("users.id"))
     timestamp: Column[DateTime] = Column(DateTime, default=datetime.utcnow)
+    # Position in the recipient's inbox in commit order, set by a trigger on insert.
+    sequence: Column[Integer] = Column(Integer)
 
     def __init__(self, author_id: str, recipient_id: str, content: str):
         """Create a new Message object."""
@@ -32,17 +49,23 @@ class Message(database.Model):
         self.author_id: str = author_id
         self.recipient_id: str = recipient_id
         self.content: str = content
-        self.timestamp: datetime = datetime.now(timezone.utc)
+        # UTC without the offset, as SQLite stores and returns it, so a message that
+        # was just sent serialises the same as when it is read back.
+        self.timestamp: datetime = datetime.now(timezone.utc).replace(tzinfo=None)
 
     author = relationship("User", foreign_keys=[author_id])
     recipient = relationship("User", foreign_keys=[recipient_id])
 
-    def to_json(self) -> dict:
-        """Return a JSON representation of the message."""
+    def __json__(self) -> dict:
+        """Return the fields for the JSON provider, which formats the timestamp."""
         return {
             "id": self.id,
             "author_id": self.author_id,
             "recipient_id": self.recipient_id,
             "content": self.content,
-            "timestamp": self.timestamp.isoformat(),
+            "timestamp": self.timestamp,
         }
+
+    def to_json(self) -> dict:
+        """Return a JSON representation of the message."""
+        return {**self.__json__(), "timestamp": self.timestamp.isoformat()}
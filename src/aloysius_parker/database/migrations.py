@@ -0,0 +1,358 @@
+"""Versioned schema migrations for the users and messages tables.
+
+`database.create_all()` only creates tables that are missing, so it never changes a
+database file that already exists.  Each migration here brings an existing database
+up to date in place, and the applied versions are recorded in the schema_version
+table so every migration runs exactly once.
+
+pysqlite commits DDL as it runs it, so on SQLite the tables are created and the
+migrations applied inside an explicit BEGIN EXCLUSIVE on a connection in autocommit
+mode.  That makes them one transaction, and makes processes starting at the same
+time on a fresh file wait for each other rather than race to create the tables.
+"""
+
+import argparse
+import contextlib
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Iterator
+
+from sqlalchemy import (
+    Column,
+    Connection,
+    DateTime,
+    Engine,
+    Integer,
+    String,
+    Table,
+    create_engine,
+    func,
+    inspect,
+    select,
+)
+
+from aloysius_parker.database import search, user_purge
+from aloysius_parker.database.db import database
+from aloysius_parker.database.message import Message
+from aloysius_parker.database.user import User
+
+LOG = logging.getLogger(__name__)
+
+SCHEMA_VERSION = Table(
+    "schema_version",
+    database.metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _create_base_tables(connection: Connection) -> None:
+    """Create the users and messages tables if they do not exist yet."""
+    database.metadata.create_all(connection, tables=[User.__table__, Message.__table__])
+
+
+def _create_indexes(*names: str) -> Callable[[Connection], None]:
+    """Return a migration creating the named indexes declared on the models."""
+
+    def create_indexes(connection: Connection) -> None:
+        """Create the indexes unless they are already present."""
+        for table in database.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name in names:
+                    index.create(connection, checkfirst=True)
+
+    return create_indexes
+
+
+_INBOX_VERSION_TRIGGERS: list[str] = [
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_inbox_version_insert
+    AFTER INSERT ON messages BEGIN
+        UPDATE users SET inbox_version = inbox_version + 1 WHERE id = new.recipient_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_inbox_version_delete
+    AFTER DELETE ON messages BEGIN
+        UPDATE users SET inbox_version = inbox_version + 1 WHERE id = old.recipient_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_inbox_version_update
+    AFTER UPDATE ON messages BEGIN
+        UPDATE users SET inbox_version = inbox_version + 1
+        WHERE id IN (old.recipient_id, new.recipient_id);
+    END
+    """,
+]
+
+
+def _add_inbox_version(connection: Connection) -> None:
+    """Version each inbox so clients can tell whether it changed without reading it."""
+    columns = {column["name"] for column in inspect(connection).get_columns("users")}
+    if "inbox_version" not in columns:
+        connection.exec_driver_sql(
+            "ALTER TABLE users ADD COLUMN inbox_version INTEGER NOT NULL DEFAULT 0"
+        )
+
+    for statement in _INBOX_VERSION_TRIGGERS:
+        connection.exec_driver_sql(statement)
+
+
+_MESSAGE_COUNT_TRIGGERS: list[str] = [
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_count_insert
+    AFTER INSERT ON messages BEGIN
+        UPDATE users SET received_count = received_count + 1
+        WHERE id = new.recipient_id;
+        UPDATE users SET sent_count = sent_count + 1 WHERE id = new.author_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_count_delete
+    AFTER DELETE ON messages BEGIN
+        UPDATE users SET received_count = received_count - 1
+        WHERE id = old.recipient_id;
+        UPDATE users SET sent_count = sent_count - 1 WHERE id = old.author_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_count_update
+    AFTER UPDATE OF recipient_id, author_id ON messages BEGIN
+        UPDATE users SET received_count = received_count - 1
+        WHERE id = old.recipient_id;
+        UPDATE users SET received_count = received_count + 1
+        WHERE id = new.recipient_id;
+        UPDATE users SET sent_count = sent_count - 1 WHERE id = old.author_id;
+        UPDATE users SET sent_count = sent_count + 1 WHERE id = new.author_id;
+    END
+    """,
+]
+
+
+def _add_message_counts(connection: Connection) -> None:
+    """Count each user's received and sent messages so reading a count is a lookup."""
+    columns = {column["name"] for column in inspect(connection).get_columns("users")}
+    for column in ("received_count", "sent_count"):
+        if column not in columns:
+            connection.exec_driver_sql(
+                f"ALTER TABLE users ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"
+            )
+
+    connection.exec_driver_sql("""
+        UPDATE users SET
+            received_count = (
+                SELECT COUNT(*) FROM messages WHERE recipient_id = users.id
+            ),
+            sent_count = (SELECT COUNT(*) FROM messages WHERE author_id = users.id)
+        """)
+    for statement in _MESSAGE_COUNT_TRIGGERS:
+        connection.exec_driver_sql(statement)
+
+
+def _add_pending_user_purges(connection: Connection) -> None:
+    """Record the users whose messages are still to be deleted.
+
+    Messages left behind by deletions before purges were recorded are queued too.
+    """
+    user_purge.PENDING_PURGES.create(connection, checkfirst=True)
+    connection.exec_driver_sql("""
+        INSERT OR IGNORE INTO pending_user_purges (user_id, requested_at)
+        SELECT DISTINCT orphan.user_id, CURRENT_TIMESTAMP
+        FROM (
+            SELECT recipient_id AS user_id FROM messages
+            UNION SELECT author_id FROM messages
+        ) AS orphan
+        WHERE orphan.user_id IS NOT NULL
+        AND NOT EXISTS (SELECT 1 FROM users WHERE users.id = orphan.user_id)
+        """)
+
+
+_MESSAGE_SEQUENCE_TRIGGERS: list[str] = [
+    "DROP TRIGGER IF EXISTS messages_inbox_version_insert",
+    """
+    CREATE TRIGGER messages_inbox_version_insert
+    AFTER INSERT ON messages BEGIN
+        UPDATE users SET inbox_version = inbox_version + 1 WHERE id = new.recipient_id;
+        UPDATE messages
+        SET sequence = (SELECT inbox_version FROM users WHERE id = new.recipient_id)
+        WHERE id = new.id;
+    END
+    """,
+    # Setting the sequence is not a change to the inbox.
+    "DROP TRIGGER IF EXISTS messages_inbox_version_update",
+    """
+    CREATE TRIGGER messages_inbox_version_update
+    AFTER UPDATE OF id, content, author_id, recipient_id, timestamp ON messages BEGIN
+        UPDATE users SET inbox_version = inbox_version + 1
+        WHERE id IN (old.recipient_id, new.recipient_id);
+    END
+    """,
+]
+
+
+def _add_message_sequence(connection: Connection) -> None:
+    """Give each inbox's messages a sequence in the order they are committed.
+
+    The sequence of a new message is its inbox's version once the message is in,
+    assigned inside the inserting transaction, so unlike the timestamp it follows
+    the order in which messages became visible.  Existing messages are numbered by
+    time, and inbox versions raised to at least the number of messages.
+    """
+    columns = {column["name"] for column in inspect(connection).get_columns("messages")}
+    if "sequence" not in columns:
+        connection.exec_driver_sql("ALTER TABLE messages ADD COLUMN sequence INTEGER")
+    _create_indexes("ix_messages_recipient_sequence")(connection)
+
+    # Setting the sequence would otherwise reindex the message mid-insert.
+    if inspect(connection).has_table(fts := search.FTS_TABLE):
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {fts}_update")
+        connection.exec_driver_sql(f"""
+            CREATE TRIGGER {fts}_update
+            AFTER UPDATE OF content, recipient_id ON messages BEGIN
+                INSERT INTO {fts}({fts}, rowid, content, recipient_id)
+                VALUES ('delete', old.rowid, old.content, old.recipient_id);
+                INSERT INTO {fts}(rowid, content, recipient_id)
+                VALUES (new.rowid, new.content, new.recipient_id);
+            END
+            """)
+    for statement in _MESSAGE_SEQUENCE_TRIGGERS:
+        connection.exec_driver_sql(statement)
+
+    connection.exec_driver_sql("""
+        UPDATE messages SET sequence = ranked.position
+        FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY recipient_id ORDER BY timestamp, id
+            ) AS position
+            FROM messages
+        ) AS ranked
+        WHERE ranked.id = messages.id AND messages.sequence IS NULL
+        """)
+    connection.exec_driver_sql(
+        "UPDATE users SET inbox_version = MAX(inbox_version, received_count)"
+    )
+
+
+def _keep_finished_user_purges(connection: Connection) -> None:
+    """Mark finished purges rather than deleting them, to remember deleted users."""
+    columns = {
+        column["name"]
+        for column in inspect(connection).get_columns(user_purge.PENDING_PURGES.name)
+    }
+    if "purged_at" not in columns:
+        connection.exec_driver_sql(
+            "ALTER TABLE pending_user_purges ADD COLUMN purged_at DATETIME"
+        )
+
+
+# Append new migrations to the end; never renumber or edit one that has shipped.
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "create users and messages", _create_base_tables),
+    (
+        2,
+        "index messages by recipient and author",
+        _create_indexes(
+            "ix_messages_recipient_timestamp_id",
+            "ix_messages_author_recipient_timestamp",
+        ),
+    ),
+    (3, "full-text index on message content", search.create_search_index),
+    (4, "version each inbox", _add_inbox_version),
+    (5, "count each user's messages", _add_message_counts),
+    (6, "index messages by age", _create_indexes("ix_messages_timestamp_id")),
+    (7, "record pending user purges", _add_pending_user_purges),
+    (8, "sequence each inbox's messages", _add_message_sequence),
+    (9, "keep finished user purges", _keep_finished_user_purges),
+]
+
+
+def current_version(connection: Connection) -> int:
+    """Return the schema version of the database, 0 if it was never migrated."""
+    SCHEMA_VERSION.create(connection, checkfirst=True)
+    return connection.scalar(select(func.max(SCHEMA_VERSION.c.version))) or 0
+
+
+def is_up_to_date(connection: Connection) -> bool:
+    """Return True if every migration was applied, without creating any table."""
+    if not inspect(connection).has_table(SCHEMA_VERSION.name):
+        return False
+
+    version: int = connection.scalar(select(func.max(SCHEMA_VERSION.c.version))) or 0
+    return version >= MIGRATIONS[-1][0]
+
+
+def migrate(connection: Connection) -> int:
+    """Apply every migration newer than the database and return the new version."""
+    version: int = current_version(connection)
+    for number, description, migrate_to in MIGRATIONS:
+        if number <= version:
+            continue
+
+        LOG.info("Migrating schema to version %s: %s", number, description)
+        migrate_to(connection)
+        connection.execute(
+            SCHEMA_VERSION.insert().values(
+                version=number,
+                description=description,
+                applied_at=datetime.now(timezone.utc),
+            )
+        )
+        version = number
+
+    return version
+
+
+@contextlib.contextmanager
+def _exclusive(engine: Engine) -> Iterator[Connection]:
+    """Yield a connection in a transaction that holds the only lock on the database.
+
+    Other databases run the block in an ordinary transaction.
+    """
+    if engine.dialect.name != "sqlite":
+        with engine.begin() as connection:
+            yield connection
+        return
+
+    autocommit = engine.execution_options(isolation_level="AUTOCOMMIT")
+    with autocommit.connect() as connection:
+        connection.exec_driver_sql("BEGIN EXCLUSIVE")
+        try:
+            yield connection
+        except BaseException:
+            connection.exec_driver_sql("ROLLBACK")
+            raise
+        connection.exec_driver_sql("COMMIT")
+
+
+def upgrade(engine: Engine) -> int:
+    """Migrate the database in one exclusive transaction and return the new version."""
+    with _exclusive(engine) as connection:
+        return migrate(connection)
+
+
+def set_up(engine: Engine) -> int:
+    """Create the missing tables and migrate, together under one exclusive lock.
+
+    Returns the new version.
+    """
+    with _exclusive(engine) as connection:
+        database.metadata.create_all(connection)
+        return migrate(connection)
+
+
+def main() -> None:
+    """Upgrade the database at the given URL in place."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("url", help="SQLAlchemy URL, e.g. sqlite:///instance/app.db")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    engine: Engine = create_engine(args.url)
+    LOG.info("Schema is at version %s", upgrade(engine))
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Delete messages past their retention, in small chunks, in the background.
+
+A retention policy keeps messages for at most max_age, and at most
+max_per_recipient of the newest messages in each inbox.  Messages past either limit
+are deleted chunk_size at a time: the IDs of a chunk are read first, through the
+timestamp or recipient index, and then exactly those rows are deleted in a short
+transaction of their own, so the write lock is never held for long and sends queue
+behind at most one chunk.  The recipients over their limit are found from the
+counts kept on each user rather than by counting their messages.
+
+A dry run deletes nothing and instead reports how many messages would go.  The
+worker thread runs a purge every interval seconds in the process that enabled it;
+under gunicorn with the default preload that is the master, so there is one purge
+however many workers there are.
+"""
+
+import argparse
+import logging
+import threading
+import time
+import weakref
+from datetime import datetime, timedelta, timezone
+
+import prometheus_client
+from sqlalchemy import Engine, Select, create_engine, delete, func, or_, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from aloysius_parker.database.message import Message
+from aloysius_parker.database.user import User
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE: int = 500
+DEFAULT_INTERVAL_SECONDS: float = 3600.0
+# Pause between chunks so sends waiting on the write lock get a turn.
+CHUNK_PAUSE_SECONDS: float = 0.005
+
+PURGED = prometheus_client.Counter(
+    "message_retention_purged", "Messages deleted by the retention policy"
+)
+PURGEABLE = prometheus_client.Gauge(
+    "message_retention_purgeable", "Messages past retention found by the last dry run"
+)
+PURGE_SECONDS = prometheus_client.Histogram(
+    "message_retention_purge_seconds", "Time taken by each retention purge"
+)
+
+# The worker for each engine that has retention enabled.
+_WORKERS: weakref.WeakKeyDictionary[Engine, "RetentionWorker"] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+class RetentionPolicy:
+    """How long messages are kept, and how many in each inbox."""
+
+    def __init__(
+        self, max_age: timedelta | None = None, max_per_recipient: int | None = None
+    ):
+        """Define the limits; a limit of None is not enforced."""
+        self.max_age: timedelta | None = max_age
+        self.max_per_recipient: int | None = max_per_recipient
+
+    def __bool__(self) -> bool:
+        """Return True if the policy has any limit to enforce."""
+        return self.max_age is not None or self.max_per_recipient is not None
+
+    def cutoff(self) -> datetime | None:
+        """Return the time before which messages have expired, None if they don't."""
+        if self.max_age is None:
+            return None
+
+        return datetime.now(timezone.utc) - self.max_age
+
+
+def count_purgeable(engine: Engine, policy: RetentionPolicy) -> int:
+    """Count the messages past the policy, without deleting any."""
+    ranked = select(
+        Message.timestamp,
+        func.row_number()
+        .over(
+            partition_by=Message.recipient_id,
+            order_by=(Message.timestamp.desc(), Message.id.desc()),
+        )
+        .label("rank"),
+    ).subquery()
+    conditions: list = []
+    if (cutoff := policy.cutoff()) is not None:
+        conditions.append(ranked.c.timestamp < cutoff)
+    if policy.max_per_recipient is not None:
+        conditions.append(ranked.c.rank > policy.max_per_recipient)
+    if not conditions:
+        return 0
+
+    with engine.connect() as connection:
+        return connection.scalar(
+            select(func.count()).select_from(ranked).where(or_(*conditions))
+        )
+
+
+def expired(cutoff: datetime, chunk_size: int) -> Select:
+    """Return the query for the IDs of the next chunk of expired messages."""
+    return (
+        select(Message.id)
+        .where(Message.timestamp < cutoff)
+        .order_by(Message.timestamp, Message.id)
+        .limit(chunk_size)
+    )
+
+
+def _delete_chunk(engine: Engine, chunk: Select) -> int:
+    """Delete the messages the query selects, outside of the read, and pause.
+
+    The IDs are read without taking the write lock, then only those rows are
+    deleted, by primary key, in a transaction of their own.
+    """
+    with engine.connect() as connection:
+        message_ids: list[str] = list(connection.scalars(chunk))
+    if not message_ids:
+        return 0
+
+    with engine.begin() as connection:
+        deleted: int = connection.execute(
+            delete(Message).where(Message.id.in_(message_ids))
+        ).rowcount
+    time.sleep(CHUNK_PAUSE_SECONDS)
+    return deleted
+
+
+def _purge_expired(engine: Engine, cutoff: datetime, chunk_size: int) -> int:
+    """Delete the messages sent before the cutoff, a chunk at a time."""
+    purged: int = 0
+    while deleted := _delete_chunk(engine, expired(cutoff, chunk_size)):
+        purged += deleted
+    return purged
+
+
+def _purge_excess(engine: Engine, max_per_recipient: int, chunk_size: int) -> int:
+    """Delete the oldest messages of each inbox holding more than the maximum."""
+    with engine.connect() as connection:
+        inboxes = connection.execute(
+            select(User.id, User.received_count - max_per_recipient).where(
+                User.received_count > max_per_recipient
+            )
+        ).all()
+
+    purged: int = 0
+    for recipient_id, excess in inboxes:
+        remaining: int = excess
+        while remaining > 0:
+            oldest = (
+                select(Message.id)
+                .where(Message.recipient_id == recipient_id)
+                .order_by(Message.timestamp, Message.id)
+                .limit(min(chunk_size, remaining))
+            )
+            if not (deleted := _delete_chunk(engine, oldest)):
+                break
+            remaining -= deleted
+            purged += deleted
+    return purged
+
+
+def purge(
+    engine: Engine,
+    policy: RetentionPolicy,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    dry_run: bool = False,
+) -> int:
+    """Delete the messages past the policy, returning how many there were.
+
+    With dry_run nothing is deleted and the count is of the messages that would be.
+    """
+    started: float = time.perf_counter()
+    if dry_run:
+        purged: int = count_purgeable(engine, policy)
+        PURGEABLE.set(purged)
+    else:
+        purged = 0
+        if (cutoff := policy.cutoff()) is not None:
+            purged += _purge_expired(engine, cutoff, chunk_size)
+        if policy.max_per_recipient is not None:
+            purged += _purge_excess(engine, policy.max_per_recipient, chunk_size)
+        PURGED.inc(purged)
+
+    seconds: float = time.perf_counter() - started
+    PURGE_SECONDS.observe(seconds)
+    LOG.info(
+        "Retention %s %s messages in %.3fs",
+        "would purge" if dry_run else "purged",
+        purged,
+        seconds,
+    )
+    return purged
+
+
+class RetentionWorker:
+    """Thread purging messages past the policy at a regular interval."""
+
+    def __init__(
+        self,
+        engine: Engine,
+        policy: RetentionPolicy,
+        interval: float = DEFAULT_INTERVAL_SECONDS,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        dry_run: bool = False,
+    ):
+        """Define the database, the policy and how often and how to enforce it."""
+        self.engine: Engine = engine
+        self.policy: RetentionPolicy = policy
+        self.interval: float = interval
+        self.chunk_size: int = chunk_size
+        self.dry_run: bool = dry_run
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start purging, beginning straight away."""
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="message-retention", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop purging, waiting for a purge in progress to finish."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """Purge, then wait for the interval, until stopped."""
+        while True:
+            try:
+                purge(self.engine, self.policy, self.chunk_size, self.dry_run)
+            except SQLAlchemyError:
+                LOG.exception("Retention purge failed, trying again next interval")
+            if self._stopped.wait(self.interval):
+                return
+
+
+def enable(
+    engine: Engine,
+    policy: RetentionPolicy,
+    interval: float = DEFAULT_INTERVAL_SECONDS,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    dry_run: bool = False,
+) -> RetentionWorker:
+    """Start enforcing the policy on the engine in the background."""
+    if previous := _WORKERS.get(engine):
+        previous.stop()
+
+    _WORKERS[engine] = RetentionWorker(engine, policy, interval, chunk_size, dry_run)
+    _WORKERS[engine].start()
+    return _WORKERS[engine]
+
+
+def worker_for(engine: Engine) -> RetentionWorker | None:
+    """Return the engine's retention worker, None if retention is not enabled."""
+    return _WORKERS.get(engine)
+
+
+def main() -> None:
+    """Purge the messages past a retention policy from the database at the URL."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("url", help="SQLAlchemy URL, e.g. sqlite:///instance/app.db")
+    parser.add_argument("--max-age-days", type=float)
+    parser.add_argument("--max-per-recipient", type=int)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    max_age: timedelta | None = None
+    if args.max_age_days is not None:
+        max_age = timedelta(days=args.max_age_days)
+    policy = RetentionPolicy(max_age, args.max_per_recipient)
+    if not policy:
+        parser.error("give --max-age-days, --max-per-recipient or both")
+
+    logging.basicConfig(level=logging.INFO)
+    engine: Engine = create_engine(args.url)
+    purge(engine, policy, args.chunk_size, args.dry_run)
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
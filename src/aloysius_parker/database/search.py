@@ -0,0 +1,148 @@
+"""Full-text search over message content backed by SQLite FTS5.
+
+The messages_fts table is an external-content FTS5 index over messages, kept in sync
+by triggers so every insert and delete, bulk or not, is indexed.  The recipient ID
+is indexed alongside the content so a search only ever touches one inbox.  When FTS5
+is not compiled into SQLite, or the database is not SQLite, searches fall back to
+LIKE filters.
+
+VACUUM may renumber the rowids the index refers to; rebuild it afterwards with
+INSERT INTO messages_fts(messages_fts) VALUES ('rebuild').
+"""
+
+import logging
+import weakref
+
+from sqlalchemy import Connection, Engine, Float, column, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from aloysius_parker.database.message import Message
+
+LOG = logging.getLogger(__name__)
+
+FTS_TABLE: str = "messages_fts"
+
+_CREATE_STATEMENTS: list[str] = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+    USING fts5(content, recipient_id, content='messages', content_rowid='rowid')
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, content, recipient_id)
+        VALUES (new.rowid, new.content, new.recipient_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content, recipient_id)
+        VALUES ('delete', old.rowid, old.content, old.recipient_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE ON messages BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content, recipient_id)
+        VALUES ('delete', old.rowid, old.content, old.recipient_id);
+        INSERT INTO {FTS_TABLE}(rowid, content, recipient_id)
+        VALUES (new.rowid, new.content, new.recipient_id);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+# The search query ranks by bm25 on the content column only; the recipient column
+# is there to narrow the match, not to score it.
+_SEARCH_SQL: str = f"""
+    SELECT * FROM (
+        SELECT messages.*, bm25({FTS_TABLE}, 1.0, 0.0) AS score
+        FROM {FTS_TABLE} JOIN messages ON messages.rowid = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH :match
+    )
+    {{seek}}
+    ORDER BY score, id
+    LIMIT :limit
+"""
+
+# Whether each engine's database has the search index, looked up once per engine.
+_INDEXED: weakref.WeakKeyDictionary[Engine, bool] = weakref.WeakKeyDictionary()
+
+
+def create_search_index(connection: Connection) -> None:
+    """Create and populate the FTS5 index, unless FTS5 is not available."""
+    _INDEXED.pop(connection.engine, None)
+    if connection.dialect.name != "sqlite":
+        LOG.warning("Full-text search needs SQLite, searches will use LIKE")
+        return
+
+    # A failed CREATE leaves nothing behind, so the first statement is the probe.
+    try:
+        connection.exec_driver_sql(_CREATE_STATEMENTS[0])
+    except OperationalError as e:
+        LOG.warning("FTS5 is not available, searches will use LIKE: %s", e)
+        return
+
+    for statement in _CREATE_STATEMENTS[1:]:
+        connection.exec_driver_sql(statement)
+
+
+def has_search_index(connection: Connection) -> bool:
+    """Return True if the database has the FTS5 index over messages."""
+    if connection.engine not in _INDEXED:
+        _INDEXED[connection.engine] = connection.dialect.name == "sqlite" and bool(
+            connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (FTS_TABLE,),
+            ).first()
+        )
+
+    return _INDEXED[connection.engine]
+
+
+def _quote(value: str) -> str:
+    """Quote a value as an FTS5 string so it cannot be read as query syntax."""
+    return '"' + value.replace('"', '""') + '"'
+
+
+def search_messages(
+    session: Session,
+    recipient_id: str,
+    terms: list[str],
+    limit: int = -1,
+    cursor: tuple[float, str] | None = None,
+) -> list[tuple[Message, float]]:
+    """Find messages to the recipient containing all the terms, best match first.
+
+    Returns each message with its score, lower being better.  "cursor" is the
+    (score, id) of the last message on the previous page.  Without the index every
+    score is 0.0 and messages come back in ID order.
+    """
+    if not has_search_index(session.connection()):
+        query = session.query(Message).filter(
+            Message.recipient_id == recipient_id,
+            *[Message.content.contains(term) for term in terms],
+        )
+        if cursor:
+            query = query.filter(Message.id > cursor[1])
+
+        return [(message, 0.0) for message in query.order_by(Message.id).limit(limit)]
+
+    match: str = (
+        f"recipient_id:{_quote(recipient_id)} "
+        f"AND content:({' '.join(_quote(term) for term in terms)})"
+    )
+    seek: str = "WHERE (score, id) > (:score, :id)" if cursor else ""
+    statement = text(_SEARCH_SQL.format(seek=seek)).columns(
+        *Message.__table__.columns, column("score", Float)
+    )
+    parameters: dict = {"match": match, "limit": limit}
+    if cursor:
+        parameters["score"], parameters["id"] = cursor
+
+    return [
+        tuple(row)
+        for row in session.execute(
+            select(Message, column("score", Float)).from_statement(statement),
+            parameters,
+        )
+    ]
@@ -4,8 +4,9 @@ import uuid
 from json import loads
 
 from marshmallow import ValidationError
-from sqlalchemy import Column, String
+from sqlalchemy import Column, Integer, String
 
+from aloysius_parker.database import search
 from aloysius_parker.database.db import database
 from aloysius_parker.database.message import Message
 
@@ -22,6 +23,11 @@ class User(database.Model):
     id: str = Column(String, primary_key=True)
     name: str = Column(String, nullable=False)
     email: str = Column(String, nullable=False)
+    # Bumped by triggers whenever a message to this user is added or removed.
+    inbox_version: int = Column(Integer, nullable=False, default=0, server_default="0")
+    # Kept up to date by triggers as messages to and from this user come and go.
+    received_count: int = Column(Integer, nullable=False, default=0, server_default="0")
+    sent_count: int = Column(Integer, nullable=False, default=0, server_default="0")
 
     def __init__(self, name: str | None, email: str | None, id: str = None):
         """Create a new User object with a provided name and email."""
@@ -36,6 +42,14 @@ class User(database.Model):
         self.name: str = name
         self.email: str = email
 
+    @classmethod
+    def from_snapshot(cls, snapshot: dict) -> "User":
+        """Rebuild a user from its to_json without validating the fields again."""
+        user: User = cls.__mapper__.class_manager.new_instance()
+        for name, value in snapshot.items():
+            setattr(user, name, value)
+        return user
+
     @classmethod
     def from_json(cls, data) -> "User":
         """Create a new User object from a JSON string."""
@@ -53,17 +67,30 @@ class User(database.Model):
             database.session.add(message)
 
     def fetch_messages(self, contains: str = None) -> list[Message]:
-        """Fetch messages sent to this user."""
-        query = database.session.query(Message).filter(Message.recipient_id == self.id)
+        """Fetch messages sent to this user.
+
+        "contains" searches the full-text index, best match first, falling back to a
+        substring match when the index is not available.
+        """
         if contains:
-            query = query.filter(Message.content.contains(contains))
+            return [
+                message
+                for message, _ in search.search_messages(
+                    database.session, self.id, contains.split()
+                )
+            ]
 
+        query = database.session.query(Message).filter(Message.recipient_id == self.id)
         return query.all()
 
     def to_json(self) -> dict:
         """Return a JSON representation of the User object."""
         return {"id": self.id, "name": self.name, "email": self.email}
 
+    def __json__(self) -> dict:
+        """Return the fields for the JSON provider."""
+        return self.to_json()
+
     def __hash__(self) -> int:
         """Return a hash of the user's id."""
         return hash(self.id)
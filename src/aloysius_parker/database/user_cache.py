@@ -0,0 +1,114 @@
+"""Bounded, time-limited cache of user rows for the read path of UserRepository.
+
+Users are read on nearly every request but rarely change, so a worker keeps recently
+read users in memory.  Entries are plain snapshots of the columns rather than ORM
+objects, which belong to the session of the request that loaded them.  Lookups of
+unknown IDs are cached too, as None.
+
+A read that raced a write could otherwise cache the row as it was before the write
+after the write has invalidated it.  So a reader takes the cache's generation before
+reading the database, and put drops its snapshot if the key has been invalidated
+since.  The generation of the latest invalidations is kept per key, up to max_size
+keys, beyond which the oldest are forgotten and treated as just invalidated.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+import prometheus_client
+
+DEFAULT_MAX_SIZE: int = 10_000
+DEFAULT_TTL_SECONDS: float = 60.0
+MISSING: Any = object()
+
+CACHE_HITS = prometheus_client.Counter(
+    "user_cache_hits_total", "User lookups answered from the cache"
+)
+CACHE_MISSES = prometheus_client.Counter(
+    "user_cache_misses_total", "User lookups that had to query the database"
+)
+CACHE_EVICTIONS = prometheus_client.Counter(
+    "user_cache_evictions_total", "Users dropped from the cache to make room"
+)
+
+
+class UserCache:
+    """Least recently used cache whose entries also expire after a time to live."""
+
+    def __init__(
+        self,
+        max_size: int = DEFAULT_MAX_SIZE,
+        ttl: float = DEFAULT_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Define how many entries the cache holds and for how many seconds."""
+        self.max_size: int = max_size
+        self.ttl: float = ttl
+        self.clock: Callable[[], float] = clock
+        self._entries: OrderedDict[Hashable, tuple[float, dict | None]] = OrderedDict()
+        self._generation: int = 0
+        self._invalidated: OrderedDict[Hashable, int] = OrderedDict()
+        self._forgotten: int = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> dict | None:
+        """Return the cached snapshot, None for a cached miss, or MISSING."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < self.clock():
+                self._entries.pop(key, None)
+                CACHE_MISSES.inc()
+                return MISSING
+
+            self._entries.move_to_end(key)
+            CACHE_HITS.inc()
+            return entry[1]
+
+    def generation(self) -> int:
+        """Return the generation to pass to put for a snapshot about to be read."""
+        with self._lock:
+            return self._generation
+
+    def put(
+        self, key: Hashable, snapshot: dict | None, generation: int | None = None
+    ) -> None:
+        """Cache a snapshot of the user, or None if there is no such user.
+
+        The snapshot is dropped if the key was invalidated after the generation.
+        """
+        with self._lock:
+            if (
+                generation is not None
+                and self._invalidated.get(key, self._forgotten) > generation
+            ):
+                return
+
+            self._entries[key] = (self.clock() + self.ttl, snapshot)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                CACHE_EVICTIONS.inc()
+
+    def invalidate(self, key: Hashable) -> None:
+        """Forget the entry so the next lookup reads the database."""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generation += 1
+            self._invalidated[key] = self._generation
+            self._invalidated.move_to_end(key)
+            while len(self._invalidated) > self.max_size:
+                _, self._forgotten = self._invalidated.popitem(last=False)
+
+    def clear(self) -> None:
+        """Forget every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self._invalidated.clear()
+            self._forgotten = self._generation
+
+    def __len__(self) -> int:
+        """Return the number of entries, including expired ones not yet dropped."""
+        return len(self._entries)
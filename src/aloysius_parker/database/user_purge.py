@@ -0,0 +1,169 @@
+"""Delete the messages of deleted users, resuming purges cut short by a restart.
+
+Deleting a user records a pending purge in the same transaction as the DELETE, and
+the record is marked as purged only once every message sent to and by them is gone.
+So a purge interrupted by a crash, restart or deploy is not lost: pending purges are
+resumed when the app starts, and whenever a purger is woken.  Purged records are
+kept, as the record that the user existed and was deleted.
+
+Each process has at most one purger thread per database, which works through the
+pending purges one user at a time and exits when none are left, so deleting many
+users at once does not start a thread each.  Messages are deleted chunk_size at a
+time, the IDs of a chunk read first and then deleted by primary key in a short
+transaction of their own.
+"""
+
+import logging
+import os
+import threading
+import weakref
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Engine,
+    String,
+    Table,
+    delete,
+    insert,
+    select,
+    update,
+)
+from sqlalchemy.exc import SQLAlchemyError
+
+from aloysius_parker.database.db import database
+from aloysius_parker.database.message import Message
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE: int = 1000
+RETRY_SECONDS: float = 60.0
+
+PENDING_PURGES = Table(
+    "pending_user_purges",
+    database.metadata,
+    Column("user_id", String, primary_key=True),
+    Column("requested_at", DateTime, nullable=False),
+    Column("purged_at", DateTime),
+)
+
+# The purger for each engine that has had users deleted.
+_PURGERS: weakref.WeakKeyDictionary[Engine, "UserPurger"] = weakref.WeakKeyDictionary()
+
+
+def record_pending(user_id: str):
+    """Return the statement recording that the user's messages are to be deleted."""
+    return insert(PENDING_PURGES).values(
+        user_id=user_id, requested_at=datetime.now(timezone.utc)
+    )
+
+
+def purge_user(
+    engine: Engine, user_id: str, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> int:
+    """Delete the messages sent to and by a user, then mark their purge as done.
+
+    Returns how many messages were deleted.
+    """
+    purged: int = 0
+    for column in (Message.recipient_id, Message.author_id):
+        chunk = select(Message.id).where(column == user_id).limit(chunk_size)
+        while True:
+            with engine.connect() as connection:
+                message_ids: list[str] = list(connection.scalars(chunk))
+            if not message_ids:
+                break
+            with engine.begin() as connection:
+                purged += connection.execute(
+                    delete(Message).where(Message.id.in_(message_ids))
+                ).rowcount
+
+    with engine.begin() as connection:
+        connection.execute(
+            update(PENDING_PURGES)
+            .where(PENDING_PURGES.c.user_id == user_id)
+            .values(purged_at=datetime.now(timezone.utc))
+        )
+    return purged
+
+
+def pending(engine: Engine) -> list[str]:
+    """Return the users whose messages are still to be deleted, oldest first."""
+    with engine.connect() as connection:
+        return list(
+            connection.scalars(
+                select(PENDING_PURGES.c.user_id)
+                .where(PENDING_PURGES.c.purged_at.is_(None))
+                .order_by(PENDING_PURGES.c.requested_at)
+            )
+        )
+
+
+class UserPurger:
+    """Thread deleting the messages of the users with pending purges."""
+
+    def __init__(self, engine: Engine, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """Define the database and how many messages to delete at a time."""
+        self.engine: Engine = engine
+        self.chunk_size: int = chunk_size
+        self._woken = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    def wake(self) -> None:
+        """Purge the pending users, starting a thread if one is not running."""
+        with self._lock:
+            self._woken.set()
+            self._stopped.clear()
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, name="user-purge", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self) -> None:
+        """Stop purging after the current user, waiting for the thread to end."""
+        self._stopped.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and self._pid == os.getpid():
+            thread.join()
+
+    def _run(self) -> None:
+        """Purge until there is nothing pending and no one has woken the purger."""
+        while not self._stopped.is_set():
+            with self._lock:
+                if not self._woken.is_set():
+                    self._thread = None
+                    return
+                self._woken.clear()
+
+            try:
+                for user_id in pending(self.engine):
+                    if self._stopped.is_set():
+                        return
+                    purged: int = purge_user(self.engine, user_id, self.chunk_size)
+                    LOG.info("Purged %s messages of deleted user %s", purged, user_id)
+            except SQLAlchemyError:
+                LOG.exception("User purge failed, retrying in %ss", RETRY_SECONDS)
+                self._woken.set()
+                self._stopped.wait(RETRY_SECONDS)
+
+
+def purger_for(engine: Engine) -> UserPurger:
+    """Return the engine's purger, creating it on first use."""
+    if (purger := _PURGERS.get(engine)) is None:
+        purger = _PURGERS.setdefault(engine, UserPurger(engine))
+    return purger
+
+
+def resume(engine: Engine) -> int:
+    """Wake the engine's purger if any purges are pending, returning how many."""
+    if waiting := len(pending(engine)):
+        LOG.info("Resuming the message purges of %s deleted users", waiting)
+        purger_for(engine).wake()
+    return waiting
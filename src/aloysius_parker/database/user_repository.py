@@ -1,83 +1,470 @@
 """Handles database logic, separating it from the handler functions."""
 
+import uuid
+from datetime import datetime, timezone
+from typing import Iterator
+
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Result
+from sqlalchemy import (
+    Insert,
+    Select,
+    and_,
+    delete,
+    func,
+    insert,
+    literal,
+    literal_column,
+    select,
+    tuple_,
+)
+from sqlalchemy.orm import aliased
 
+from aloysius_parker.database import group_commit, search, user_purge
 from aloysius_parker.database.message import Message
 from aloysius_parker.database.user import User
+from aloysius_parker.database.user_cache import MISSING, UserCache
+
+EXPORT_BATCH_SIZE: int = 1000
+INSERT_CHUNK_SIZE: int = 500
+DELETE_CHUNK_SIZE: int = 1000
+
+
+def select_user_messages(
+    user_id: str,
+    limit: int,
+    cursor: tuple[datetime, str] | None = None,
+    before: datetime | None = None,
+    after: datetime | None = None,
+) -> Select:
+    """Return the statement selecting a user's inbox version and a page of messages.
+
+    The user is LEFT JOINed to their messages so the statement returns one row, with
+    no message, for a user without any, and none for an unknown user.
+    """
+    conditions: list = [Message.recipient_id == User.id]
+    if cursor:
+        seek_key = tuple_(Message.timestamp, Message.id)
+        conditions.append(seek_key < tuple_(*cursor))
+    if before:
+        conditions.append(Message.timestamp < before)
+    if after:
+        conditions.append(Message.timestamp > after)
+
+    return (
+        select(User.inbox_version, Message)
+        .select_from(User)
+        .outerjoin(Message, and_(*conditions))
+        .where(User.id == user_id)
+        .order_by(Message.timestamp.desc(), Message.id.desc())
+        .limit(limit)
+    )
+
+
+def insert_message_if_users_exist(message: Message) -> Insert:
+    """Return an INSERT ... SELECT of the message guarded by both users existing."""
+    columns = Message.__table__.columns
+    user_ids: set[str] = {message.author_id, message.recipient_id}
+    both_users_exist = select(func.count()).where(
+        User.id.in_(user_ids)
+    ).scalar_subquery() == len(user_ids)
+    values = select(
+        *[literal(getattr(message, column.key), column.type) for column in columns]
+    ).where(both_users_exist)
+    return insert(Message).from_select([column.key for column in columns], values)
+
+
+# A random version 4 UUID in hex, as Message IDs are, made by SQLite for each row.
+RANDOM_MESSAGE_ID = literal_column(
+    "lower(hex(randomblob(6)) || '4' || substr(hex(randomblob(2)), 2)"
+    " || substr('89ab', 1 + abs(random()) % 4, 1) || substr(hex(randomblob(2)), 2)"
+    " || hex(randomblob(6)))"
+)
+
+
+def broadcast_from_users(author_id: str, content: str, *recipients) -> Insert:
+    """Return an INSERT ... SELECT of a message to each user matching the conditions.
+
+    The author is never a recipient, and nothing is inserted unless the author
+    exists when the statement runs, so a broadcast racing the author's deletion
+    cannot leave messages behind after their purge.
+    """
+    author = aliased(User)
+    author_exists = select(author.id).where(author.id == author_id).exists()
+    # UTC without the offset, as Message.__init__ sets it.
+    timestamp: datetime = datetime.now(timezone.utc).replace(tzinfo=None)
+    values = select(
+        RANDOM_MESSAGE_ID,
+        literal(author_id, Message.author_id.type),
+        User.id,
+        literal(content, Message.content.type),
+        literal(timestamp, Message.timestamp.type),
+    ).where(User.id != author_id, author_exists, *recipients)
+    return insert(Message).from_select(
+        ["id", "author_id", "recipient_id", "content", "timestamp"], values
+    )
 
 
 class UserRepository:
     """Repository class for user database operations."""
 
-    def __init__(self, db: SQLAlchemy):
-        """Define the database this repository will use."""
+    def __init__(self, db: SQLAlchemy, cache: UserCache | None = None):
+        """Define the database this repository will use, and optionally a cache."""
         self.db = db
+        self.cache = cache
+
+    def _cache_key(self, user_id: str) -> tuple:
+        """Key cache entries by engine too, since each app has its own database."""
+        return self.db.engine, user_id
+
+    def _invalidate(self, *user_ids: str) -> None:
+        """Drop the cached copies of users that have been written."""
+        if self.cache is not None:
+            for user_id in user_ids:
+                self.cache.invalidate(self._cache_key(user_id))
 
     def get_user(self, user_id: str) -> User | None:
-        """Fetch a user based on their ID."""
-        return self.db.session.query(User).get(user_id)
+        """Fetch a user based on their ID.
 
-    def get_users(self) -> [User]:
-        """Fetch all users from the database."""
-        return self.db.session.query(User).all()
+        With a cache, a hit returns a User that is not attached to the session, so
+        use it for reading only.
+        """
+        if self.cache is None:
+            return self.db.session.get(User, user_id)
+
+        key: tuple = self._cache_key(user_id)
+        if (snapshot := self.cache.get(key)) is MISSING:
+            generation: int = self.cache.generation()
+            user: User | None = self.db.session.get(User, user_id)
+            self.cache.put(key, user and user.to_json(), generation)
+            return user
+
+        return snapshot and User.from_snapshot(snapshot)
+
+    def get_users(self, limit: int | None = None, cursor: str | None = None) -> [User]:
+        """Fetch users from the database ordered by ID.
+
+        "limit" specifies the maximum number of users to return, all if not given.
+        "cursor" is the ID of the last user on the previous page; the query seeks past
+        it on the primary key rather than using OFFSET.
+        """
+        query = self.db.session.query(User)
+        if cursor:
+            query = query.filter(User.id > cursor)
+
+        return query.order_by(User.id).limit(limit).all()
+
+    def iter_users(self, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[User]:
+        """Stream every user ordered by ID, fetching batch_size rows at a time."""
+        return iter(self.db.session.query(User).order_by(User.id).yield_per(batch_size))
 
     def create_user(self, user: User) -> None:
         """Insert a User object into the database."""
         self.db.session.add(user)
         self.db.session.commit()
+        self._invalidate(user.id)
 
-    def delete_user(self, user_id: str) -> bool:
-        """Delete a user based on their ID. Returns true if user was deleted."""
-        if not (user := self.get_user(user_id)):
-            return False
+    def create_users(
+        self, rows: list[dict], chunk_size: int = INSERT_CHUNK_SIZE
+    ) -> list[str]:
+        """Insert many users in one transaction and return their new IDs.
+
+        Each row holds a name and email.  Rows are sent chunk_size at a time as
+        multi-row INSERTs rather than one statement and commit per user.
+        """
+        rows = [{**row, "id": uuid.uuid4().hex} for row in rows]
+        for start in range(0, len(rows), chunk_size):
+            self.db.session.execute(insert(User), rows[start : start + chunk_size])
+        self.db.session.commit()
+        ids: list[str] = [row["id"] for row in rows]
+        self._invalidate(*ids)
+        return ids
+
+    def delete_user(
+        self,
+        user_id: str,
+        purge_messages: bool = True,
+        chunk_size: int = DELETE_CHUNK_SIZE,
+    ) -> bool:
+        """Delete a user based on their ID. Returns true if user was deleted.
 
-        self.db.session.delete(user)
+        The user goes first, in a single DELETE, so no more messages can be sent to
+        or by them while their messages are deleted, and a pending purge of their
+        messages is recorded in the same transaction.  With purge_messages False the
+        messages are left for the background purger.
+        """
+        # The default synchronisation evicts a copy of the user the session holds.
+        deleted = self.db.session.execute(
+            delete(User).where(User.id == user_id).returning(User.id)
+        ).all()
+        if deleted:
+            self.db.session.execute(user_purge.record_pending(user_id))
         self.db.session.commit()
+        if not deleted:
+            return False
+
+        self._invalidate(user_id)
+        if purge_messages:
+            self.purge_user_messages(user_id, chunk_size)
         return True
 
+    def purge_user_messages(
+        self, user_id: str, chunk_size: int = DELETE_CHUNK_SIZE
+    ) -> int:
+        """Delete the messages sent to and by a user, returning how many there were.
+
+        Messages are deleted chunk_size at a time, found through the recipient and
+        author indexes, and each chunk is committed on its own so other writers are
+        not held up for the whole purge.  The user's pending purge goes last.
+        """
+        self.db.session.commit()
+        return user_purge.purge_user(self.db.engine, user_id, chunk_size)
+
+    def user_exists(self, user_id: str) -> bool:
+        """Return True if the user is in the database, bypassing the cache."""
+        return (
+            self.db.session.scalar(select(User.id).where(User.id == user_id))
+            is not None
+        )
+
+    def user_was_deleted(self, user_id: str) -> bool:
+        """Return True if the user was deleted, whether or not their purge is done."""
+        return (
+            self.db.session.scalar(
+                select(user_purge.PENDING_PURGES.c.user_id).where(
+                    user_purge.PENDING_PURGES.c.user_id == user_id
+                )
+            )
+            is not None
+        )
+
+    def count_remaining_messages(self, user_id: str) -> int:
+        """Count the messages still sent to or by a user, through the indexes."""
+        return self.db.session.scalar(
+            select(
+                select(func.count())
+                .where(Message.recipient_id == user_id)
+                .scalar_subquery()
+                + select(func.count())
+                .where(Message.author_id == user_id)
+                .scalar_subquery()
+            )
+        )
+
     def update_user(self, user_id: str, new_user: User) -> User | None:
         """Update a user based on their ID. Returns true if user was updated."""
-        user: User = self.get_user(user_id)
+        user: User = self.db.session.get(User, user_id)
         if not user:
             return
 
         user.name = new_user.name or user.name
         user.email = new_user.email or user.email
         self.db.session.commit()
+        self._invalidate(user_id)
         return user
 
-    def get_user_messages(self, user_id: str, limit: int) -> [Message]:
-        """Fetch messages sent to a user based on their ID.
+    def get_user_messages(
+        self,
+        user_id: str,
+        limit: int,
+        cursor: tuple[datetime, str] | None = None,
+        before: datetime | None = None,
+        after: datetime | None = None,
+    ) -> tuple[int, list[Message]] | None:
+        """Fetch messages sent to a user based on their ID, newest first.
 
+        Returns the user's inbox version with the messages, or None if there is no
+        such user.  The user is LEFT JOINed to their messages so that one statement
+        both checks the user and fetches the page.
         "limit" specifies the maximum number of messages to return.
+        "cursor" is the (timestamp, id) of the last message on the previous page; the
+        query seeks past it rather than using OFFSET so every page costs the same.
+        "before" and "after" restrict the messages to a window of time.
         """
-        query: Result = (
-            self.db.session.query(Message)
-            .filter(Message.recipient_id == user_id)
+        rows = self.db.session.execute(
+            select_user_messages(user_id, limit, cursor, before, after)
+        ).all()
+        if not rows:
+            return None
+
+        # A user without messages still has one row, with no message in it.
+        return rows[0][0], [message for _, message in rows if message is not None]
+
+    def get_user_messages_since(
+        self, user_id: str, sequence: int, limit: int
+    ) -> list[Message]:
+        """Fetch messages sent to a user after the sequence, in commit order.
+
+        "sequence" is that of the last message the caller has.  Sequences are given
+        out as messages are committed, so a message committed later can never have a
+        lower one and be skipped.
+        """
+        return self.db.session.scalars(
+            select(Message)
+            .where(Message.recipient_id == user_id, Message.sequence > sequence)
+            .order_by(Message.sequence)
             .limit(limit)
+        ).all()
+
+    def get_message_counts(self, user_id: str) -> dict[str, int] | None:
+        """Fetch how many messages a user has received and sent, None if no user.
+
+        The counts are kept on the user by triggers, so this is a primary key lookup
+        rather than a count of the messages.
+        """
+        row = self.db.session.execute(
+            select(User.received_count, User.sent_count).where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None
+
+        return {"received": row.received_count, "sent": row.sent_count}
+
+    def get_inbox_version(self, user_id: str) -> int | None:
+        """Fetch the version of a user's inbox, None if there is no such user.
+
+        The version changes whenever a message to the user is added or removed.
+        """
+        return self.db.session.scalar(
+            select(User.inbox_version).where(User.id == user_id)
         )
 
-        return query.all()
+    def search_user_messages(
+        self,
+        user_id: str,
+        terms: list[str],
+        limit: int,
+        cursor: tuple[float, str] | None = None,
+    ) -> list[tuple[Message, float]]:
+        """Search the messages sent to a user, best match first.
+
+        Returns each message with its score.  "cursor" is the (score, id) of the last
+        message on the previous page.
+        """
+        return search.search_messages(self.db.session, user_id, terms, limit, cursor)
+
+    def iter_user_messages(
+        self, user_id: str, batch_size: int = EXPORT_BATCH_SIZE
+    ) -> Iterator[Message]:
+        """Stream every message sent to a user, newest first, in batches."""
+        return iter(
+            self.db.session.query(Message)
+            .filter(Message.recipient_id == user_id)
+            .order_by(Message.timestamp.desc(), Message.id.desc())
+            .yield_per(batch_size)
+        )
 
     def send_user_message(
         self, author_id: str, recipient_id: str, content: str
-    ) -> Message:
-        """Send a message from author_id to recipient_id."""
+    ) -> Message | None:
+        """Send a message from author_id to recipient_id.
+
+        Returns None if the author or recipient does not exist.  The message is
+        inserted with INSERT ... SELECT guarded by the existence of both users, so
+        the check and the insert are a single statement.  With group commit enabled
+        the insert is committed in a batch with other sends, and this returns once
+        that batch is committed.
+        """
         message: Message = Message(author_id, recipient_id, content)
-        self.db.session.add(message)
+        statement: Insert = insert_message_if_users_exist(message)
+        if (writer := group_commit.queue_for(self.db.engine)) is not None:
+            return message if writer.submit(statement) else None
+
+        result = self.db.session.execute(statement)
         self.db.session.commit()
-        return message
+        return message if result.rowcount else None
 
-    def delete_user_message(self, recipient_id: str, message_id: str) -> bool:
-        """Delete a message sent to the recipient with the provided message ID."""
-        if (
-            message := self.db.session.query(Message)
-            .filter_by(id=message_id, recipient_id=recipient_id)
-            .first()
-        ):
-            self.db.session.delete(message)
+    def broadcast_user_message(
+        self,
+        author_id: str,
+        recipient_ids: list[str] | None,
+        content: str,
+        chunk_size: int = INSERT_CHUNK_SIZE,
+    ) -> tuple[int, list[str]] | None:
+        """Send the same message from author_id to many recipients at once.
+
+        "recipient_ids" of None sends to every user except the author, in a single
+        INSERT ... SELECT from users.  Otherwise the messages are inserted chunk_size
+        recipients at a time, each INSERT ... SELECT returning the recipients that
+        exist, within one transaction.  Returns the number of messages sent and the
+        requested recipients that do not exist, or None if the author does not.
+        """
+        if recipient_ids is None:
+            sent: int = self.db.session.execute(
+                broadcast_from_users(author_id, content)
+            ).rowcount
+            unknown: list[str] = []
+        else:
+            requested: list[str] = sorted(set(recipient_ids) - {author_id})
+            known: set[str] = set()
+            for start in range(0, len(requested), chunk_size):
+                chunk = requested[start : start + chunk_size]
+                known.update(
+                    self.db.session.scalars(
+                        broadcast_from_users(
+                            author_id, content, User.id.in_(chunk)
+                        ).returning(Message.recipient_id)
+                    )
+                )
+            sent = len(known)
+            unknown = [user_id for user_id in requested if user_id not in known]
+
+        if not sent and not self.user_exists(author_id):
+            self.db.session.rollback()
+            return None
+
+        self.db.session.commit()
+        return sent, unknown
+
+    def delete_user_messages(
+        self,
+        recipient_id: str,
+        message_ids: list[str] | None = None,
+        before: datetime | None = None,
+        chunk_size: int = DELETE_CHUNK_SIZE,
+    ) -> tuple[int, list[str]]:
+        """Delete many messages sent to the recipient in one transaction.
+
+        Either the messages with the given IDs are deleted, chunk_size IDs per
+        DELETE ... RETURNING, or every message sent before the given time with a
+        single DELETE.  Returns the number of messages deleted and the requested IDs
+        that were not found.
+        """
+        recipient = Message.recipient_id == recipient_id
+        if message_ids is None:
+            deleted: int = self.db.session.execute(
+                delete(Message).where(recipient, Message.timestamp < before),
+                execution_options={"synchronize_session": False},
+            ).rowcount
             self.db.session.commit()
-            return True
+            return deleted, []
+
+        requested: list[str] = sorted(set(message_ids))
+        found: set[str] = set()
+        for start in range(0, len(requested), chunk_size):
+            chunk = requested[start : start + chunk_size]
+            found.update(
+                self.db.session.scalars(
+                    delete(Message)
+                    .where(recipient, Message.id.in_(chunk))
+                    .returning(Message.id),
+                    execution_options={"synchronize_session": False},
+                )
+            )
+        self.db.session.commit()
+        return len(found), [
+            message_id for message_id in requested if message_id not in found
+        ]
 
-        return False
+    def delete_user_message(self, recipient_id: str, message_id: str) -> bool:
+        """Delete a message sent to the recipient with the provided message ID.
+
+        A single DELETE ... RETURNING both finds and removes the message.
+        """
+        deleted = self.db.session.execute(
+            delete(Message)
+            .where(Message.id == message_id, Message.recipient_id == recipient_id)
+            .returning(Message.id),
+            execution_options={"synchronize_session": False},
+        ).all()
+        self.db.session.commit()
+        return bool(deleted)
@@ -0,0 +1,107 @@
+"""In-process wake-ups for clients waiting on new messages, by recipient.
+
+Streaming clients wait on a subscription rather than polling the database, so an
+idle subscriber costs no queries.  A subscription only says that there may be new
+messages: the subscriber reads them from the database, so the wake-ups of any
+number of sends coalesce into one read and a slow subscriber never falls behind.
+
+The hub only sees messages sent through this process; with several gunicorn
+workers a subscriber hears of sends handled by its own worker straight away and of
+the rest when it reconnects with Last-Event-ID.
+"""
+
+import threading
+
+import prometheus_client
+
+SUBSCRIBERS = prometheus_client.Gauge(
+    "inbox_stream_subscribers", "Clients waiting for new messages"
+)
+
+
+class Subscription:
+    """Whether messages were sent to one user since the subscriber last looked."""
+
+    def __init__(self, hub: "InboxHub", user_id: str):
+        """Start listening for messages sent to the user."""
+        self.hub: InboxHub = hub
+        self.user_id: str = user_id
+        self._woken = threading.Event()
+
+    def wake(self) -> None:
+        """Note that messages were sent, which a waiting subscriber hears at once."""
+        self._woken.set()
+
+    def wait(self, timeout: float) -> bool:
+        """Wait up to timeout seconds to be woken, returning False if it was not.
+
+        Being woken is reset before returning, so messages sent afterwards wake the
+        subscriber again; the caller reads the database only after this returns.
+        """
+        woken: bool = self._woken.wait(timeout)
+        self._woken.clear()
+        return woken
+
+    def close(self) -> None:
+        """Stop listening."""
+        self.hub.unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        """Use the subscription for the duration of a block."""
+        return self
+
+    def __exit__(self, *_) -> None:
+        """Close the subscription at the end of the block."""
+        self.close()
+
+
+class InboxHub:
+    """Registry of subscriptions, woken as messages are sent."""
+
+    def __init__(self):
+        """Start without subscribers."""
+        self._subscriptions: dict[str, set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: str) -> Subscription:
+        """Return a subscription to messages sent to the user from now on."""
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Remove the subscription, if it is still registered."""
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id, set())
+            if subscription not in subscriptions:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+        SUBSCRIBERS.dec()
+
+    def wake(self, *user_ids: str) -> int:
+        """Wake the subscribers of the users, returning how many there are."""
+        with self._lock:
+            subscriptions: list[Subscription] = [
+                subscription
+                for user_id in user_ids
+                for subscription in self._subscriptions.get(user_id, ())
+            ]
+        for subscription in subscriptions:
+            subscription.wake()
+        return len(subscriptions)
+
+    def wake_all(self) -> int:
+        """Wake every subscriber, returning how many there are."""
+        with self._lock:
+            subscriptions: list[Subscription] = [
+                subscription
+                for user_subscriptions in self._subscriptions.values()
+                for subscription in user_subscriptions
+            ]
+        for subscription in subscriptions:
+            subscription.wake()
+        return len(subscriptions)
@@ -0,0 +1,65 @@
+"""Stream newline-delimited JSON responses without materializing the whole body."""
+
+import json
+import zlib
+from typing import Iterable, Iterator
+
+import flask
+
+MIMETYPE: str = "application/x-ndjson"
+CHUNK_SIZE: int = 64 * 1024
+
+
+def loads(body: bytes) -> list:
+    """Parse a newline-delimited JSON body, skipping blank lines."""
+    records: list = []
+    for number, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON on line {number}: {e}") from e
+
+    return records
+
+
+def _ndjson_chunks(records: Iterable[dict]) -> Iterator[bytes]:
+    """Encode one record per line, handing them on in chunks of about CHUNK_SIZE."""
+    buffer = bytearray()
+    for record in records:
+        buffer += json.dumps(record, separators=(",", ":")).encode()
+        buffer += b"\n"
+        if len(buffer) >= CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+
+    if buffer:
+        yield bytes(buffer)
+
+
+def _gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compress the chunks into a single gzip stream as they arrive."""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        if data := compressor.compress(chunk):
+            yield data
+
+    yield compressor.flush()
+
+
+def ndjson_response(records: Iterable[dict], compress: bool = False) -> flask.Response:
+    """Return a streaming response with one JSON document per line.
+
+    The records are consumed lazily while the response is sent, and the request
+    context is kept alive until then so the database session stays open.
+    """
+    chunks: Iterator[bytes] = _ndjson_chunks(records)
+    headers: dict[str, str] = {"Vary": "Accept-Encoding"}
+    if compress:
+        chunks = _gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+
+    return flask.Response(
+        flask.stream_with_context(chunks), mimetype=MIMETYPE, headers=headers
+    )
@@ -0,0 +1,304 @@
+"""Profile single requests in a running server, on request or at a sampling rate.
+
+A request is profiled when it carries a valid signed X-Profile header, when an
+admin has armed the profiler for the next few requests, or at random at the
+sampling rate.  The view of a profiled request runs under cProfile, written as a
+pstats .prof file, or under a stack sampler that reads the request thread's stack
+every millisecond from another thread, written as a speedscope .json file.  The
+sampler costs far less, so it is always the one used at the sampling rate, and one
+sampler thread serves every sampled request in the process.  The file name is
+returned in the X-Profile-File response header, and only the newest max_profiles
+files are kept in the directory.
+
+The X-Profile header is "<expiry>.<signature>", the expiry in Unix seconds and the
+signature its HMAC-SHA256 with the admin token, so a header can be handed out for
+a while without handing out the token.  Print one with
+python -m aloysius_parker.extensions.profiling, with ADMIN_TOKEN set.
+"""
+
+import argparse
+import contextlib
+import cProfile
+import hashlib
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+import flask
+
+PSTATS: str = "pstats"
+SPEEDSCOPE: str = "speedscope"
+FORMATS: tuple[str, ...] = (PSTATS, SPEEDSCOPE)
+HEADER: str = "X-Profile"
+FILE_HEADER: str = "X-Profile-File"
+SAMPLE_INTERVAL_SECONDS: float = 0.001
+DEFAULT_HEADER_TTL_SECONDS: int = 300
+SPEEDSCOPE_SCHEMA: str = "https://www.speedscope.app/file-format-schema.json"
+SUFFIXES: tuple[str, ...] = (".prof", ".speedscope.json")
+DEFAULT_MAX_PROFILES: int = 100
+STATUS_PROFILES: int = 20
+
+
+def sign(key: str, expiry: int) -> str:
+    """Return an X-Profile header value valid until the expiry, in Unix seconds."""
+    signature: str = hmac.new(
+        key.encode(), str(expiry).encode(), hashlib.sha256
+    ).hexdigest()
+    return f"{expiry}.{signature}"
+
+
+def verify(key: str | None, value: str | None, now: float | None = None) -> bool:
+    """Return True if the header value is signed with the key and has not expired."""
+    if not key or not value or "." not in value:
+        return False
+
+    expiry, _ = value.split(".", 1)
+    if not expiry.isdigit() or int(expiry) < (now or time.time()):
+        return False
+
+    return hmac.compare_digest(value, sign(key, int(expiry)))
+
+
+class StackRecording:
+    """The sampled stacks of one thread, for a speedscope profile."""
+
+    def __init__(self, thread_id: int):
+        """Define the thread whose stacks are recorded."""
+        self.thread_id: int = thread_id
+        self.frames: dict[tuple[str, str, int], int] = {}
+        self.samples: list[list[int]] = []
+        self.weights: list[float] = []
+        self.previous: float = time.perf_counter()
+
+    def add(self, frame, now: float) -> None:
+        """Record the stack ending in the frame, root first."""
+        stack: list[int] = []
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_name, code.co_filename, code.co_firstlineno)
+            stack.append(self.frames.setdefault(key, len(self.frames)))
+            frame = frame.f_back
+        self.samples.append(stack[::-1])
+        self.weights.append(now - self.previous)
+        self.previous = now
+
+    def speedscope(self, name: str) -> dict:
+        """Return the samples in the speedscope file format."""
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "shared": {
+                "frames": [
+                    {"name": function, "file": file, "line": line}
+                    for function, file, line in self.frames
+                ]
+            },
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(self.weights),
+                    "samples": self.samples,
+                    "weights": self.weights,
+                }
+            ],
+            "name": name,
+            "exporter": "aloysius_parker",
+        }
+
+
+class StackSampler:
+    """One thread sampling the stacks of every thread being recorded, at an interval.
+
+    The thread is started by the first recording and exits when none are left, so
+    concurrent sampled requests share it rather than starting one each.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL_SECONDS):
+        """Define how often to sample."""
+        self.interval: float = interval
+        self._recordings: dict[int, StackRecording] = {}
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def record(self, thread_id: int) -> Iterator[StackRecording]:
+        """Sample the thread's stack for the duration of the block."""
+        recording = StackRecording(thread_id)
+        with self._lock:
+            self._recordings[thread_id] = recording
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._sample, name="request-profiler", daemon=True
+                )
+                self._thread.start()
+        try:
+            yield recording
+        finally:
+            with self._lock:
+                self._recordings.pop(thread_id, None)
+
+    def _sample(self) -> None:
+        """Record the stacks of the threads being recorded, until there are none."""
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            now: float = time.perf_counter()
+            with self._lock:
+                if not self._recordings:
+                    self._thread = None
+                    return
+                for thread_id, recording in self._recordings.items():
+                    recording.add(frames.get(thread_id), now)
+
+
+class RequestProfiler:
+    """Decides which requests to profile and writes their profiles."""
+
+    def __init__(
+        self,
+        directory: str | Path,
+        key: str | None = None,
+        sample_rate: float = 0.0,
+        profile_format: str = PSTATS,
+        max_profiles: int = DEFAULT_MAX_PROFILES,
+    ):
+        """Define where profiles go, how many to keep, the signing key and rate."""
+        self.directory: Path = Path(directory)
+        self.key: str | None = key
+        self.sample_rate: float = sample_rate
+        self.profile_format: str = profile_format
+        self.max_profiles: int = max_profiles
+        self.armed: int = 0
+        self.sampler = StackSampler()
+        self._lock = threading.Lock()
+        # cProfile can only run one profile at a time in a process.
+        self._cprofile = threading.Lock()
+
+    def arm(self, requests: int) -> None:
+        """Profile the next few requests this process handles."""
+        with self._lock:
+            self.armed = requests
+
+    def wanted(self, header: str | None) -> str | None:
+        """Return the format to profile the request in, None to not profile it."""
+        if verify(self.key, header):
+            return self.profile_format
+
+        with self._lock:
+            if self.armed > 0:
+                self.armed -= 1
+                return self.profile_format
+
+        if self.sample_rate and random.random() < self.sample_rate:
+            return SPEEDSCOPE
+
+        return None
+
+    @contextlib.contextmanager
+    def profile(self, profile_format: str, name: str) -> Iterator[Path | None]:
+        """Profile the block, yielding the file the profile will be written to.
+
+        Yields None, and does not profile, when cProfile is already busy.
+        """
+        # Named from the time to the microsecond, so the names sort oldest first.
+        stamp: str = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        stem: str = f"{stamp}-{name}-{uuid.uuid4().hex[:8]}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if profile_format == SPEEDSCOPE:
+            path: Path = self.directory / f"{stem}.speedscope.json"
+            with self.sampler.record(threading.get_ident()) as recording:
+                yield path
+            path.write_text(json.dumps(recording.speedscope(name)))
+            self._rotate()
+            return
+
+        if not self._cprofile.acquire(blocking=False):
+            yield None
+            return
+
+        path = self.directory / f"{stem}.prof"
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                yield path
+            finally:
+                profiler.disable()
+            profiler.dump_stats(path)
+        finally:
+            self._cprofile.release()
+        self._rotate()
+
+    def profiles(self) -> list[Path]:
+        """Return the profiles in the directory, newest first."""
+        if not self.directory.is_dir():
+            return []
+
+        return sorted(
+            (path for path in self.directory.iterdir() if path.name.endswith(SUFFIXES)),
+            reverse=True,
+        )
+
+    def _rotate(self) -> None:
+        """Delete all but the newest max_profiles profiles."""
+        for path in self.profiles()[self.max_profiles :]:
+            path.unlink(missing_ok=True)
+
+    def status(self) -> dict:
+        """Return the profiler's settings and the latest profiles, newest first."""
+        return {
+            "armed": self.armed,
+            "sample_rate": self.sample_rate,
+            "format": self.profile_format,
+            "directory": str(self.directory),
+            "max_profiles": self.max_profiles,
+            "profiles": [path.name for path in self.profiles()[:STATUS_PROFILES]],
+        }
+
+
+def instrument(flask_api: flask.Flask, profiler: RequestProfiler) -> None:
+    """Run the app's views under the profiler for the requests it picks."""
+    dispatch = flask_api.dispatch_request
+
+    def dispatch_request():
+        if not (profile_format := profiler.wanted(flask.request.headers.get(HEADER))):
+            return dispatch()
+
+        name: str = flask.request.endpoint or "unknown"
+        with profiler.profile(profile_format, name) as path:
+            response = flask_api.make_response(dispatch())
+        if path is not None:
+            response.headers[FILE_HEADER] = path.name
+        return response
+
+    flask_api.dispatch_request = dispatch_request
+
+
+def main() -> None:
+    """Print an X-Profile header value signed with ADMIN_TOKEN."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        "--ttl", type=int, default=DEFAULT_HEADER_TTL_SECONDS, help="seconds valid"
+    )
+    args = parser.parse_args()
+
+    if not (key := os.environ.get("ADMIN_TOKEN")):
+        raise SystemExit("ADMIN_TOKEN is not set")
+
+    print(f"{HEADER}: {sign(key, int(time.time()) + args.ttl)}")
+
+
+if __name__ == "__main__":
+    main()
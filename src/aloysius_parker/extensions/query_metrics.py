@@ -0,0 +1,105 @@
+"""Count and time the SQL statements each endpoint sends to the database.
+
+Cursor execute hooks on the engine record every statement's latency and count,
+labelled by the Flask endpoint that issued it and by the statement's fingerprint,
+so an endpoint that starts sending an extra query shows up as a new series or a
+higher count per request.  Statements sent outside a request, by the group commit
+writer or the retention worker, are labelled with the endpoint "none".
+
+A fingerprint is the statement with literals replaced by ?, lists of placeholders
+and rows of a multi-row INSERT collapsed to one, and the column list of a simple
+SELECT elided, so the number of series is bounded by the statements in the code.
+"""
+
+import functools
+import re
+import time
+
+import flask
+import prometheus_client
+from sqlalchemy import Engine, event
+
+OUTSIDE_REQUEST: str = "none"
+
+STATEMENT_SECONDS = prometheus_client.Histogram(
+    "sql_statement_seconds",
+    "Time to execute each SQL statement",
+    ["endpoint", "fingerprint"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+STATEMENTS = prometheus_client.Counter(
+    "sql_statements", "SQL statements executed", ["endpoint", "fingerprint"]
+)
+STATEMENTS_PER_REQUEST = prometheus_client.Histogram(
+    "sql_statements_per_request",
+    "SQL statements executed by each request",
+    ["endpoint"],
+    buckets=(0, 1, 2, 3, 4, 5, 8, 13, 21, 34, 55),
+)
+
+# Key of the start times of the statements running on a connection.
+_STARTED: str = "query_metrics_started"
+
+_SELECT_COLUMNS = re.compile(r"^SELECT [^()]*? FROM ")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"\(\?(?:, \?)+\)")
+_REPEATED_ROWS = re.compile(r"(\([^()]*\))(?:, \1)+")
+_SPACE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(statement: str) -> str:
+    """Return the statement normalised so that every call of a query looks alike."""
+    normalised: str = _SPACE.sub(" ", statement).strip()
+    normalised = _STRING.sub("?", normalised)
+    normalised = _NUMBER.sub("?", normalised)
+    normalised = _PLACEHOLDERS.sub("(?)", normalised)
+    normalised = _REPEATED_ROWS.sub(r"\1", normalised)
+    return _SELECT_COLUMNS.sub("SELECT ... FROM ", normalised)
+
+
+def current_endpoint() -> str:
+    """Return the endpoint of the request being handled, "none" outside of one."""
+    if not flask.has_request_context():
+        return OUTSIDE_REQUEST
+
+    return flask.request.endpoint or OUTSIDE_REQUEST
+
+
+def _start(conn, *_) -> None:
+    """Note when the statement was sent."""
+    conn.info.setdefault(_STARTED, []).append(time.perf_counter())
+
+
+def _record(conn, _cursor, statement: str, *_) -> None:
+    """Record the statement's latency against the endpoint and its fingerprint."""
+    seconds: float = time.perf_counter() - conn.info[_STARTED].pop()
+    labels: tuple[str, str] = (current_endpoint(), fingerprint(statement))
+    STATEMENT_SECONDS.labels(*labels).observe(seconds)
+    STATEMENTS.labels(*labels).inc()
+    if flask.has_request_context():
+        flask.g.sql_statements = flask.g.get("sql_statements", 0) + 1
+
+
+def _forget(exception_context) -> None:
+    """Drop the start time of a statement that failed."""
+    if exception_context.connection is not None:
+        if started := exception_context.connection.info.get(_STARTED):
+            started.pop()
+
+
+def _observe_request(_exception: BaseException | None) -> None:
+    """Record how many statements the request executed."""
+    if endpoint := flask.request.endpoint:
+        STATEMENTS_PER_REQUEST.labels(endpoint).observe(
+            flask.g.get("sql_statements", 0)
+        )
+
+
+def instrument(flask_api: flask.Flask, engine: Engine) -> None:
+    """Record the statements the app's requests execute on the engine."""
+    event.listen(engine, "before_cursor_execute", _start)
+    event.listen(engine, "after_cursor_execute", _record)
+    event.listen(engine, "handle_error", _forget)
+    flask_api.teardown_request(_observe_request)
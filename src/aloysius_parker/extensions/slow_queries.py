@@ -0,0 +1,156 @@
+"""Log the SQL statements that take longer than a threshold, with their query plans.
+
+Each slow statement is logged as a warning and kept in a ring buffer of the most
+recent ones for the admin endpoint.  An entry has the endpoint that sent the
+statement, its parameters with any text other than IDs redacted, and for SQLite
+the EXPLAIN QUERY PLAN taken straight after it ran.  A plan that scans the whole
+of the messages table, rather than seeking one of its indexes, is flagged.
+"""
+
+import collections
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+import prometheus_client
+from sqlalchemy import Engine, event
+
+from aloysius_parker.extensions.query_metrics import current_endpoint
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD_SECONDS: float = 0.1
+DEFAULT_CAPACITY: int = 100
+REDACTED: str = "<redacted>"
+
+SLOW_STATEMENTS = prometheus_client.Counter(
+    "sql_slow_statements",
+    "SQL statements slower than the slow query threshold",
+    ["endpoint", "full_scan"],
+)
+
+# Key of the start times of the statements running on a connection.
+_STARTED: str = "slow_queries_started"
+# Message and user IDs are UUID hex, which is safe to show.
+_ID = re.compile(r"[0-9a-f]{32}")
+# A SCAN reads every row, even through an index; only a SEARCH seeks some of them.
+_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?messages\b")
+
+
+def redact(value: Any) -> Any:
+    """Return the parameters with every string that is not an ID redacted."""
+    if isinstance(value, dict):
+        return {name: redact(item) for name, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if isinstance(value, str) and not _ID.fullmatch(value):
+        return REDACTED
+    if isinstance(value, (bytes, bytearray)):
+        return REDACTED
+    if isinstance(value, datetime):
+        return value.isoformat()
+
+    return value
+
+
+def is_full_scan(plan: list[str]) -> bool:
+    """Return True if a step of the plan reads every row of messages."""
+    return any(_FULL_SCAN.match(step) for step in plan)
+
+
+class SlowQueryLog:
+    """Ring buffer of the statements that took longer than the threshold."""
+
+    def __init__(
+        self,
+        threshold: float = DEFAULT_THRESHOLD_SECONDS,
+        capacity: int = DEFAULT_CAPACITY,
+    ):
+        """Define how slow a statement must be to log and how many are kept."""
+        self.threshold: float = threshold
+        self._entries: collections.deque[dict] = collections.deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def instrument(self, engine: Engine) -> None:
+        """Time the statements executed on the engine."""
+        event.listen(engine, "before_cursor_execute", self._start)
+        event.listen(engine, "after_cursor_execute", self._check)
+        event.listen(engine, "handle_error", self._forget)
+
+    def entries(self) -> list[dict]:
+        """Return the slow statements kept, the most recent first."""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def record(
+        self,
+        statement: str,
+        parameters: Any,
+        seconds: float,
+        plan: list[str] | None = None,
+    ) -> dict:
+        """Log a slow statement and keep it in the buffer."""
+        entry: dict = {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "endpoint": current_endpoint(),
+            "seconds": round(seconds, 6),
+            "statement": statement,
+            "parameters": redact(parameters),
+            "plan": plan,
+            "full_scan": bool(plan) and is_full_scan(plan),
+        }
+        with self._lock:
+            self._entries.append(entry)
+
+        SLOW_STATEMENTS.labels(entry["endpoint"], str(entry["full_scan"])).inc()
+        LOG.warning(
+            "Slow query, %.3fs on %s%s: %s %s plan: %s",
+            seconds,
+            entry["endpoint"],
+            ", full scan of messages" if entry["full_scan"] else "",
+            statement,
+            entry["parameters"],
+            plan,
+        )
+        return entry
+
+    def _start(self, conn, *_) -> None:
+        """Note when the statement was sent."""
+        conn.info.setdefault(_STARTED, []).append(time.perf_counter())
+
+    def _check(self, conn, cursor, statement, parameters, _context, executemany):
+        """Record the statement if it took longer than the threshold."""
+        seconds: float = time.perf_counter() - conn.info[_STARTED].pop()
+        if seconds < self.threshold:
+            return
+
+        plan: list[str] | None = None
+        if conn.dialect.name == "sqlite" and not executemany:
+            plan = _explain(cursor, statement, parameters)
+        self.record(statement, parameters, seconds, plan)
+
+    def _forget(self, exception_context) -> None:
+        """Drop the start time of a statement that failed."""
+        if exception_context.connection is not None:
+            if started := exception_context.connection.info.get(_STARTED):
+                started.pop()
+
+
+def _explain(cursor, statement: str, parameters: Any) -> list[str] | None:
+    """Return the SQLite query plan steps for the statement, None if it has none.
+
+    The plan is read on a new cursor of the same DBAPI connection, so it sees the
+    same transaction and does not go through the engine's events again.
+    """
+    explain = cursor.connection.cursor()
+    try:
+        explain.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [row[-1] for row in explain.fetchall()]
+    except Exception:  # the plan is a diagnostic, it must not fail the request
+        LOG.debug("Could not explain %s", statement, exc_info=True)
+        return None
+    finally:
+        explain.close()
@@ -0,0 +1,44 @@
+"""Handle functions for /blueprints/admin.py."""
+
+import hmac
+from http import HTTPStatus
+
+import flask
+
+
+def check_token(authorization: str | None):
+    """Return an error unless the bearer token is the configured admin token.
+
+    Without an ADMIN_TOKEN the admin endpoints are disabled.
+    """
+    if not (token := flask.current_app.config.get("ADMIN_TOKEN")):
+        return {"error": "admin endpoints are disabled"}, HTTPStatus.FORBIDDEN
+
+    if not hmac.compare_digest(authorization or "", f"Bearer {token}"):
+        return {"error": "admin token required"}, HTTPStatus.UNAUTHORIZED
+
+    return None
+
+
+def get_slow_queries():
+    """Return the slow queries kept by the slow query log."""
+    return flask.current_app.extensions["slow_queries"].entries()
+
+
+def get_profiling():
+    """Return the profiler's settings and the profiles it has written."""
+    return flask.current_app.extensions["profiler"].status()
+
+
+def set_profiling(data: dict):
+    """Arm the profiler for the next requests and set its sampling rate.
+
+    Only the process handling this request changes; each gunicorn worker has its
+    own profiler.
+    """
+    profiler = flask.current_app.extensions["profiler"]
+    if "requests" in data:
+        profiler.arm(data["requests"])
+    if "sample_rate" in data:
+        profiler.sample_rate = data["sample_rate"]
+    return profiler.status()
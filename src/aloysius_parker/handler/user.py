@@ -1,44 +1,187 @@
 """Handle functions for /blueprints/user.py."""
 
+import hashlib
+import json
+import time
 from http import HTTPStatus
+from typing import Iterator
 
+import flask
+from marshmallow import ValidationError
+from werkzeug.datastructures import ETags
+from werkzeug.http import quote_etag
+
+from aloysius_parker.database import user_purge
 from aloysius_parker.database.db import database
 from aloysius_parker.database.message import Message
 from aloysius_parker.database.user import User
 from aloysius_parker.database.user_repository import UserRepository
+from aloysius_parker.extensions import ndjson
+from aloysius_parker.extensions.inbox_hub import InboxHub, Subscription
+from aloysius_parker.models.cursor import encode_cursor
+from aloysius_parker.models.message import StreamMessagesSchemaArguments
 
+# Cached as configure_user_cache says, which is not at all by default.
 USERS = UserRepository(database)
+INBOXES = InboxHub()
 GET_MESSAGES_MIN_LIMIT: int = 1
 GET_MESSAGES_MAX_LIMIT: int = 100
 
+# Streams end before gunicorn's 30 second worker timeout and clients reconnect with
+# Last-Event-ID, as EventSource does by itself.
+STREAM_MAX_SECONDS: float = 25.0
+STREAM_HEARTBEAT_SECONDS: float = 10.0
+STREAM_RETRY_MILLISECONDS: int = 1000
+LONG_POLL_WAIT_SECONDS: float = 20.0
+
+# Users with this many messages have them deleted after the response is sent.
+ASYNC_DELETE_MIN_MESSAGES: int = 10_000
+
+
+def _etag(*parts) -> str:
+    """Return a strong entity tag identifying the parts of a representation."""
+    data: bytes = json.dumps(parts, sort_keys=True, default=str).encode()
+    return hashlib.sha1(data).hexdigest()
+
 
-def fetch_user(user_id: str):
-    """Fetch a user based on id."""
-    if user := USERS.get_user(user_id):
-        return user.to_json()
+def _matches(if_none_match: ETags | None, etag: str) -> bool:
+    """Return True if If-None-Match holds the entity tag, or is *.
 
-    return {"error": "user not found"}, HTTPStatus.NOT_FOUND
+    If-None-Match compares weakly, so W/"tag" matches as well as "tag".
+    """
+    return bool(if_none_match) and if_none_match.contains_weak(etag)
+
+
+def _not_modified(etag: str):
+    """Return an empty 304 response carrying the entity tag."""
+    return "", HTTPStatus.NOT_MODIFIED, {"ETag": quote_etag(etag)}
+
+
+def fetch_user(user_id: str, if_none_match: ETags | None = None, counts: bool = False):
+    """Fetch a user based on id, with their message counts if asked.
+
+    Answers 304 when the client already holds the current representation.
+    """
+    if not (user := USERS.get_user(user_id)):
+        return {"error": "user not found"}, HTTPStatus.NOT_FOUND
+
+    data: dict = user.to_json()
+    # The cached user would hold stale counts, so they are read on their own.
+    if counts and (message_counts := USERS.get_message_counts(user_id)):
+        data["message_counts"] = message_counts
+    etag: str = _etag(data)
+    if _matches(if_none_match, etag):
+        return _not_modified(etag)
+
+    return data, HTTPStatus.OK, {"ETag": quote_etag(etag)}
 
 
 def delete_user(user_id: str):
-    """Delete a user based on id."""
-    if USERS.delete_user(user_id):
+    """Delete a user based on id, along with the messages sent to and by them.
+
+    A user with at least ASYNC_DELETE_MIN_MESSAGES messages is deleted straight
+    away but their messages by the background purger, answering 202 with the URL to
+    follow the deletion at.
+    """
+    if not (counts := USERS.get_message_counts(user_id)):
+        return {"error": "user not found"}, HTTPStatus.NOT_FOUND
+
+    total: int = counts["received"] + counts["sent"]
+    in_background: bool = total >= ASYNC_DELETE_MIN_MESSAGES
+    if not USERS.delete_user(user_id, purge_messages=not in_background):
+        return {"error": "user not found"}, HTTPStatus.NOT_FOUND
+
+    if not in_background:
         return "", HTTPStatus.NO_CONTENT
 
-    return {"error": "user not found"}, HTTPStatus.NOT_FOUND
+    user_purge.purger_for(database.engine).wake()
+    location: str = flask.url_for("user.UserDeletionEndpoint", user_id=user_id)
+    return {"remaining_messages": total}, HTTPStatus.ACCEPTED, {"Location": location}
+
 
+def get_user_deletion(user_id: str):
+    """Report how many messages of a deleted user are still to be deleted.
 
-def get_user_messages(user_id: str, args: dict):
-    """Retrieve all messages for a user based on id."""
+    Whether the user exists is read from the database rather than the cache, which
+    in another worker could still hold the user.
+    """
+    if USERS.user_exists(user_id):
+        return {"error": "user has not been deleted"}, HTTPStatus.CONFLICT
+    if not USERS.user_was_deleted(user_id):
+        return {"error": "user not found"}, HTTPStatus.NOT_FOUND
+
+    remaining: int = USERS.count_remaining_messages(user_id)
+    return {"remaining_messages": remaining, "done": remaining == 0}
+
+
+def get_user_messages(user_id: str, args: dict, if_none_match: ETags | None = None):
+    """Retrieve a page of messages for a user based on id.
+
+    With q the page holds the best matching messages rather than the newest.  The
+    cursor for the following page is returned in the X-Pagination header, and is null
+    on the last page.  The entity tag is derived from the inbox version and the
+    arguments, so a client that already holds the page gets a 304 after a single
+    lookup of the version, without any messages being read.
+    """
     limit: int = args.get("limit", 50)
 
-    if not USERS.get_user(user_id):
+    if if_none_match or "q" in args:
+        if (version := USERS.get_inbox_version(user_id)) is None:
+            return {"error": "user not found"}, HTTPStatus.NOT_FOUND
+        if _matches(if_none_match, etag := _etag(user_id, version, args)):
+            return _not_modified(etag)
+
+    # Fetch one extra message to find out whether there is another page.  Each
+    # message is paired with the first element of its sort key for the cursor.
+    if "q" in args:
+        page: list[tuple[Message, float | str]] = USERS.search_user_messages(
+            user_id, args["q"].split(), limit + 1, args.get("cursor")
+        )
+    else:
+        if not (
+            result := USERS.get_user_messages(
+                user_id,
+                limit + 1,
+                cursor=args.get("cursor"),
+                before=args.get("before"),
+                after=args.get("after"),
+            )
+        ):
+            return {"error": "user not found"}, HTTPStatus.NOT_FOUND
+
+        version, messages = result
+        page = [(message, message.timestamp.isoformat()) for message in messages]
+
+    headers: dict[str, str] = {"ETag": quote_etag(_etag(user_id, version, args))}
+    if not page:
+        return "", HTTPStatus.NO_CONTENT, headers
+
+    next_cursor: str | None = None
+    if len(page) > limit:
+        page = page[:limit]
+        last_message, last_key = page[-1]
+        next_cursor = encode_cursor(last_key, last_message.id)
+
+    headers["X-Pagination"] = json.dumps({"next_cursor": next_cursor})
+    return [message for message, _ in page], HTTPStatus.OK, headers
+
+
+def count_user_messages(user_id: str):
+    """Return how many messages a user has received and sent."""
+    if not (counts := USERS.get_message_counts(user_id)):
         return {"error": "user not found"}, HTTPStatus.NOT_FOUND
 
-    if not (messages := USERS.get_user_messages(user_id, limit)):
-        return "", HTTPStatus.NO_CONTENT
+    return counts
+
+
+def export_user_messages(user_id: str, compress: bool):
+    """Stream every message for a user as newline-delimited JSON."""
+    if not USERS.get_user(user_id):
+        return {"error": "user not found"}, HTTPStatus.NOT_FOUND
 
-    return [message.to_json() for message in messages]
+    return ndjson.ndjson_response(
+        (message.to_json() for message in USERS.iter_user_messages(user_id)), compress
+    )
 
 
 def edit_user(user_id: str, data: dict):
@@ -54,24 +197,157 @@ def send_user_message(author_id: str, recipient_id: str, content: str):
     """Send a new message with content from author_id to recipient_id."""
     if author_id == recipient_id:
         return {"error": "find some friends"}, HTTPStatus.UPGRADE_REQUIRED
-    elif not (USERS.get_user(author_id) and USERS.get_user(recipient_id)):
+
+    if not (message := USERS.send_user_message(author_id, recipient_id, content)):
         return {"error": "author or recipient not found"}, HTTPStatus.NOT_FOUND
 
-    message: Message = USERS.send_user_message(author_id, recipient_id, content)
+    INBOXES.wake(recipient_id)
     return message.to_json(), HTTPStatus.CREATED
 
 
+def _event_id(sequence: int) -> str:
+    """Return the ID of the event for a message, a cursor on its inbox sequence."""
+    return encode_cursor(sequence)
+
+
+def _end_read() -> None:
+    """End the session's read transaction.
+
+    A stream must not wait holding an old snapshot of the database, or its next read
+    would not see the messages committed in the meantime.
+    """
+    database.session.rollback()
+
+
+def _messages_since(user_id: str, sequence: int) -> list[tuple[int, dict]]:
+    """Return the sequence and JSON of the messages after the sequence, in order."""
+    messages: list[tuple[int, dict]] = [
+        (message.sequence, message.to_json())
+        for message in USERS.get_user_messages_since(
+            user_id, sequence, GET_MESSAGES_MAX_LIMIT
+        )
+    ]
+    _end_read()
+    return messages
+
+
+def _event(sequence: int, message: dict) -> str:
+    """Format the message as a server-sent event."""
+    return f"id: {_event_id(sequence)}\nevent: message\ndata: {json.dumps(message)}\n\n"
+
+
+def _event_stream(
+    user_id: str, subscription: Subscription, sequence: int
+) -> Iterator[str]:
+    """Send the missed messages then new ones as they arrive, with heartbeats.
+
+    The hub only wakes the stream, which then reads the messages after the last
+    one it sent from the database, so they go out in the order they were committed
+    and serialised as any read serialises them.  A full
+    page of messages ends the stream early so the client reconnects for the next.
+    """
+    yield f"retry: {STREAM_RETRY_MILLISECONDS}\n\n"
+    deadline: float = time.monotonic() + STREAM_MAX_SECONDS
+    woken: bool = True
+    while True:
+        if woken:
+            messages: list[tuple[int, dict]] = _messages_since(user_id, sequence)
+            for message_sequence, message in messages:
+                yield _event(message_sequence, message)
+            if len(messages) == GET_MESSAGES_MAX_LIMIT:
+                return
+            if messages:
+                sequence = messages[-1][0]
+
+        if (remaining := deadline - time.monotonic()) <= 0:
+            return
+        woken = subscription.wait(min(STREAM_HEARTBEAT_SECONDS, remaining))
+        if not woken:
+            yield ": keep-alive\n\n"
+
+
+def _holds_a_worker() -> bool:
+    """Return True if the request is served by a gunicorn worker without threads."""
+    environ: dict = flask.request.environ
+    return "gunicorn.socket" in environ and not environ["wsgi.multithread"]
+
+
+def stream_user_messages(
+    user_id: str, args: dict, last_event_id: str | None, event_stream: bool
+):
+    """Wait for messages sent to a user after the last one the client has.
+
+    As server-sent events the messages are pushed as they are sent.  Otherwise this
+    is a long poll returning the waiting messages, oldest first, as soon as there
+    are any, with the ID of the last in the X-Pagination header, or a 204 after
+    waiting.  Waiting is on the in-process hub, without querying the database.
+
+    Resuming is by the sequence of the last message, which follows the order that
+    messages were committed in rather than their timestamps.  A stream holds its
+    thread for up to STREAM_MAX_SECONDS, so it is refused by a sync gunicorn worker,
+    which it would hold entirely; serve with the gthread worker class.
+    """
+    if _holds_a_worker():
+        return {
+            "error": "streaming needs a threaded worker, serve with gthread"
+        }, HTTPStatus.SERVICE_UNAVAILABLE
+
+    cursor: tuple[int] | None = args.get("cursor")
+    if last_event_id:
+        try:
+            header: dict = StreamMessagesSchemaArguments().load(
+                {"cursor": last_event_id}
+            )
+        except ValidationError:
+            return {"error": "invalid Last-Event-ID"}, HTTPStatus.BAD_REQUEST
+        cursor = header["cursor"]
+
+    # Subscribe before reading the inbox so nothing sent in between is missed.
+    subscription: Subscription = INBOXES.subscribe(user_id)
+    if (version := USERS.get_inbox_version(user_id)) is None:
+        subscription.close()
+        return {"error": "user not found"}, HTTPStatus.NOT_FOUND
+    _end_read()
+
+    # Without a cursor the client has every message sent so far.
+    sequence: int = cursor[0] if cursor else version
+    if event_stream:
+        response = flask.Response(
+            flask.stream_with_context(_event_stream(user_id, subscription, sequence)),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        response.call_on_close(subscription.close)
+        return response
+
+    with subscription:
+        messages: list[tuple[int, dict]] = _messages_since(user_id, sequence)
+        if not messages and subscription.wait(args.get("wait", LONG_POLL_WAIT_SECONDS)):
+            messages = _messages_since(user_id, sequence)
+
+    if not messages:
+        return "", HTTPStatus.NO_CONTENT
+
+    pagination: str = json.dumps({"next_cursor": _event_id(messages[-1][0])})
+    return (
+        [message for _, message in messages],
+        HTTPStatus.OK,
+        {"X-Pagination": pagination},
+    )
+
+
 def delete_user_message(recipient_id: str, args: dict):
     """Delete a message sent to the recipient with the provided message ID."""
     message_id: str = args.get("message_id")
 
+    if USERS.delete_user_message(recipient_id, message_id):
+        return "", HTTPStatus.NO_CONTENT
+
+    # Only look for the recipient once the delete has missed, to say why.
     if not USERS.get_user(recipient_id):
         return {"error": "recipient not found"}, HTTPStatus.NOT_FOUND
 
-    if not USERS.delete_user_message(recipient_id, message_id):
-        return {"error": "message not found"}, HTTPStatus.NOT_FOUND
-
-    return "", HTTPStatus.NO_CONTENT
+    return {"error": "message not found"}, HTTPStatus.NOT_FOUND
 
     # if (
     #     message := database.session.query(Message)
@@ -81,3 +357,18 @@ def delete_user_message(recipient_id: str, args: dict):
     #     database.session.delete(message)
     #     database.session.commit()
     #     return "", 204
+
+
+def delete_user_messages(recipient_id: str, data: dict):
+    """Delete the listed messages sent to the recipient, or those sent before a time.
+
+    Returns how many were deleted and which of the listed IDs were not found.
+    """
+    deleted, unknown = USERS.delete_user_messages(
+        recipient_id, data.get("message_ids"), data.get("before")
+    )
+    # Only look for the recipient once nothing was deleted, to say why.
+    if not deleted and not USERS.get_user(recipient_id):
+        return {"error": "recipient not found"}, HTTPStatus.NOT_FOUND
+
+    return {"deleted": deleted, "unknown_message_ids": unknown}
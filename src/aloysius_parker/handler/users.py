@@ -1,19 +1,49 @@
 """Handle functions for /blueprints/users.py."""
 
+import json
+import logging
+import time
 from http import HTTPStatus
 
 from sqlalchemy.exc import SQLAlchemyError
 
-from aloysius_parker.database.db import database
 from aloysius_parker.database.user import User
+from aloysius_parker.extensions import ndjson
+from aloysius_parker.handler.user import INBOXES, USERS
+from aloysius_parker.models.cursor import encode_cursor
+from aloysius_parker.models.user import UserSchema
 
+LOG = logging.getLogger(__name__)
+BATCH_MAX_ROWS: int = 50_000
 
-def get_users():
-    """Retrieve all users."""
-    if users := database.session.query(User).all():
-        return [user.to_json() for user in users]
 
-    return "", HTTPStatus.NO_CONTENT
+def get_users(args: dict):
+    """Retrieve a page of users.
+
+    The cursor for the following page is returned in the X-Pagination header, and is
+    null on the last page.
+    """
+    limit: int = args.get("limit", 50)
+    cursor: tuple[str] | None = args.get("cursor")
+
+    # Fetch one extra user to find out whether there is another page.
+    if not (users := USERS.get_users(limit + 1, cursor[0] if cursor else None)):
+        return "", HTTPStatus.NO_CONTENT
+
+    next_cursor: str | None = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor(users[-1].id)
+
+    pagination: str = json.dumps({"next_cursor": next_cursor})
+    return users, HTTPStatus.OK, {"X-Pagination": pagination}
+
+
+def export_users(compress: bool):
+    """Stream every user as newline-delimited JSON."""
+    return ndjson.ndjson_response(
+        (user.to_json() for user in USERS.iter_users()), compress
+    )
 
 
 def create_user(data: dict):
@@ -32,7 +62,66 @@ def create_user(data: dict):
             "error": f"internal server error: {e}"
         }, HTTPStatus.INTERNAL_SERVER_ERROR
     else:
-        with database.session.begin():
-            database.session.add(user)
+        USERS.create_user(user)
 
     return user.to_json()
+
+
+def create_users(rows: list):
+    """Create many users at once, reporting the outcome of each row.
+
+    Valid rows are inserted together in a single transaction; invalid rows are
+    reported with their validation errors and do not stop the others.
+    """
+    if not isinstance(rows, list) or not rows:
+        return {"error": "expected a non-empty list of users"}, HTTPStatus.BAD_REQUEST
+    if len(rows) > BATCH_MAX_ROWS:
+        return {
+            "error": f"at most {BATCH_MAX_ROWS} users per batch"
+        }, HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+
+    errors: dict = UserSchema(many=True).validate(rows)
+    valid: list[int] = [index for index in range(len(rows)) if index not in errors]
+
+    started: float = time.perf_counter()
+    ids: list[str] = USERS.create_users([rows[index] for index in valid])
+    elapsed: float = time.perf_counter() - started
+    LOG.info(
+        "Inserted %s users in %.3fs (%.0f rows/s)",
+        len(ids),
+        elapsed,
+        len(ids) / elapsed if elapsed else 0,
+    )
+
+    results: list[dict] = [
+        {"index": index, "status": HTTPStatus.UNPROCESSABLE_ENTITY, "errors": error}
+        for index, error in errors.items()
+    ]
+    results += [
+        {"index": index, "status": HTTPStatus.CREATED, "id": user_id}
+        for index, user_id in zip(valid, ids)
+    ]
+    results.sort(key=lambda result: result["index"])
+
+    status = HTTPStatus.MULTI_STATUS if errors else HTTPStatus.CREATED
+    return {"created": len(ids), "failed": len(errors), "results": results}, status
+
+
+def broadcast_message(data: dict):
+    """Send one message from an author to a list of users, or to every user."""
+    recipient_ids: list[str] | None = (
+        None if data["all_users"] else data["recipient_ids"]
+    )
+    if not (
+        result := USERS.broadcast_user_message(
+            data["author_id"], recipient_ids, data["content"]
+        )
+    ):
+        return {"error": "author not found"}, HTTPStatus.NOT_FOUND
+
+    sent, unknown = result
+    if recipient_ids is None:
+        INBOXES.wake_all()
+    else:
+        INBOXES.wake(*(set(recipient_ids) - set(unknown) - {data["author_id"]}))
+    return {"sent": sent, "unknown_recipient_ids": unknown}, HTTPStatus.CREATED
@@ -2,7 +2,16 @@
 
 from flask import Flask
 
-from aloysius_parker.config import blueprints, monitoring, open_api
+from aloysius_parker.config import (
+    blueprints,
+    json_provider,
+    monitoring,
+    open_api,
+    profiling,
+    user_cache,
+)
+from aloysius_parker.config import database as database_config
+from aloysius_parker.database import migrations, user_purge
 from aloysius_parker.database.db import database
 
 
@@ -10,11 +19,15 @@ def create_app() -> Flask:
     """Create a flask application with pre-defined configurations."""
     the_app = Flask(__name__)
     open_api.configure_open_api(the_app)
+    json_provider.configure_json_provider(the_app)
     blueprints.configure_blueprints(the_app)
+    database_config.configure_database(the_app)
     monitoring.configure_monitoring(the_app)
-    database.init_app(the_app)
+    profiling.configure_profiling(the_app)
+    user_cache.configure_user_cache(the_app)
     with the_app.app_context():
-        database.create_all()
+        migrations.set_up(database.engine)
+        user_purge.resume(database.engine)
     return the_app
 
 
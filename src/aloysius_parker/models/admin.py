@@ -0,0 +1,33 @@
+"""Defines the schema for the admin requests."""
+
+from marshmallow import Schema, ValidationError, fields, validates
+
+
+class ProfilingSchema(Schema):
+    """Schema for the POST request to change what the profiler profiles."""
+
+    _MAX_REQUESTS: int = 100
+
+    requests = fields.Integer(
+        required=False,
+        metadata={"description": "Profile this many of the next requests"},
+    )
+
+    sample_rate = fields.Float(
+        required=False,
+        metadata={"description": "Fraction of all requests to profile, 0 to stop"},
+    )
+
+    @validates("requests")
+    def validate_requests(self, value):
+        """Ensure only a few requests are profiled at once."""
+        if not 0 <= value <= self._MAX_REQUESTS:
+            raise ValidationError(
+                f"Requests must be between 0 and {self._MAX_REQUESTS}"
+            )
+
+    @validates("sample_rate")
+    def validate_sample_rate(self, value):
+        """Ensure the sample rate is a fraction."""
+        if not 0 <= value <= 1:
+            raise ValidationError("Sample rate must be between 0 and 1")
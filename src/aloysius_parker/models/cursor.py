@@ -0,0 +1,52 @@
+"""Opaque cursors for keyset (seek) pagination.
+
+A cursor holds the sort key of the last row on a page.  The next page is fetched by
+seeking past that key instead of using OFFSET, so every page costs the same.
+"""
+
+import base64
+import binascii
+import json
+
+from marshmallow import ValidationError, fields
+
+
+def encode_cursor(*values) -> str:
+    """Encode the sort key values of a row into an opaque cursor string."""
+    raw: bytes = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """Decode a cursor string back into the list of sort key values."""
+    padded: str = cursor + "=" * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValidationError("Invalid cursor") from e
+
+    if not isinstance(values, list):
+        raise ValidationError("Invalid cursor")
+
+    return values
+
+
+class Cursor(fields.String):
+    """Query argument holding an opaque cursor.
+
+    Each key field deserializes one element of the sort key, so the view receives a
+    tuple such as (timestamp, id) rather than the encoded string.
+    """
+
+    def __init__(self, *keys: fields.Field, **kwargs):
+        """Define the fields making up the sort key, in order."""
+        super().__init__(**kwargs)
+        self.keys: tuple[fields.Field, ...] = keys
+
+    def _deserialize(self, value, attr, data, **kwargs) -> tuple:
+        """Decode the cursor and deserialize each element of the sort key."""
+        values: list = decode_cursor(super()._deserialize(value, attr, data, **kwargs))
+        if len(values) != len(self.keys):
+            raise ValidationError("Invalid cursor")
+
+        return tuple(key.deserialize(item) for key, item in zip(self.keys, values))
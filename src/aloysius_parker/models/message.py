@@ -1,8 +1,22 @@
 """Defines the schema for the Message object."""
 
 import uuid
+from datetime import timezone
 
-from marshmallow import Schema, ValidationError, fields, validates
+from marshmallow import (
+    Schema,
+    ValidationError,
+    fields,
+    post_load,
+    validates,
+    validates_schema,
+)
+
+from aloysius_parker.models.cursor import Cursor
+
+# Fields for the first element of a message cursor's sort key.
+_TIMESTAMP = fields.NaiveDateTime(timezone=timezone.utc)
+_SEARCH_SCORE = fields.Float()
 
 
 class PostMessageSchema(Schema):
@@ -35,16 +49,78 @@ class PostMessageSchema(Schema):
             )
 
 
+class BroadcastMessageSchema(PostMessageSchema):
+    """Schema for the POST request to send one message to many users."""
+
+    _MAX_RECIPIENTS: int = 50_000
+
+    recipient_ids = fields.List(
+        fields.String(),
+        required=False,
+        metadata={"description": "The users to send the message to"},
+    )
+
+    all_users = fields.Boolean(
+        required=False,
+        load_default=False,
+        metadata={"description": "Send the message to every user except the author"},
+    )
+
+    @validates("recipient_ids")
+    def validate_recipient_ids(self, value):
+        """Ensure there are some recipients, but not too many."""
+        if not value or len(value) > self._MAX_RECIPIENTS:
+            raise ValidationError(
+                f"Between 1 and {self._MAX_RECIPIENTS} recipients are allowed"
+            )
+
+    @validates_schema
+    def validate_recipients_or_all_users(self, data, **kwargs):
+        """Ensure exactly one of recipient_ids or all_users is given."""
+        if ("recipient_ids" in data) == data.get("all_users", False):
+            raise ValidationError("Give either recipient_ids or all_users")
+
+
 class GetMessageSchemaArguments(Schema):
-    """Schema for the GET request to retrieve messages with a limit."""
+    """Schema for the GET request to retrieve a page of messages.
+
+    Messages are returned newest first, or best match first when searching with q.
+    Timestamps without a timezone are taken to be UTC, which is how they are stored.
+    """
 
     _LIMIT_MIN_VALUE: int = 1
     _LIMIT_MAX_VALUE: int = 100
+    _MAX_QUERY_LENGTH: int = 250
 
     limit = fields.Integer(
         required=False, metadata={"description": "Amount of messages to retrieve"}
     )
 
+    # The first element of the sort key is a timestamp, or a search score with q.
+    cursor = Cursor(
+        fields.Raw(),
+        fields.String(),
+        required=False,
+        metadata={"description": "The next_cursor returned with the previous page"},
+    )
+
+    before = fields.NaiveDateTime(
+        required=False,
+        timezone=timezone.utc,
+        metadata={"description": "Only messages sent before this time"},
+    )
+
+    after = fields.NaiveDateTime(
+        required=False,
+        timezone=timezone.utc,
+        metadata={"description": "Only messages sent after this time"},
+    )
+
+    q = fields.String(
+        required=False,
+        metadata={"description": "Only messages containing all of these words"},
+    )
+
     @validates("limit")
     def validate_limit(self, value):
         """Ensure limit is within boundaries is valid."""
@@ -54,6 +130,62 @@ class GetMessageSchemaArguments(Schema):
                 f"{self._LIMIT_MIN_VALUE} and {self._LIMIT_MAX_VALUE}"
             )
 
+    @validates("q")
+    def validate_q(self, value):
+        """Ensure the search has some words, but not too many."""
+        if not value.split() or len(value) > self._MAX_QUERY_LENGTH:
+            raise ValidationError(
+                f"Search must be between 1 and {self._MAX_QUERY_LENGTH} characters"
+            )
+
+    @validates_schema
+    def validate_search_without_window(self, data, **kwargs):
+        """Ensure a search is not combined with a window of time."""
+        if "q" in data and ("before" in data or "after" in data):
+            raise ValidationError("q cannot be combined with before or after")
+
+    @post_load
+    def load_cursor(self, data, **kwargs):
+        """Deserialize the first element of the cursor's sort key."""
+        if "cursor" in data:
+            key, message_id = data["cursor"]
+            field = _SEARCH_SCORE if "q" in data else _TIMESTAMP
+            try:
+                data["cursor"] = (field.deserialize(key), message_id)
+            except ValidationError as e:
+                raise ValidationError("Invalid cursor", "cursor") from e
+
+        return data
+
+
+class StreamMessagesSchemaArguments(Schema):
+    """Schema for the GET request to wait for new messages.
+
+    The cursor is the ID of the last event received, as is the Last-Event-ID header,
+    and holds the sequence of the last message in the inbox the client has.
+    """
+
+    _MAX_WAIT_SECONDS: float = 25.0
+
+    cursor = Cursor(
+        fields.Integer(strict=True),
+        required=False,
+        metadata={"description": "Only messages sent after this event ID"},
+    )
+
+    wait = fields.Float(
+        required=False,
+        metadata={"description": "Seconds a long poll waits for a message"},
+    )
+
+    @validates("wait")
+    def validate_wait(self, value):
+        """Ensure a long poll does not hold the connection for too long."""
+        if not 0 <= value <= self._MAX_WAIT_SECONDS:
+            raise ValidationError(
+                f"Wait must be between 0 and {self._MAX_WAIT_SECONDS} seconds"
+            )
+
 
 class DeleteMessageSchemaArguments(Schema):
     """Schema for the DELETE request to delete a message."""
@@ -61,3 +193,35 @@ class DeleteMessageSchemaArguments(Schema):
     message_id = fields.String(
         required=True, metadata={"description": "The ID of the message to delete"}
     )
+
+
+class DeleteMessagesSchema(Schema):
+    """Schema for the POST request to delete many messages at once."""
+
+    _MAX_MESSAGE_IDS: int = 10_000
+
+    message_ids = fields.List(
+        fields.String(),
+        required=False,
+        metadata={"description": "The IDs of the messages to delete"},
+    )
+
+    before = fields.NaiveDateTime(
+        required=False,
+        timezone=timezone.utc,
+        metadata={"description": "Delete every message sent before this time"},
+    )
+
+    @validates("message_ids")
+    def validate_message_ids(self, value):
+        """Ensure there are some message IDs, but not too many."""
+        if not value or len(value) > self._MAX_MESSAGE_IDS:
+            raise ValidationError(
+                f"Between 1 and {self._MAX_MESSAGE_IDS} message IDs are allowed"
+            )
+
+    @validates_schema
+    def validate_message_ids_or_before(self, data, **kwargs):
+        """Ensure exactly one of message_ids or before is given."""
+        if ("message_ids" in data) == ("before" in data):
+            raise ValidationError("Give either message_ids or before")
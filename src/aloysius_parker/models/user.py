@@ -5,6 +5,8 @@ from email.utils import parseaddr
 
 from marshmallow import Schema, ValidationError, fields, validates, validates_schema
 
+from aloysius_parker.models.cursor import Cursor
+
 
 class UserSchema(Schema):
     """Defines the schema for the User object."""
@@ -84,3 +86,38 @@ class UserPatchSchema(UserSchema):
     def validate_email(self, value):
         """Ensure email is valid."""
         super().validate_email(value)
+
+
+class GetUserSchemaArguments(Schema):
+    """Schema for the GET request to retrieve a single user."""
+
+    counts = fields.Boolean(
+        load_default=False,
+        metadata={"description": "Include how many messages the user has"},
+    )
+
+
+class GetUsersSchemaArguments(Schema):
+    """Schema for the GET request to retrieve a page of users, ordered by id."""
+
+    _LIMIT_MIN_VALUE: int = 1
+    _LIMIT_MAX_VALUE: int = 100
+
+    limit = fields.Integer(
+        required=False, metadata={"description": "Amount of users to retrieve"}
+    )
+
+    cursor = Cursor(
+        fields.String(),
+        required=False,
+        metadata={"description": "The next_cursor returned with the previous page"},
+    )
+
+    @validates("limit")
+    def validate_limit(self, value):
+        """Ensure limit is within boundaries is valid."""
+        if not self._LIMIT_MIN_VALUE <= value <= self._LIMIT_MAX_VALUE:
+            raise ValidationError(
+                f"Limit must be between "
+                f"{self._LIMIT_MIN_VALUE} and {self._LIMIT_MAX_VALUE}"
+            )
@@ -0,0 +1,145 @@
+"""Serve the Flask application with gunicorn, for production and the Docker image.
+
+Workers are threaded by default, since a streamed inbox holds its request open for
+up to its timeout and would tie up a whole sync worker, so streaming is refused on
+sync workers.  The workers and threads are sized from the CPU count unless given,
+and each worker's connection pool from its threads unless DATABASE_POOL_SIZE and
+DATABASE_MAX_OVERFLOW are set, so that no request thread waits for a connection.
+With the default preload the app, its tables and migrations are set up once in the
+master process before it forks, and each worker then replaces the database
+connections it inherited.  An in-memory database is private to each worker, so set
+DATABASE_URL to a database file when running more than one.
+"""
+
+import argparse
+import multiprocessing
+import os
+
+from flask import Flask
+from gunicorn.app.base import BaseApplication
+
+from aloysius_parker.config import database as database_config
+from aloysius_parker.database.db import database
+from aloysius_parker.main import create_app
+
+WORKER_CLASSES: tuple[str, ...] = ("sync", "gthread")
+DEFAULT_WORKER_CLASS: str = "gthread"
+DEFAULT_BIND: str = "0.0.0.0:5000"
+DEFAULT_KEEP_ALIVE_SECONDS: int = 5
+DEFAULT_BACKLOG: int = 2048
+DEFAULT_TIMEOUT_SECONDS: int = 30
+
+
+def worker_count(cpu_count: int, worker_class: str) -> int:
+    """Return (2 x CPUs) + 1 sync workers, or one more than the CPUs with threads."""
+    if worker_class == "gthread":
+        return cpu_count + 1
+
+    return 2 * cpu_count + 1
+
+
+def thread_count(cpu_count: int, worker_class: str) -> int:
+    """Return the threads per worker, two per CPU for gthread and one for sync."""
+    if worker_class == "gthread":
+        return max(2, 2 * cpu_count)
+
+    return 1
+
+
+def pool_settings(threads: int) -> dict[str, str]:
+    """Return the pool environment giving each thread a connection, and as many spare.
+
+    The spares are for the background purges and the group commit writer.
+    """
+    return {"DATABASE_POOL_SIZE": str(threads), "DATABASE_MAX_OVERFLOW": str(threads)}
+
+
+def post_fork(server, worker) -> None:
+    """Stop a worker sharing the master's database connections after a preload."""
+    if not server.cfg.preload_app:
+        return
+
+    with worker.app.wsgi().app_context():
+        # An in-memory database lives in its one connection, so it must be kept.
+        if not database_config.is_in_memory(database.engine.url):
+            database.engine.dispose(close=False)
+
+
+def options(
+    worker_class: str = DEFAULT_WORKER_CLASS,
+    workers: int | None = None,
+    threads: int | None = None,
+    cpu_count: int | None = None,
+    **overrides,
+) -> dict:
+    """Return the gunicorn settings, sizing workers and threads from the CPUs."""
+    cpu_count = cpu_count or multiprocessing.cpu_count()
+    settings: dict = {
+        "bind": DEFAULT_BIND,
+        "worker_class": worker_class,
+        "workers": workers or worker_count(cpu_count, worker_class),
+        "threads": threads or thread_count(cpu_count, worker_class),
+        "preload_app": True,
+        "keepalive": DEFAULT_KEEP_ALIVE_SECONDS,
+        "backlog": DEFAULT_BACKLOG,
+        "timeout": DEFAULT_TIMEOUT_SECONDS,
+        "accesslog": "-",
+        "post_fork": post_fork,
+    }
+    settings.update(overrides)
+    return settings
+
+
+class Server(BaseApplication):
+    """A gunicorn application configured in code rather than by a config file."""
+
+    def __init__(self, settings: dict):
+        """Keep the settings until gunicorn asks for them."""
+        self.settings: dict = settings
+        super().__init__()
+
+    def load_config(self) -> None:
+        """Apply the settings to the gunicorn configuration."""
+        for key, value in self.settings.items():
+            self.cfg.set(key, value)
+
+    def load(self) -> Flask:
+        """Create the Flask app, once in the master when preloading."""
+        for variable, value in pool_settings(self.cfg.threads).items():
+            os.environ.setdefault(variable, value)
+        return create_app()
+
+
+def main() -> None:
+    """Serve the app with gunicorn."""
+    parser = argparse.ArgumentParser(description="Serve the API with gunicorn.")
+    parser.add_argument("--bind", default=DEFAULT_BIND)
+    parser.add_argument(
+        "--worker-class", choices=WORKER_CLASSES, default=DEFAULT_WORKER_CLASS
+    )
+    parser.add_argument("--workers", type=int, help="default: from the CPU count")
+    parser.add_argument("--threads", type=int, help="default: from the CPU count")
+    parser.add_argument(
+        "--preload", action=argparse.BooleanOptionalAction, default=True
+    )
+    parser.add_argument(
+        "--keep-alive", type=int, default=DEFAULT_KEEP_ALIVE_SECONDS, help="seconds"
+    )
+    parser.add_argument("--backlog", type=int, default=DEFAULT_BACKLOG)
+    arguments = parser.parse_args()
+
+    Server(
+        options(
+            arguments.worker_class,
+            arguments.workers,
+            arguments.threads,
+            bind=arguments.bind,
+            preload_app=arguments.preload,
+            keepalive=arguments.keep_alive,
+            backlog=arguments.backlog,
+        )
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Benchmarks for the API, run as scripts rather than collected by pytest."""
@@ -0,0 +1,163 @@
+"""Compare how the gunicorn and asyncio servers cope as concurrent inbox reads rise.
+
+Run with python -m tests.benchmarks.async_concurrency.  Both servers are started on
+the same SQLite file, which is seeded through the Flask API, and each concurrency
+level is a number of client threads reading the inbox over keep-alive connections
+for a few seconds.  The sync server can only have workers x threads requests in
+flight; the asyncio one queues the rest on its event loop instead.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http import HTTPStatus
+from pathlib import Path
+from typing import Iterator
+
+HOST: str = "127.0.0.1"
+SYNC_PORT: int = 5011
+ASYNC_PORT: int = 5012
+READY_TIMEOUT_SECONDS: float = 30.0
+
+
+@contextmanager
+def running(command: list[str], port: int, database_url: str) -> Iterator[None]:
+    """Run a server until the block ends, waiting for it to answer first."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", *command, "--bind", f"{HOST}:{port}"],
+        env={**os.environ, "DATABASE_URL": database_url},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline: float = time.monotonic() + READY_TIMEOUT_SECONDS
+        while True:
+            try:
+                request("GET", port, "/users?limit=1")
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+        yield
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def request(
+    method: str,
+    port: int,
+    path: str,
+    body: dict | None = None,
+    connection: http.client.HTTPConnection | None = None,
+) -> tuple[int, bytes]:
+    """Send a request, on the connection if given, and return the status and body."""
+    connection = connection or http.client.HTTPConnection(HOST, port, timeout=30)
+    headers: dict[str, str] = {"Content-Type": "application/json"}
+    connection.request(method, path, body and json.dumps(body), headers)
+    response = connection.getresponse()
+    return response.status, response.read()
+
+
+def seed(port: int, messages: int) -> str:
+    """Create two users and fill one inbox, returning the recipient's ID."""
+    ids: list[str] = [
+        json.loads(
+            request(
+                "POST", port, "/users", {"name": name, "email": f"{name}@gmail.com"}
+            )[1]
+        )["id"]
+        for name in ("Adam", "Eve")
+    ]
+    for number in range(messages):
+        message: dict = {"author_id": ids[0], "content": f"Message number {number}"}
+        request("POST", port, f"/user/{ids[1]}/messages", message)
+    return ids[1]
+
+
+def load(port: int, path: str, concurrency: int, seconds: float) -> dict:
+    """Read the path from a number of threads and summarise the latencies."""
+    latencies: list[float] = []
+    errors: list[int] = []
+    stop: float = time.perf_counter() + seconds
+
+    def client() -> None:
+        connection = http.client.HTTPConnection(HOST, port, timeout=60)
+        while (started := time.perf_counter()) < stop:
+            try:
+                status, _ = request("GET", port, path, connection=connection)
+            except OSError:
+                connection = http.client.HTTPConnection(HOST, port, timeout=60)
+                status = 0
+            latencies.append(time.perf_counter() - started)
+            if status != HTTPStatus.OK:
+                errors.append(status)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    quantiles: list[float] = statistics.quantiles(latencies, n=100)
+    return {
+        "requests_per_second": len(latencies) / seconds,
+        "p50_ms": quantiles[49] * 1000,
+        "p95_ms": quantiles[94] * 1000,
+        "errors": len(errors),
+    }
+
+
+def run() -> None:
+    """Print throughput and latency of both servers at each concurrency level."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--workers", default="2", help="gunicorn workers")
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 8, 32, 128, 256]
+    )
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        url: str = f"sqlite:///{Path(directory) / 'benchmark.db'}"
+        sync_server: list[str] = [
+            "aloysius_parker.server",
+            "--worker-class",
+            "gthread",
+            "--workers",
+            arguments.workers,
+        ]
+        with running(sync_server, SYNC_PORT, url):
+            recipient_id: str = seed(SYNC_PORT, arguments.messages)
+            with running(["aloysius_parker.asgi"], ASYNC_PORT, url):
+                path: str = f"/user/{recipient_id}/messages?limit=50"
+                print(
+                    f"{'server':<8} {'clients':>8} {'req/s':>8} "
+                    f"{'p50 ms':>8} {'p95 ms':>8} {'errors':>8}"
+                )
+                for concurrency in arguments.concurrency:
+                    for name, port in (
+                        ("gunicorn", SYNC_PORT),
+                        ("uvicorn", ASYNC_PORT),
+                    ):
+                        result: dict = load(port, path, concurrency, arguments.seconds)
+                        print(
+                            f"{name:<8} {concurrency:>8} "
+                            f"{result['requests_per_second']:>8.0f} "
+                            f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} "
+                            f"{result['errors']:>8}"
+                        )
+
+
+if __name__ == "__main__":
+    run()
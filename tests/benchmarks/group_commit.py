@@ -0,0 +1,74 @@
+"""Compare message send throughput with and without group commit.
+
+Run with python -m tests.benchmarks.group_commit.  Each run sends bursts of messages
+from many threads through the repository to a fresh SQLite file, as concurrent
+requests would.
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import prometheus_client
+from aloysius_parker import main
+from aloysius_parker.database.db import database
+from aloysius_parker.database.user_repository import UserRepository
+
+
+def messages_per_second(group_commit: bool, senders: int, messages: int) -> float:
+    """Send the messages from the sender threads and return the throughput."""
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["DATABASE_URL"] = f"sqlite:///{Path(directory) / 'benchmark.db'}"
+        os.environ["MESSAGE_GROUP_COMMIT"] = str(group_commit).lower()
+        app = main.create_app()
+        with app.app_context():
+            adam, eve = UserRepository(database).create_users(
+                [
+                    {"name": "Adam", "email": "adam@gmail.com"},
+                    {"name": "Eve", "email": "eve@mail.ru"},
+                ]
+            )
+
+        def send() -> None:
+            with app.app_context():
+                repository = UserRepository(database)
+                for number in range(messages):
+                    repository.send_user_message(adam, eve, f"Message {number}")
+
+        threads = [threading.Thread(target=send) for _ in range(senders)]
+        started: float = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed: float = time.perf_counter() - started
+        with app.app_context():
+            database.engine.dispose()
+        return senders * messages / elapsed
+
+
+def run() -> None:
+    """Print the send throughput in both modes."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--senders", type=int, default=32)
+    parser.add_argument("--messages", type=int, default=50, help="per sender")
+    arguments = parser.parse_args()
+
+    for group_commit in (False, True):
+        rate: float = messages_per_second(
+            group_commit, arguments.senders, arguments.messages
+        )
+        print(f"group commit {'on ' if group_commit else 'off'} {rate:8.0f} msg/s")
+    mean_batch: float = prometheus_client.REGISTRY.get_sample_value(
+        "message_group_commit_batch_size_sum"
+    ) / prometheus_client.REGISTRY.get_sample_value(
+        "message_group_commit_batch_size_count"
+    )
+    print(f"mean batch size {mean_batch:.1f}")
+
+
+if __name__ == "__main__":
+    run()
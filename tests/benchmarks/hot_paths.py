@@ -0,0 +1,208 @@
+"""Time the repository, handler, schema and serialisation hot paths.
+
+Run with python -m tests.benchmarks.hot_paths.  A dataset of --users users, each
+with --messages messages in their inbox, is seeded into the database in
+DATABASE_URL, in memory by default, and each operation is then timed in rounds of
+enough calls to take a fifth of a second.  The median and fastest time per call of
+the rounds are reported.
+
+--save writes the results as JSON to use as a baseline, and --compare checks the
+results against a saved baseline, exiting with status 1 if any operation is slower
+than the baseline by more than --tolerance.  Compare runs made on the same machine
+with the same dataset sizes.
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import sys
+import timeit
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+from flask import Flask
+from sqlalchemy import insert
+from aloysius_parker import main
+from aloysius_parker.database.db import database
+from aloysius_parker.database.message import Message
+from aloysius_parker.database.user_cache import UserCache
+from aloysius_parker.database.user_repository import UserRepository
+from aloysius_parker.handler import users as users_handler
+from aloysius_parker.models.message import PostMessageSchema
+from aloysius_parker.models.user import UserSchema
+
+PAGE_SIZE: int = 50
+DEFAULT_ROUNDS: int = 7
+DEFAULT_TOLERANCE: float = 0.1
+
+
+def seed(users: int, messages: int) -> list[str]:
+    """Create the users and fill each inbox from the next user, returning the IDs."""
+    repository = UserRepository(database)
+    ids: list[str] = repository.create_users(
+        [{"name": f"User {n}", "email": f"user{n}@gmail.com"} for n in range(users)]
+    )
+    timestamp: datetime = datetime.now(timezone.utc)
+    for recipient, author in zip(ids, ids[1:] + ids[:1]):
+        rows: list[dict] = [
+            {
+                "id": uuid.uuid4().hex,
+                "author_id": author,
+                "recipient_id": recipient,
+                "content": f"Message number {n}",
+                "timestamp": timestamp,
+            }
+            for n in range(messages)
+        ]
+        if rows:
+            database.session.execute(insert(Message), rows)
+    database.session.commit()
+    return ids
+
+
+def fresh_session(operation: Callable) -> Callable:
+    """Wrap the operation to start each call with an empty session, as requests do.
+
+    Otherwise a repeated lookup would be answered from the session's identity map.
+    """
+
+    def call():
+        result = operation()
+        database.session.expunge_all()
+        return result
+
+    return call
+
+
+def operations(ids: list[str]) -> dict[str, Callable]:
+    """Return the operations to time, by name."""
+    repository = UserRepository(database)
+    cached = UserRepository(database, UserCache())
+    user_ids = itertools.cycle(ids)
+    inbox: list[Message] = repository.get_user_messages(ids[0], PAGE_SIZE)[1]
+    page = repository.get_users(PAGE_SIZE)
+    user_schema, message_schema = UserSchema(), PostMessageSchema()
+    user_data: dict = {"name": "Adam", "email": "adam@gmail.com"}
+    message_data: dict = {"author_id": ids[1], "content": "Hello, how are you?"}
+    return {
+        "UserRepository.get_user": fresh_session(
+            lambda: repository.get_user(next(user_ids))
+        ),
+        "UserRepository.get_user (cached)": lambda: cached.get_user(ids[0]),
+        "UserRepository.get_user_messages": fresh_session(
+            lambda: repository.get_user_messages(ids[0], PAGE_SIZE + 1)
+        ),
+        "UserRepository.send_user_message": fresh_session(
+            lambda: repository.send_user_message(ids[1], ids[0], "Hello")
+        ),
+        "handler.users.get_users": fresh_session(
+            lambda: users_handler.get_users({"limit": PAGE_SIZE})
+        ),
+        "UserSchema.load": lambda: user_schema.load(user_data),
+        "PostMessageSchema.load": lambda: message_schema.load(message_data),
+        f"User.to_json x{len(page)}": lambda: [user.to_json() for user in page],
+        f"Message.to_json x{len(inbox)}": lambda: [
+            message.to_json() for message in inbox
+        ],
+    }
+
+
+def time_operation(operation: Callable, rounds: int) -> dict[str, float]:
+    """Return the median and fastest microseconds per call over the rounds."""
+    timer = timeit.Timer(operation)
+    number, _ = timer.autorange()
+    per_call: list[float] = [
+        seconds / number * 1_000_000 for seconds in timer.repeat(rounds, number)
+    ]
+    return {
+        "median_us": statistics.median(per_call),
+        "min_us": min(per_call),
+        "calls_per_round": number,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Return the names of the operations slower than the baseline by the tolerance."""
+    if results["dataset"] != baseline["dataset"]:
+        print(f"warning: the baseline dataset was {baseline['dataset']}")
+
+    regressions: list[str] = []
+    for name, result in results["operations"].items():
+        if not (before := baseline["operations"].get(name)):
+            continue
+        if result["median_us"] > before["median_us"] * (1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def report(results: dict, baseline: dict | None, regressions: list[str]) -> None:
+    """Print a row of timings for each operation, against the baseline if given."""
+    print(f"{'operation':<38} {'median us':>10} {'min us':>10} {'change':>8}")
+    for name, result in results["operations"].items():
+        change: str = ""
+        if baseline and (before := baseline["operations"].get(name)):
+            change = f"{result['median_us'] / before['median_us'] - 1:+.0%}"
+        flag: str = "  REGRESSION" if name in regressions else ""
+        print(
+            f"{name:<38} {result['median_us']:>10.1f} {result['min_us']:>10.1f} "
+            f"{change:>8}{flag}"
+        )
+
+
+def run() -> None:
+    """Time the hot paths, then save or compare the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=100, help="per user")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS)
+    parser.add_argument("--only", help="time only operations containing this text")
+    parser.add_argument("--save", type=Path, help="write the results to this file")
+    parser.add_argument("--compare", type=Path, help="baseline results to compare")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="fraction slower than the baseline allowed, 0.1 by default",
+    )
+    arguments = parser.parse_args()
+
+    app: Flask = main.create_app()
+    results: dict = {
+        "dataset": {"users": arguments.users, "messages": arguments.messages},
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "created": datetime.now(timezone.utc).isoformat(),
+        "operations": {},
+    }
+    with app.app_context():
+        ids: list[str] = seed(arguments.users, arguments.messages)
+        for name, operation in operations(ids).items():
+            if not arguments.only or arguments.only in name:
+                results["operations"][name] = time_operation(
+                    operation, arguments.rounds
+                )
+
+    baseline: dict | None = None
+    regressions: list[str] = []
+    if arguments.compare:
+        baseline = json.loads(arguments.compare.read_text())
+        regressions = compare(results, baseline, arguments.tolerance)
+    report(results, baseline, regressions)
+
+    if arguments.save:
+        arguments.save.parent.mkdir(parents=True, exist_ok=True)
+        arguments.save.write_text(json.dumps(results, indent=2))
+        print(f"saved to {arguments.save}")
+    if regressions:
+        print(
+            f"{len(regressions)} operations regressed by over {arguments.tolerance:.0%}"
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,106 @@
+"""Compare response throughput of Flask's JSON provider and the FastJSONProvider.
+
+Run with python -m tests.benchmarks.json_encoding.  Each endpoint is requested
+through the test client, so the numbers cover routing, the queries and encoding,
+and only the provider differs between the runs.  Encoding a large inbox on its own
+is timed too, as that is the part the provider changes.
+"""
+
+import argparse
+import time
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from aloysius_parker import main
+from aloysius_parker.config import json_provider
+from aloysius_parker.database.db import database
+from aloysius_parker.database.message import Message
+from aloysius_parker.handler.user import USERS
+
+PAGE_SIZE: int = 100
+
+
+class ToJsonProvider(DefaultJSONProvider):
+    """Flask's provider, with models converted by to_json as the handlers once did."""
+
+    @staticmethod
+    def default(o):
+        """Fall back to the model's own JSON representation."""
+        return o.to_json() if hasattr(o, "to_json") else DefaultJSONProvider.default(o)
+
+
+def seed(app: Flask) -> str:
+    """Create a page of users and fill the first inbox, returning its user ID."""
+    with app.app_context():
+        ids: list[str] = USERS.create_users(
+            [{"name": f"User {n}", "email": f"user{n}@gmail.com"} for n in range(500)]
+        )
+        for n in range(PAGE_SIZE):
+            USERS.send_user_message(ids[1], ids[0], f"Message number {n}")
+        database.session.remove()
+    return ids[0]
+
+
+def requests_per_second(app: Flask, url: str, seconds: float) -> float:
+    """Request the URL repeatedly for a number of seconds."""
+    count: int = 0
+    with app.test_client() as client:
+        started: float = time.perf_counter()
+        while (elapsed := time.perf_counter() - started) < seconds:
+            client.get(url)
+            count += 1
+    return count / elapsed
+
+
+def encodes_per_second(app: Flask, messages: list[Message], seconds: float) -> float:
+    """Encode the messages as a response body repeatedly for a number of seconds."""
+    count: int = 0
+    with app.app_context():
+        started: float = time.perf_counter()
+        while (elapsed := time.perf_counter() - started) < seconds:
+            app.json.response(messages)
+            count += 1
+    return count / elapsed
+
+
+def run() -> None:
+    """Print requests per second for each endpoint and provider."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--inbox-size", type=int, default=10_000)
+    arguments = parser.parse_args()
+
+    app: Flask = main.create_app()
+    user_id: str = seed(app)
+    urls: dict[str, str] = {
+        "GET /users": f"/users?limit={PAGE_SIZE}",
+        "GET /user/<id>/messages": f"/user/{user_id}/messages?limit={PAGE_SIZE}",
+    }
+    encoders: dict[str, str] = {
+        "flask": "stdlib json",
+        "fast": "orjson" if json_provider.orjson else "stdlib json (no orjson)",
+    }
+    providers = {"flask": ToJsonProvider, "fast": json_provider.FastJSONProvider}
+    for label, url in urls.items():
+        results: dict[str, float] = {}
+        for name, provider in providers.items():
+            app.json = provider(app)
+            results[name] = requests_per_second(app, url, arguments.seconds)
+            print(f"{label:<24} {encoders[name]:<26} {results[name]:8.0f} req/s")
+        print(f"{'':<24} {'speed up':<26} {results['fast'] / results['flask']:8.2f}x")
+
+    label = f"encode {arguments.inbox_size} messages"
+    inbox: list[Message] = [
+        Message(user_id, user_id, f"Message number {n}")
+        for n in range(arguments.inbox_size)
+    ]
+    results = {}
+    for name, provider in providers.items():
+        app.json = provider(app)
+        results[name] = encodes_per_second(app, inbox, arguments.seconds)
+        print(f"{label:<24} {encoders[name]:<26} {results[name]:8.1f} /s")
+    print(f"{'':<24} {'speed up':<26} {results['fast'] / results['flask']:8.2f}x")
+
+
+if __name__ == "__main__":
+    run()
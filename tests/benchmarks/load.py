@@ -0,0 +1,234 @@
+"""Load the API under gunicorn with a mix of reads and writes and report latencies.
+
+Run with python -m tests.benchmarks.load.  The server is started on a fresh SQLite
+file and polled until it answers, then seeded with --users users, each with
+--messages messages, through the API.  --concurrency client threads then send
+requests over keep-alive connections for --seconds, each one a write with the
+--write-ratio probability and otherwise a read, spread evenly over the endpoints:
+
+- reads: GET /users, GET /user/<id> and GET /user/<id>/messages
+- writes: POST /users and POST /user/<id>/messages
+
+The throughput and the p50, p95 and p99 latencies of each endpoint are printed and
+written as JSON to --output.  The client threads share one interpreter, so check
+that the client is not the bottleneck before blaming the server.
+"""
+
+import argparse
+import http.client
+import json
+import platform
+import random
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from http import HTTPStatus
+from pathlib import Path
+from typing import Callable
+
+from tests.benchmarks.async_concurrency import HOST, request, running
+
+PORT: int = 5013
+PAGE_SIZE: int = 50
+DEFAULT_OUTPUT: str = "load_results.json"
+
+# An endpoint's label, method, and its path and body for two different seeded users.
+Endpoint = tuple[str, str, Callable[[str, str], tuple[str, dict | None]]]
+
+READS: list[Endpoint] = [
+    ("GET /users", "GET", lambda *_: (f"/users?limit={PAGE_SIZE}", None)),
+    ("GET /user/<id>", "GET", lambda user_id, _: (f"/user/{user_id}", None)),
+    (
+        "GET /user/<id>/messages",
+        "GET",
+        lambda user_id, _: (f"/user/{user_id}/messages?limit={PAGE_SIZE}", None),
+    ),
+]
+WRITES: list[Endpoint] = [
+    (
+        "POST /users",
+        "POST",
+        lambda *_: (
+            "/users",
+            {"name": "Load", "email": f"load.{uuid.uuid4().hex[:12]}@gmail.com"},
+        ),
+    ),
+    (
+        "POST /user/<id>/messages",
+        "POST",
+        lambda user_id, author_id: (
+            f"/user/{user_id}/messages",
+            {"author_id": author_id, "content": "Hello, how are you?"},
+        ),
+    ),
+]
+
+
+def seed(port: int, users: int, messages: int) -> list[str]:
+    """Create the users and send each of them the messages, returning their IDs."""
+    rows: list[dict] = [
+        {"name": f"User {n}", "email": f"user{n}@gmail.com"} for n in range(users)
+    ]
+    _, body = request("POST", port, "/users/batch", rows)
+    ids: list[str] = [result["id"] for result in json.loads(body)["results"]]
+    for number in range(messages):
+        message: dict = {
+            "author_id": ids[0],
+            "content": f"Message number {number}",
+            "all_users": True,
+        }
+        request("POST", port, "/users/messages", message)
+    return ids
+
+
+def percentile(quantiles: list[float], percent: int) -> float:
+    """Return the percentile in milliseconds from the hundredths of the latencies."""
+    return quantiles[percent - 1] * 1000
+
+
+def summarise(latencies: list[float], errors: int, seconds: float) -> dict:
+    """Return the throughput, error count and latency percentiles of the requests."""
+    quantiles: list[float] = (
+        statistics.quantiles(latencies, n=100, method="inclusive")
+        if len(latencies) > 1
+        else latencies * 99
+    )
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": len(latencies) / seconds,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": percentile(quantiles, 50) if latencies else 0.0,
+        "p95_ms": percentile(quantiles, 95) if latencies else 0.0,
+        "p99_ms": percentile(quantiles, 99) if latencies else 0.0,
+    }
+
+
+def load(
+    port: int, ids: list[str], concurrency: int, seconds: float, write_ratio: float
+) -> dict:
+    """Send the mix of requests from a number of threads and summarise each endpoint."""
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    lock = threading.Lock()
+    stop: float = time.perf_counter() + seconds
+
+    def client(seed_value: int) -> None:
+        randomly = random.Random(seed_value)
+        connection = http.client.HTTPConnection(HOST, port, timeout=60)
+        while (started := time.perf_counter()) < stop:
+            endpoints = WRITES if randomly.random() < write_ratio else READS
+            label, method, target = randomly.choice(endpoints)
+            path, body = target(*randomly.sample(ids, 2))
+            try:
+                status, _ = request(method, port, path, body, connection)
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(HOST, port, timeout=60)
+                status = 0
+            elapsed: float = time.perf_counter() - started
+            with lock:
+                latencies[label].append(elapsed)
+                if not HTTPStatus.OK <= status < HTTPStatus.MULTIPLE_CHOICES:
+                    errors[label] += 1
+        connection.close()
+
+    threads = [
+        threading.Thread(target=client, args=(number,)) for number in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    every: list[float] = [
+        latency for values in latencies.values() for latency in values
+    ]
+    return {
+        "endpoints": {
+            label: summarise(latencies[label], errors[label], seconds)
+            for label, *_ in READS + WRITES
+            if label in latencies
+        },
+        "total": summarise(every, sum(errors.values()), seconds),
+    }
+
+
+def report(results: dict) -> None:
+    """Print a row of throughput and latencies for each endpoint and the total."""
+    print(
+        f"{'endpoint':<26} {'requests':>9} {'req/s':>8} {'p50 ms':>8} "
+        f"{'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+    )
+    for label, result in [*results["endpoints"].items(), ("total", results["total"])]:
+        print(
+            f"{label:<26} {result['requests']:>9} "
+            f"{result['requests_per_second']:>8.0f} {result['p50_ms']:>8.1f} "
+            f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['errors']:>7}"
+        )
+
+
+def run() -> None:
+    """Start the server, seed it, load it and save the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=16, help="client threads")
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=20, help="per user")
+    parser.add_argument(
+        "--worker-class", choices=("sync", "gthread"), default="gthread"
+    )
+    parser.add_argument("--workers", default="2", help="gunicorn workers")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--output", type=Path, default=Path(DEFAULT_OUTPUT))
+    arguments = parser.parse_args()
+    if not 0 <= arguments.write_ratio <= 1:
+        parser.error("--write-ratio must be between 0 and 1")
+    if arguments.users < 2:  # noqa: PLR2004
+        parser.error("--users must be at least 2, to send messages between them")
+
+    server: list[str] = [
+        "aloysius_parker.server",
+        "--worker-class",
+        arguments.worker_class,
+        "--workers",
+        arguments.workers,
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        url: str = f"sqlite:///{Path(directory) / 'load.db'}"
+        with running(server, arguments.port, url):
+            ids: list[str] = seed(arguments.port, arguments.users, arguments.messages)
+            results: dict = load(
+                arguments.port,
+                ids,
+                arguments.concurrency,
+                arguments.seconds,
+                arguments.write_ratio,
+            )
+
+    report(results)
+    arguments.output.parent.mkdir(parents=True, exist_ok=True)
+    arguments.output.write_text(
+        json.dumps(
+            {
+                "created": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "settings": {
+                    name: str(value) if isinstance(value, Path) else value
+                    for name, value in vars(arguments).items()
+                },
+                **results,
+            },
+            indent=2,
+        )
+    )
+    print(f"saved to {arguments.output}")
+
+
+if __name__ == "__main__":
+    run()
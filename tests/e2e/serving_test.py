@@ -0,0 +1,34 @@
+"""Run up the API under gunicorn and confirm that it serves requests."""
+
+from http import HTTPStatus
+from typing import Generator
+
+import pytest
+from aloysius_parker.extensions import retrying_http_client
+
+from tests.e2e import subprocess
+
+
+@pytest.fixture(autouse=True)
+def start_gunicorn_server() -> Generator:
+    """Start gunicorn with preloading and threaded workers, as the Docker image can."""
+    yield from subprocess.run_subprocess(
+        [
+            ".venv/bin/python",
+            "-m",
+            "aloysius_parker.server",
+            "--bind",
+            "127.0.0.1:5001",
+            "--worker-class",
+            "gthread",
+            "--workers",
+            "2",
+        ]
+    )
+
+
+def test_gunicorn_is_up_and_running() -> None:
+    """Confirm that a worker answers requests for the documents."""
+    http_client = retrying_http_client.RetryingHttpClient()
+    response = http_client.get("http://127.0.0.1:5001")
+    assert response.status_code == HTTPStatus.OK
@@ -0,0 +1,88 @@
+"""Add users in batches rather than one request per user.
+
+By default, pytest will run the tests in alpha numeric order so each test should be
+named test_001, test_002, test_003, etc.
+"""
+
+import json
+from http import HTTPStatus
+from typing import Generator
+
+import pytest
+from flask import testing
+from aloysius_parker import main
+
+VALID_JSON_ROWS: int = 2
+NDJSON_ROWS: int = 100
+
+
+# region Fixtures and helper functions
+@pytest.fixture(scope="module", name="flask_client")
+def create_flask_client() -> Generator:
+    """Create a flask test client."""
+    flask_api = main.create_app()
+    flask_api.config["TESTING"] = True
+    with flask_api.test_client() as client:
+        yield client
+
+
+def payload(number: int) -> dict[str, str]:
+    """Return an example payload for a numbered user."""
+    return {"name": f"Batch {number}", "email": f"batch{number}@gmail.com"}
+
+
+# endregion
+
+
+def test_001_add_a_json_batch(flask_client: testing.FlaskClient) -> None:
+    """Valid rows are created even when others in the batch are rejected."""
+    # Arrange
+    rows = [payload(0), {"name": "x", "email": "bad"}, payload(2)]
+    # Act
+    response = flask_client.post("/users/batch", json=rows)
+    # Assert
+    assert response.status_code == HTTPStatus.MULTI_STATUS
+    assert response.json["created"] == VALID_JSON_ROWS
+    assert [result["status"] for result in response.json["results"]] == [
+        HTTPStatus.CREATED,
+        HTTPStatus.UNPROCESSABLE_ENTITY,
+        HTTPStatus.CREATED,
+    ]
+
+
+def test_002_add_an_ndjson_batch(flask_client: testing.FlaskClient) -> None:
+    """A newline-delimited batch is created in full."""
+    # Arrange
+    body = "\n".join(
+        json.dumps(payload(number)) for number in range(3, 3 + NDJSON_ROWS)
+    )
+    # Act
+    response = flask_client.post(
+        "/users/batch", data=body, content_type="application/x-ndjson"
+    )
+    # Assert
+    assert response.status_code == HTTPStatus.CREATED
+    assert response.json["created"] == NDJSON_ROWS
+    assert not response.json["failed"]
+
+
+def test_003_all_users_were_added(flask_client: testing.FlaskClient) -> None:
+    """Both batches are in the list of users."""
+    # Act
+    response = flask_client.get("/users?limit=100")
+    second = json.loads(response.headers["X-Pagination"])["next_cursor"]
+    rest = flask_client.get(f"/users?limit=100&cursor={second}")
+    # Assert
+    assert len(response.json) + len(rest.json) == VALID_JSON_ROWS + NDJSON_ROWS
+
+
+def test_004_reject_a_malformed_batch(flask_client: testing.FlaskClient) -> None:
+    """Bodies that are not a list of users are rejected."""
+    # Act
+    not_a_list = flask_client.post("/users/batch", json=payload(0))
+    bad_line = flask_client.post(
+        "/users/batch", data="{}\n{oops", content_type="application/x-ndjson"
+    )
+    # Assert
+    assert not_a_list.status_code == HTTPStatus.BAD_REQUEST
+    assert bad_line.status_code == HTTPStatus.BAD_REQUEST
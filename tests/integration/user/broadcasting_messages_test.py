@@ -0,0 +1,152 @@
+"""Send one announcement to many users in a single request.
+
+By default, pytest will run the tests in alpha numeric order so each test should be
+named test_001, test_002, test_003, etc.
+"""
+
+import uuid
+from http import HTTPStatus
+from typing import Generator
+
+import pytest
+from flask import testing
+from aloysius_parker import main
+from aloysius_parker.database.db import database
+from aloysius_parker.database.user_repository import UserRepository
+
+KNOWN_RECIPIENTS: int = 2
+
+
+# region Fixtures and helper functions
+class SharedResources:
+    """Resources shared between the tests."""
+
+    def __init__(self) -> None:
+        """Initialize the tokens."""
+        self.author_id = None
+        self.recipient_ids: list[str] = []
+        self.unknown_id: str = "0" * 32
+
+
+@pytest.fixture(name="resources", scope="module")
+def shared_resources() -> SharedResources:
+    """Return the shared resources object."""
+    return SharedResources()
+
+
+@pytest.fixture(scope="module", name="flask_client")
+def create_flask_client() -> Generator:
+    """Create a flask test client."""
+    flask_api = main.create_app()
+    flask_api.config["TESTING"] = True
+    with flask_api.test_client() as client:
+        yield client
+
+
+# endregion
+
+
+def test_001_create_users(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Create an announcer and an audience."""
+    # Arrange
+    rows = [{"name": f"Fan {number}", "email": "fan@gmail.com"} for number in range(4)]
+    announcer = {"name": "Announcer", "email": "announcer@gmail.com"}
+    # Act
+    resources.author_id = flask_client.post("/users", json=announcer).json["id"]
+    response = flask_client.post("/users/batch", json=rows)
+    # Assert
+    assert response.status_code == HTTPStatus.CREATED
+    resources.recipient_ids = [result["id"] for result in response.json["results"]]
+
+
+def test_002_broadcast_to_a_list(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Known recipients get the message and unknown ones are reported."""
+    # Arrange
+    message = {
+        "author_id": resources.author_id,
+        "content": "Doors open at eight.",
+        "recipient_ids": resources.recipient_ids[:KNOWN_RECIPIENTS]
+        + [resources.unknown_id],
+    }
+    # Act
+    response = flask_client.post("/users/messages", json=message)
+    # Assert
+    assert response.status_code == HTTPStatus.CREATED
+    assert response.json["sent"] == KNOWN_RECIPIENTS
+    assert response.json["unknown_recipient_ids"] == [resources.unknown_id]
+    inbox = flask_client.get(f"/user/{resources.recipient_ids[0]}/messages")
+    assert inbox.json[0]["content"] == "Doors open at eight."
+
+
+def test_003_broadcast_to_all_users(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Everybody but the author gets the message."""
+    # Arrange
+    message = {
+        "author_id": resources.author_id,
+        "content": "Last orders.",
+        "all_users": True,
+    }
+    # Act
+    response = flask_client.post("/users/messages", json=message)
+    # Assert
+    assert response.status_code == HTTPStatus.CREATED
+    assert response.json["sent"] == len(resources.recipient_ids)
+    inbox = flask_client.get(f"/user/{resources.recipient_ids[-1]}/messages")
+    latest: dict = inbox.json[0]
+    assert latest["content"] == "Last orders."
+    assert uuid.UUID(hex=latest["id"], version=4).hex == latest["id"]
+    assert "+" not in latest["timestamp"]
+
+
+def test_004_recipients_or_all_users(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Exactly one way of choosing the recipients must be given."""
+    # Arrange
+    message = {"author_id": resources.author_id, "content": "Hmm"}
+    # Act
+    response = flask_client.post("/users/messages", json=message)
+    # Assert
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_005_reject_recipients_that_are_not_ids(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Each bad item of the list is reported against its index."""
+    # Arrange
+    message = {
+        "author_id": resources.author_id,
+        "content": "Hmm",
+        "recipient_ids": [1, 2],
+    }
+    # Act
+    response = flask_client.post("/users/messages", json=message)
+    # Assert
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert set(response.json["errors"]["json"]["recipient_ids"]) == {"0", "1"}
+
+
+def test_006_author_deleted_by_another_worker(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """An author this worker still has cached is refused once deleted elsewhere."""
+    # Arrange
+    ghost = {"name": "Ghost", "email": "ghost@gmail.com"}
+    ghost_id: str = flask_client.post("/users", json=ghost).json["id"]
+    flask_client.get(f"/user/{ghost_id}")
+    with flask_client.application.app_context():
+        UserRepository(database).delete_user(ghost_id)
+    message = {"author_id": ghost_id, "content": "Boo", "all_users": True}
+    # Act
+    response = flask_client.post("/users/messages", json=message)
+    # Assert
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    inbox = flask_client.get(f"/user/{resources.recipient_ids[0]}/messages")
+    assert all(message["author_id"] != ghost_id for message in inbox.json)
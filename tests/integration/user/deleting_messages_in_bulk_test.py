@@ -0,0 +1,149 @@
+"""Clear out an inbox in a single request rather than one message at a time.
+
+By default, pytest will run the tests in alpha numeric order so each test should be
+named test_001, test_002, test_003, etc.
+"""
+
+from http import HTTPStatus
+from typing import Generator
+
+import pytest
+from flask import testing
+from aloysius_parker import main
+
+MESSAGES: int = 5
+
+
+# region Fixtures and helper functions
+class SharedResources:
+    """Resources shared between the tests."""
+
+    def __init__(self) -> None:
+        """Initialize the tokens."""
+        self.author_id = None
+        self.recipient_id = None
+        self.message_ids: list[str] = []
+        self.unknown_id: str = "0" * 32
+
+
+@pytest.fixture(name="resources", scope="module")
+def shared_resources() -> SharedResources:
+    """Return the shared resources object."""
+    return SharedResources()
+
+
+@pytest.fixture(scope="module", name="flask_client")
+def create_flask_client() -> Generator:
+    """Create a flask test client."""
+    flask_api = main.create_app()
+    flask_api.config["TESTING"] = True
+    with flask_api.test_client() as client:
+        yield client
+
+
+# endregion
+
+
+def test_001_fill_an_inbox(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Create two users and send one of them some messages."""
+    # Arrange
+    author = {"name": "Chatty", "email": "chatty@gmail.com"}
+    recipient = {"name": "Busy", "email": "busy@gmail.com"}
+    resources.author_id = flask_client.post("/users", json=author).json["id"]
+    resources.recipient_id = flask_client.post("/users", json=recipient).json["id"]
+    url = f"/user/{resources.recipient_id}/messages"
+    # Act
+    responses = [
+        flask_client.post(
+            url, json={"author_id": resources.author_id, "content": f"Note {number}"}
+        )
+        for number in range(MESSAGES)
+    ]
+    # Assert
+    assert all(response.status_code == HTTPStatus.CREATED for response in responses)
+    resources.message_ids = [response.json["id"] for response in responses]
+
+
+def test_002_delete_a_list_of_messages(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """The listed messages are deleted and the unknown ones are reported."""
+    # Arrange
+    doomed = resources.message_ids[:2]
+    body = {"message_ids": [*doomed, resources.unknown_id]}
+    # Act
+    response = flask_client.post(
+        f"/user/{resources.recipient_id}/messages/delete", json=body
+    )
+    # Assert
+    assert response.status_code == HTTPStatus.OK
+    assert response.json == {
+        "deleted": len(doomed),
+        "unknown_message_ids": [resources.unknown_id],
+    }
+    inbox = flask_client.get(f"/user/{resources.recipient_id}/messages")
+    assert len(inbox.json) == MESSAGES - len(doomed)
+
+
+def test_003_only_the_recipients_messages_are_deleted(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Messages sent to someone else are not found, so are not deleted."""
+    # Arrange
+    body = {"message_ids": resources.message_ids[2:]}
+    # Act
+    response = flask_client.post(
+        f"/user/{resources.author_id}/messages/delete", json=body
+    )
+    # Assert
+    assert response.status_code == HTTPStatus.OK
+    assert response.json["deleted"] == 0
+    assert response.json["unknown_message_ids"] == sorted(resources.message_ids[2:])
+
+
+def test_004_delete_everything_before_a_time(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Every message sent before the time is deleted with one request."""
+    # Arrange
+    newest, *older = flask_client.get(f"/user/{resources.recipient_id}/messages").json
+    # Act
+    response = flask_client.post(
+        f"/user/{resources.recipient_id}/messages/delete",
+        json={"before": newest["timestamp"]},
+    )
+    # Assert
+    assert response.status_code == HTTPStatus.OK
+    assert response.json == {"deleted": len(older), "unknown_message_ids": []}
+    inbox = flask_client.get(f"/user/{resources.recipient_id}/messages")
+    assert [message["id"] for message in inbox.json] == [newest["id"]]
+
+
+@pytest.mark.parametrize(
+    "body", [{}, {"message_ids": []}, {"message_ids": ["a"], "before": "2024-01-01"}]
+)
+def test_005_ask_for_one_kind_of_delete(
+    flask_client: testing.FlaskClient, resources: SharedResources, body: dict
+) -> None:
+    """Either a list of IDs or a time must be given, but not both."""
+    # Act
+    response = flask_client.post(
+        f"/user/{resources.recipient_id}/messages/delete", json=body
+    )
+    # Assert
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_006_delete_for_an_unknown_user(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Deleting from the inbox of a user who does not exist is a 404."""
+    # Act
+    response = flask_client.post(
+        f"/user/{resources.unknown_id}/messages/delete",
+        json={"message_ids": resources.message_ids},
+    )
+    # Assert
+    assert response.status_code == HTTPStatus.NOT_FOUND
@@ -0,0 +1,211 @@
+"""Delete users along with the messages sent to and by them.
+
+By default, pytest will run the tests in alpha numeric order so each test should be
+named test_001, test_002, test_003, etc.
+"""
+
+import time
+import uuid
+from http import HTTPStatus
+from pathlib import Path
+from typing import Generator
+
+import flask
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from flask import testing
+from aloysius_parker import main
+from aloysius_parker.database import user_purge
+from aloysius_parker.database.db import database
+from aloysius_parker.database.user_repository import UserRepository
+from aloysius_parker.handler import user
+
+MESSAGES: int = 3
+DELETION_TIMEOUT_SECONDS: float = 10.0
+
+
+# region Fixtures and helper functions
+class SharedResources:
+    """Resources shared between the tests."""
+
+    def __init__(self) -> None:
+        """Initialize the tokens."""
+        self.adam_id = None
+        self.eve_id = None
+        self.cain_id = None
+
+
+@pytest.fixture(name="resources", scope="module")
+def shared_resources() -> SharedResources:
+    """Return the shared resources object."""
+    return SharedResources()
+
+
+@pytest.fixture(scope="module", name="flask_client")
+def create_flask_client(tmp_path_factory: pytest.TempPathFactory) -> Generator:
+    """Create a flask test client on a database file, for the background deletes."""
+    database_file: Path = tmp_path_factory.mktemp("deleting") / "aloysius.db"
+    with MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("DATABASE_URL", f"sqlite:///{database_file}")
+        flask_api = main.create_app()
+    flask_api.config["TESTING"] = True
+    with flask_api.test_client() as client:
+        yield client
+
+
+def start_another_worker(client: testing.FlaskClient) -> flask.Flask:
+    """Create another app on the same database file, as another worker would be."""
+    with MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv(
+            "DATABASE_URL", client.application.config["SQLALCHEMY_DATABASE_URI"]
+        )
+        return main.create_app()
+
+
+def wait_until_done(client: testing.FlaskClient, location: str) -> dict:
+    """Follow a deletion until its messages are gone or the timeout passes."""
+    deadline: float = time.monotonic() + DELETION_TIMEOUT_SECONDS
+    progress = client.get(location).json
+    while not progress["done"] and time.monotonic() < deadline:
+        time.sleep(0.05)
+        progress = client.get(location).json
+    return progress
+
+
+def send(client: testing.FlaskClient, author_id: str, recipient_id: str) -> None:
+    """Send a few messages from the author to the recipient."""
+    for number in range(MESSAGES):
+        message = {"author_id": author_id, "content": f"Message {number}"}
+        client.post(f"/user/{recipient_id}/messages", json=message)
+
+
+# endregion
+
+
+def test_001_create_correspondents(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Create three users who write to each other."""
+    # Arrange
+    people = [
+        {"name": name, "email": f"{name.lower()}@gmail.com"}
+        for name in ("Adam", "Cain", "Eve")
+    ]
+    # Act
+    ids = [flask_client.post("/users", json=person).json["id"] for person in people]
+    resources.adam_id, resources.cain_id, resources.eve_id = ids
+    send(flask_client, resources.adam_id, resources.eve_id)
+    send(flask_client, resources.eve_id, resources.adam_id)
+    send(flask_client, resources.cain_id, resources.eve_id)
+    # Assert
+    counts = flask_client.get(f"/user/{resources.eve_id}/messages/count").json
+    assert counts == {"received": 2 * MESSAGES, "sent": MESSAGES}
+
+
+def test_002_delete_a_user_and_their_messages(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """The messages sent to and by a deleted user go with them."""
+    # Act
+    response = flask_client.delete(f"/user/{resources.adam_id}")
+    # Assert
+    assert response.status_code == HTTPStatus.NO_CONTENT
+    inbox = flask_client.get(f"/user/{resources.eve_id}/messages").json
+    assert {message["author_id"] for message in inbox} == {resources.cain_id}
+    counts = flask_client.get(f"/user/{resources.eve_id}/messages/count").json
+    assert counts == {"received": MESSAGES, "sent": 0}
+
+
+def test_003_follow_a_finished_deletion(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """A deletion done within the request has nothing left to delete."""
+    # Act
+    response = flask_client.get(f"/user/{resources.adam_id}/deletion")
+    live = flask_client.get(f"/user/{resources.eve_id}/deletion")
+    # Assert
+    assert response.json == {"remaining_messages": 0, "done": True}
+    assert live.status_code == HTTPStatus.CONFLICT
+
+
+def test_004_delete_a_busy_user_in_the_background(
+    flask_client: testing.FlaskClient,
+    resources: SharedResources,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    """A user with many messages is gone at once and their messages soon after."""
+    # Arrange
+    monkeypatch.setattr(user, "ASYNC_DELETE_MIN_MESSAGES", MESSAGES)
+    # Act
+    response = flask_client.delete(f"/user/{resources.eve_id}")
+    progress = wait_until_done(flask_client, response.headers["Location"])
+    # Assert
+    assert response.status_code == HTTPStatus.ACCEPTED
+    assert response.json == {"remaining_messages": MESSAGES}
+    assert (
+        flask_client.get(f"/user/{resources.eve_id}").status_code
+        == HTTPStatus.NOT_FOUND
+    )
+    assert progress["done"]
+    counts = flask_client.get(f"/user/{resources.cain_id}/messages/count").json
+    assert counts == {"received": 0, "sent": 0}
+
+
+def test_005_delete_an_unknown_user(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Deleting a user a second time is a 404."""
+    # Act
+    response = flask_client.delete(f"/user/{resources.adam_id}")
+    # Assert
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_006_resume_an_interrupted_deletion_at_startup(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Messages left by a worker that stopped mid-deletion are purged on restart."""
+    # Arrange
+    resources.adam_id = flask_client.post(
+        "/users", json={"name": "Adam", "email": "adam@gmail.com"}
+    ).json["id"]
+    send(flask_client, resources.adam_id, resources.cain_id)
+    with flask_client.application.app_context():
+        UserRepository(database).delete_user(resources.adam_id, purge_messages=False)
+        interrupted = user_purge.pending(database.engine)
+    # Act
+    start_another_worker(flask_client)
+    progress = wait_until_done(flask_client, f"/user/{resources.adam_id}/deletion")
+    # Assert
+    assert interrupted == [resources.adam_id]
+    assert progress == {"remaining_messages": 0, "done": True}
+    with flask_client.application.app_context():
+        assert user_purge.pending(database.engine) == []
+
+
+def test_007_follow_a_deletion_from_another_worker(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """A worker that has the user cached still sees the deletion another one made."""
+    # Arrange
+    other = start_another_worker(flask_client).test_client()
+    resources.eve_id = flask_client.post(
+        "/users", json={"name": "Eve", "email": "eve@mail.ru"}
+    ).json["id"]
+    flask_client.get(f"/user/{resources.eve_id}")
+    # Act
+    other.delete(f"/user/{resources.eve_id}")
+    response = flask_client.get(f"/user/{resources.eve_id}/deletion")
+    # Assert
+    assert response.status_code == HTTPStatus.OK
+    assert response.json == {"remaining_messages": 0, "done": True}
+
+
+def test_008_follow_the_deletion_of_a_user_who_never_existed(
+    flask_client: testing.FlaskClient,
+) -> None:
+    """There is no deletion to follow for a user who was never there."""
+    # Act
+    response = flask_client.get(f"/user/{uuid.uuid4().hex}/deletion")
+    # Assert
+    assert response.status_code == HTTPStatus.NOT_FOUND
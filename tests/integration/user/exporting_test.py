@@ -0,0 +1,108 @@
+"""Export users and messages as newline-delimited JSON.
+
+By default, pytest will run the tests in alpha numeric order so each test should be
+named test_001, test_002, test_003, etc.
+"""
+
+import gzip
+import json
+from http import HTTPStatus
+from typing import Generator
+
+import pytest
+from flask import testing
+from aloysius_parker import main
+
+
+# region Fixtures and helper functions
+class SharedResources:
+    """Resources shared between the tests."""
+
+    def __init__(self) -> None:
+        """Initialize the tokens."""
+        self.author_id = None
+        self.recipient_id = None
+        self.message_count: int = 3
+
+
+@pytest.fixture(name="resources", scope="module")
+def shared_resources() -> SharedResources:
+    """Return the shared resources object."""
+    return SharedResources()
+
+
+@pytest.fixture(scope="module", name="flask_client")
+def create_flask_client() -> Generator:
+    """Create a flask test client."""
+    flask_api = main.create_app()
+    flask_api.config["TESTING"] = True
+    with flask_api.test_client() as client:
+        yield client
+
+
+def parse_ndjson(body: bytes) -> list[dict]:
+    """Parse one JSON document per line."""
+    return [json.loads(line) for line in body.splitlines()]
+
+
+# endregion
+
+
+def test_001_create_users_and_messages(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Create two users and send some messages between them."""
+    # Arrange
+    author = {"name": "Sender", "email": "sender@gmail.com"}
+    recipient = {"name": "Reader", "email": "reader@outlook.com"}
+    resources.author_id = flask_client.post("/users", json=author).json["id"]
+    resources.recipient_id = flask_client.post("/users", json=recipient).json["id"]
+
+    # Act
+    for number in range(resources.message_count):
+        response = flask_client.post(
+            f"/user/{resources.recipient_id}/messages",
+            json={"author_id": resources.author_id, "content": f"Note {number}"},
+        )
+        assert response.status_code == HTTPStatus.CREATED
+
+
+def test_002_export_users(flask_client: testing.FlaskClient) -> None:
+    """Every user is exported, one per line."""
+    # Act
+    response = flask_client.get("/users/export")
+
+    # Assert
+    assert response.status_code == HTTPStatus.OK
+    assert response.mimetype == "application/x-ndjson"
+    assert {user["name"] for user in parse_ndjson(response.data)} == {
+        "Sender",
+        "Reader",
+    }
+
+
+def test_003_export_messages_gzipped(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Messages are gzipped when the client accepts it."""
+    # Act
+    response = flask_client.get(
+        f"/user/{resources.recipient_id}/messages/export",
+        headers={"Accept-Encoding": "gzip"},
+    )
+
+    # Assert
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers["Content-Encoding"] == "gzip"
+    messages = parse_ndjson(gzip.decompress(response.data))
+    assert len(messages) == resources.message_count
+    assert all(message["author_id"] == resources.author_id for message in messages)
+
+
+def test_004_export_messages_unknown_user(flask_client: testing.FlaskClient) -> None:
+    """Exporting the messages of an unknown user is not found."""
+    # Act
+    response = flask_client.get("/user/nobody/messages/export")
+
+    # Assert
+    assert response.status_code == HTTPStatus.NOT_FOUND
@@ -0,0 +1,131 @@
+"""Page through an inbox using the cursor returned with each page.
+
+By default, pytest will run the tests in alpha numeric order so each test should be
+named test_001, test_002, test_003, etc.
+"""
+
+import json
+from http import HTTPStatus
+from typing import Generator
+
+import pytest
+from flask import testing
+from aloysius_parker import main
+
+
+# region Fixtures and helper functions
+class SharedResources:
+    """Resources shared between the tests."""
+
+    def __init__(self) -> None:
+        """Initialize the tokens."""
+        self.author_id = None
+        self.recipient_id = None
+        self.message_ids: list[str] = []
+        self.message_count: int = 7
+
+
+@pytest.fixture(name="resources", scope="module")
+def shared_resources() -> SharedResources:
+    """Return the shared resources object."""
+    return SharedResources()
+
+
+@pytest.fixture(scope="module", name="flask_client")
+def create_flask_client() -> Generator:
+    """Create a flask test client."""
+    flask_api = main.create_app()
+    flask_api.config["TESTING"] = True
+    with flask_api.test_client() as client:
+        yield client
+
+
+def next_cursor(response) -> str | None:
+    """Return the cursor for the following page from the pagination header."""
+    return json.loads(response.headers["X-Pagination"])["next_cursor"]
+
+
+# endregion
+
+
+def test_001_fill_an_inbox(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Create two users and send a handful of messages from one to the other."""
+    # Arrange
+    author = {"name": "Pen", "email": "pen@gmail.com"}
+    recipient = {"name": "Pal", "email": "pal@mail.ru"}
+    resources.author_id = flask_client.post("/users", json=author).json["id"]
+    resources.recipient_id = flask_client.post("/users", json=recipient).json["id"]
+
+    # Act
+    for number in range(resources.message_count):
+        response = flask_client.post(
+            f"/user/{resources.recipient_id}/messages",
+            json={"author_id": resources.author_id, "content": f"Letter {number}"},
+        )
+        assert response.status_code == HTTPStatus.CREATED
+        resources.message_ids.append(response.json["id"])
+
+
+def test_002_page_through_the_inbox(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Follow the cursors until the last page and confirm nothing is missed."""
+    # Act
+    seen: list[str] = []
+    url = f"/user/{resources.recipient_id}/messages?limit=3"
+    response = flask_client.get(url)
+    while True:
+        assert response.status_code == HTTPStatus.OK
+        seen.extend(message["id"] for message in response.json)
+        if not (cursor := next_cursor(response)):
+            break
+        response = flask_client.get(f"{url}&cursor={cursor}")
+
+    # Assert that every message arrived exactly once, newest first.
+    assert seen == list(reversed(resources.message_ids))
+
+
+def test_003_last_page_has_no_cursor(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """A page that holds the rest of the inbox has no next cursor."""
+    # Act
+    response = flask_client.get(f"/user/{resources.recipient_id}/messages")
+
+    # Assert
+    assert len(response.json) == resources.message_count
+    assert next_cursor(response) is None
+
+
+def test_004_bad_cursor(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """A cursor that was not issued by the API is rejected."""
+    # Act
+    response = flask_client.get(
+        f"/user/{resources.recipient_id}/messages?cursor=not-a-cursor"
+    )
+
+    # Assert
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_005_window_of_time(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Messages can be restricted to those sent before or after a point in time."""
+    # Act
+    response = flask_client.get(
+        f"/user/{resources.recipient_id}/messages?before=2000-01-01T00:00:00Z"
+    )
+    # Assert that nothing was sent in the last millennium.
+    assert response.status_code == HTTPStatus.NO_CONTENT
+
+    # Act
+    response = flask_client.get(
+        f"/user/{resources.recipient_id}/messages?after=2000-01-01T00:00:00%2B02:00"
+    )
+    # Assert that everything was sent this millennium.
+    assert len(response.json) == resources.message_count
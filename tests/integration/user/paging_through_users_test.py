@@ -0,0 +1,88 @@
+"""Page through the list of users using the cursor returned with each page.
+
+By default, pytest will run the tests in alpha numeric order so each test should be
+named test_001, test_002, test_003, etc.
+"""
+
+import json
+from http import HTTPStatus
+from typing import Generator
+
+import pytest
+from flask import testing
+from aloysius_parker import main
+
+PAGE_SIZE: int = 2
+
+
+# region Fixtures and helper functions
+class SharedResources:
+    """Resources shared between the tests."""
+
+    def __init__(self) -> None:
+        """Initialize the tokens."""
+        self.user_ids: list[str] = []
+        self.user_count: int = 5
+
+
+@pytest.fixture(name="resources", scope="module")
+def shared_resources() -> SharedResources:
+    """Return the shared resources object."""
+    return SharedResources()
+
+
+@pytest.fixture(scope="module", name="flask_client")
+def create_flask_client() -> Generator:
+    """Create a flask test client."""
+    flask_api = main.create_app()
+    flask_api.config["TESTING"] = True
+    with flask_api.test_client() as client:
+        yield client
+
+
+def next_cursor(response) -> str | None:
+    """Return the cursor for the following page from the pagination header."""
+    return json.loads(response.headers["X-Pagination"])["next_cursor"]
+
+
+# endregion
+
+
+def test_001_add_users(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Add a handful of users."""
+    for number in range(resources.user_count):
+        # Act
+        payload = {"name": f"User {number}", "email": f"user{number}@gmail.com"}
+        response = flask_client.post("/users", json=payload)
+        # Assert
+        assert response.status_code == HTTPStatus.CREATED
+        resources.user_ids.append(response.json["id"])
+
+
+def test_002_page_through_the_users(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Follow the cursors until the last page and confirm nobody is missed."""
+    # Act
+    seen: list[str] = []
+    response = flask_client.get(f"/users?limit={PAGE_SIZE}")
+    while True:
+        assert response.status_code == HTTPStatus.OK
+        assert len(response.json) <= PAGE_SIZE
+        seen.extend(user["id"] for user in response.json)
+        if not (cursor := next_cursor(response)):
+            break
+        response = flask_client.get(f"/users?limit={PAGE_SIZE}&cursor={cursor}")
+
+    # Assert that every user arrived exactly once, in order of id.
+    assert seen == sorted(resources.user_ids)
+
+
+def test_003_bad_limit(flask_client: testing.FlaskClient) -> None:
+    """A page size beyond the maximum is rejected."""
+    # Act
+    response = flask_client.get("/users?limit=10000")
+    # Assert
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
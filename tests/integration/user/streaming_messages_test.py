@@ -0,0 +1,260 @@
+"""Wait for new messages rather than polling the inbox.
+
+By default, pytest will run the tests in alpha numeric order so each test should be
+named test_001, test_002, test_003, etc.
+"""
+
+import json
+import threading
+import time
+from datetime import timedelta
+from http import HTTPStatus
+from typing import Generator
+
+import pytest
+from flask import testing
+from aloysius_parker import main
+from aloysius_parker.database.db import database
+from aloysius_parker.database.message import Message
+
+WAIT_SECONDS: int = 10
+
+
+# region Fixtures and helper functions
+class SharedResources:
+    """Resources shared between the tests."""
+
+    def __init__(self) -> None:
+        """Initialize the tokens."""
+        self.adam_id = None
+        self.eve_id = None
+        self.last_event_id = None
+        self.cursor = None
+
+
+@pytest.fixture(name="resources", scope="module")
+def shared_resources() -> SharedResources:
+    """Return the shared resources object."""
+    return SharedResources()
+
+
+@pytest.fixture(scope="module", name="flask_client")
+def create_flask_client() -> Generator:
+    """Create a flask test client."""
+    flask_api = main.create_app()
+    flask_api.config["TESTING"] = True
+    with flask_api.test_client() as client:
+        yield client
+
+
+def send(client: testing.FlaskClient, resources: SharedResources, content: str):
+    """Send a message from Adam to Eve."""
+    message = {"author_id": resources.adam_id, "content": content}
+    return client.post(f"/user/{resources.eve_id}/messages", json=message)
+
+
+def broadcast(client: testing.FlaskClient, resources: SharedResources, target: dict):
+    """Broadcast a message from Adam to the target recipients."""
+    message = {"author_id": resources.adam_id, "content": "Listen up!", **target}
+    return client.post("/users/messages", json=message)
+
+
+def wait_for_broadcast(
+    flask_client: testing.FlaskClient, resources: SharedResources, target: dict
+):
+    """Long poll Eve's inbox while the message is broadcast to the target."""
+    sender = flask_client.application.test_client()
+    later = threading.Timer(0.2, broadcast, (sender, resources, target))
+    later.start()
+    started: float = time.monotonic()
+    response = flask_client.get(
+        f"/user/{resources.eve_id}/messages/stream?wait={WAIT_SECONDS}"
+    )
+    later.join()
+    return response, time.monotonic() - started
+
+
+# endregion
+
+
+def test_001_create_users(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Create a sender and a recipient."""
+    # Act
+    adam = flask_client.post("/users", json={"name": "Adam", "email": "a@gmail.com"})
+    eve = flask_client.post("/users", json={"name": "Eve", "email": "e@mail.ru"})
+    # Assert
+    resources.adam_id, resources.eve_id = adam.json["id"], eve.json["id"]
+
+
+def test_002_long_poll_times_out(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Nothing arrives, so the long poll ends empty."""
+    # Act
+    response = flask_client.get(f"/user/{resources.eve_id}/messages/stream?wait=0.1")
+    # Assert
+    assert response.status_code == HTTPStatus.NO_CONTENT
+
+
+def test_003_long_poll_is_woken_by_a_send(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """A message sent while waiting is returned straight away."""
+    # Arrange
+    sender = flask_client.application.test_client()
+    later = threading.Timer(0.2, send, (sender, resources, "Are you there?"))
+    # Act
+    later.start()
+    started: float = time.monotonic()
+    response = flask_client.get(
+        f"/user/{resources.eve_id}/messages/stream?wait={WAIT_SECONDS}"
+    )
+    # Assert
+    assert response.status_code == HTTPStatus.OK
+    assert time.monotonic() - started < WAIT_SECONDS / 2
+    assert [message["content"] for message in response.json] == ["Are you there?"]
+    pagination: dict = json.loads(response.headers["X-Pagination"])
+    resources.last_event_id = pagination["next_cursor"]
+
+
+def test_004_long_poll_catches_up(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Messages sent since the cursor are returned oldest first without waiting."""
+    # Arrange
+    send(flask_client, resources, "Hello?")
+    send(flask_client, resources, "Anyone?")
+    # Act
+    response = flask_client.get(
+        f"/user/{resources.eve_id}/messages/stream",
+        query_string={"cursor": resources.last_event_id, "wait": WAIT_SECONDS},
+    )
+    # Assert
+    assert [message["content"] for message in response.json] == ["Hello?", "Anyone?"]
+
+
+def test_005_event_stream_resumes_from_last_event_id(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """Missed messages are sent as events, each with an ID to resume from."""
+    # Act
+    response = flask_client.get(
+        f"/user/{resources.eve_id}/messages/stream",
+        headers={
+            "Accept": "text/event-stream",
+            "Last-Event-ID": resources.last_event_id,
+        },
+        buffered=False,
+    )
+    chunks = iter(response.response)
+    retry, first, second = next(chunks), next(chunks), next(chunks)
+    response.close()
+    # Assert
+    assert response.mimetype == "text/event-stream"
+    assert retry.startswith(b"retry: ")
+    assert b"event: message" in first
+    assert b'"content": "Anyone?"' in second
+    assert second.startswith(b"id: ")
+
+
+def test_006_reject_a_bad_last_event_id(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """An ID that is not one of ours is rejected."""
+    # Act
+    response = flask_client.get(
+        f"/user/{resources.eve_id}/messages/stream",
+        headers={"Last-Event-ID": "nonsense"},
+    )
+    # Assert
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_007_resume_in_commit_order(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """A message committed after the cursor is sent even if its timestamp is older."""
+    # Arrange
+    caught_up = flask_client.get(
+        f"/user/{resources.eve_id}/messages/stream",
+        query_string={"cursor": resources.last_event_id, "wait": 0.1},
+    )
+    resources.cursor = json.loads(caught_up.headers["X-Pagination"])["next_cursor"]
+    with flask_client.application.app_context():
+        late = Message(resources.adam_id, resources.eve_id, "Sorry, I was held up")
+        late.timestamp -= timedelta(hours=1)
+        database.session.add(late)
+        database.session.commit()
+    # Act
+    response = flask_client.get(
+        f"/user/{resources.eve_id}/messages/stream",
+        query_string={"cursor": resources.cursor, "wait": 0.1},
+    )
+    # Assert
+    assert [message["content"] for message in response.json] == ["Sorry, I was held up"]
+    resources.cursor = json.loads(response.headers["X-Pagination"])["next_cursor"]
+
+
+def test_008_live_events_read_as_the_inbox_does(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """A message pushed as it is sent is serialised as the inbox returns it."""
+    # Arrange
+    sender = flask_client.application.test_client()
+    later = threading.Timer(0.2, send, (sender, resources, "Still there?"))
+    # Act
+    response = flask_client.get(
+        f"/user/{resources.eve_id}/messages/stream",
+        headers={"Accept": "text/event-stream", "Last-Event-ID": resources.cursor},
+        buffered=False,
+    )
+    chunks = iter(response.response)
+    next(chunks)
+    later.start()
+    event: bytes = next(chunks)
+    response.close()
+    inbox = flask_client.get(f"/user/{resources.eve_id}/messages?limit=1")
+    # Assert
+    data: str = event.decode().split("data: ", 1)[1].strip()
+    assert json.loads(data) == inbox.json[0]
+
+
+def test_009_long_poll_is_woken_by_a_broadcast(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """A message broadcast to the user while waiting is returned straight away."""
+    # Act
+    response, waited = wait_for_broadcast(
+        flask_client, resources, {"recipient_ids": [resources.eve_id]}
+    )
+    # Assert
+    assert response.status_code == HTTPStatus.OK
+    assert waited < WAIT_SECONDS / 2
+    assert [message["content"] for message in response.json] == ["Listen up!"]
+
+
+def test_010_long_poll_is_woken_by_a_broadcast_to_all_users(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """A message broadcast to every user while waiting is returned straight away."""
+    # Act
+    response, waited = wait_for_broadcast(flask_client, resources, {"all_users": True})
+    # Assert
+    assert response.status_code == HTTPStatus.OK
+    assert waited < WAIT_SECONDS / 2
+    assert [message["content"] for message in response.json] == ["Listen up!"]
+
+
+def test_011_refuse_to_hold_a_sync_worker(
+    flask_client: testing.FlaskClient, resources: SharedResources
+) -> None:
+    """A sync gunicorn worker would be held for the whole stream, so it is refused."""
+    # Act
+    response = flask_client.get(
+        f"/user/{resources.eve_id}/messages/stream",
+        environ_overrides={"gunicorn.socket": object(), "wsgi.multithread": False},
+    )
+    # Assert
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
@@ -0,0 +1,184 @@
+"""Confirm the asyncio endpoints answer as the Flask ones do."""
+
+import asyncio
+import json
+import uuid
+from http import HTTPStatus
+from pathlib import Path
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from sqlalchemy import create_engine, inspect
+from aloysius_parker import asgi
+from aloysius_parker.database import migrations, retention
+from aloysius_parker.database.db import database
+
+
+# region Fixtures and helper functions
+@pytest.fixture(autouse=True)
+def database_file(monkeypatch: MonkeyPatch, tmp_path: Path) -> str:
+    """Point the asyncio app at a database file, migrated as the Flask app does."""
+    url: str = f"sqlite:///{tmp_path / 'aloysius.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    engine = create_engine(url)
+    migrations.set_up(engine)
+    engine.dispose()
+    return url
+
+
+async def lifespan(app: asgi.AsyncApp, *events: str) -> list[str]:
+    """Send the app the lifespan events and return the types of its replies."""
+    incoming: list[dict] = [{"type": f"lifespan.{event}"} for event in events]
+    replies: list[str] = []
+
+    async def receive() -> dict:
+        return incoming.pop(0)
+
+    async def send(message: dict) -> None:
+        replies.append(message["type"])
+
+    await app({"type": "lifespan"}, receive, send)
+    return replies
+
+
+async def call(
+    app: asgi.AsyncApp, method: str, url: str, body: dict | None = None
+) -> tuple[int, dict, object]:
+    """Send a request to the ASGI app and return the status, headers and JSON."""
+    path, _, query = url.partition("?")
+    scope: dict = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [],
+    }
+    request_body: bytes = json.dumps(body).encode() if body else b""
+    sent: list[dict] = []
+
+    async def receive() -> dict:
+        return {"type": "http.request", "body": request_body, "more_body": False}
+
+    async def send(message: dict) -> None:
+        sent.append(message)
+
+    await app(scope, receive, send)
+    headers: dict = {
+        name.decode(): value.decode() for name, value in sent[0]["headers"]
+    }
+    content: bytes = sent[1]["body"]
+    return sent[0]["status"], headers, content and json.loads(content)
+
+
+async def create_user(app: asgi.AsyncApp, name: str) -> str:
+    """Add a user directly, as the async endpoints do not create users."""
+    user_id: str = uuid.uuid4().hex
+    async with app.engine.begin() as connection:
+        await connection.exec_driver_sql(
+            "INSERT INTO users (id, name, email, inbox_version) VALUES (?, ?, ?, 0)",
+            (user_id, name, f"{name}@gmail.com"),
+        )
+    return user_id
+
+
+# endregion
+
+
+def test_send_and_page_through_messages() -> None:
+    """Messages sent to a user come back newest first, a page at a time."""
+
+    async def scenario() -> list:
+        app = asgi.AsyncApp()
+        await app.startup()
+        adam, eve = await create_user(app, "adam"), await create_user(app, "eve")
+        for number in range(3):
+            await call(
+                app,
+                "POST",
+                f"/user/{eve}/messages",
+                {"author_id": adam, "content": f"Message {number}"},
+            )
+        first = await call(app, "GET", f"/user/{eve}/messages?limit=2")
+        cursor: str = json.loads(first[1]["x-pagination"])["next_cursor"]
+        second = await call(app, "GET", f"/user/{eve}/messages?limit=2&cursor={cursor}")
+        await app.engine.dispose()
+        return [first, second]
+
+    # ACT
+    first, second = asyncio.run(scenario())
+    # ASSERT
+    assert first[0] == HTTPStatus.OK
+    assert [message["content"] for message in first[2]] == ["Message 2", "Message 1"]
+    assert [message["content"] for message in second[2]] == ["Message 0"]
+    assert json.loads(second[1]["x-pagination"])["next_cursor"] is None
+
+
+def test_errors() -> None:
+    """Unknown users, invalid arguments and unknown routes are reported."""
+
+    async def scenario() -> list[int]:
+        app = asgi.AsyncApp()
+        await app.startup()
+        adam: str = await create_user(app, "adam")
+        statuses: list[int] = [
+            (await call(app, "GET", f"/user/{'0' * 32}"))[0],
+            (await call(app, "GET", f"/user/{adam}/messages?limit=0"))[0],
+            (await call(app, "POST", f"/user/{adam}/messages", {"content": "Hi"}))[0],
+            (await call(app, "DELETE", f"/user/{adam}"))[0],
+            (await call(app, "GET", "/nowhere"))[0],
+        ]
+        await app.engine.dispose()
+        return statuses
+
+    # ACT
+    statuses = asyncio.run(scenario())
+    # ASSERT
+    assert statuses == [
+        HTTPStatus.NOT_FOUND,
+        HTTPStatus.UNPROCESSABLE_ENTITY,
+        HTTPStatus.UNPROCESSABLE_ENTITY,
+        HTTPStatus.METHOD_NOT_ALLOWED,
+        HTTPStatus.NOT_FOUND,
+    ]
+
+
+def test_start_without_migrating_or_purging(
+    monkeypatch: MonkeyPatch, tmp_path: Path
+) -> None:
+    """Startup leaves migrating the database and purging it to the Flask app."""
+    # ARRANGE
+    monkeypatch.setenv("MESSAGE_RETENTION_MAX_AGE_DAYS", "1")
+    app = asgi.AsyncApp()
+    unmigrated_url: str = f"sqlite:///{tmp_path / 'unmigrated.db'}"
+    # ACT
+    replies = asyncio.run(lifespan(app, "startup", "shutdown"))
+    monkeypatch.setenv("DATABASE_URL", unmigrated_url)
+    unmigrated_replies = asyncio.run(lifespan(asgi.AsyncApp(), "startup"))
+    # ASSERT
+    assert replies == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    with app.flask_api.app_context():
+        assert retention.worker_for(database.engine) is None
+    assert unmigrated_replies == ["lifespan.startup.failed"]
+    unmigrated = create_engine(unmigrated_url)
+    with unmigrated.connect() as connection:
+        assert inspect(connection).get_table_names() == []
+    unmigrated.dispose()
+
+
+def test_set_up_once_by_the_lifespan() -> None:
+    """Requests are refused until the lifespan startup, which needs a database file."""
+
+    async def scenario(app: asgi.AsyncApp) -> tuple:
+        early = await call(app, "GET", "/users")
+        replies = await lifespan(app, "startup", "shutdown")
+        return early[0], replies
+
+    # ACT
+    status, replies = asyncio.run(scenario(asgi.AsyncApp()))
+    with MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("DATABASE_URL", "sqlite:///:memory:")
+        in_memory = asyncio.run(lifespan(asgi.AsyncApp(), "startup"))
+    # ASSERT
+    assert status == HTTPStatus.SERVICE_UNAVAILABLE
+    assert replies == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert in_memory == ["lifespan.startup.failed"]
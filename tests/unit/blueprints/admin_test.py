@@ -0,0 +1,46 @@
+"""Confirm the admin endpoints are only open with the admin token."""
+
+from http import HTTPStatus
+
+import flask
+import pytest
+from flask import app as flask_app
+from flask.testing import FlaskClient
+from aloysius_parker import main
+
+ADMIN_TOKEN: str = "let-me-in"
+
+
+@pytest.fixture()
+def app() -> flask_app.Flask:
+    """Create a test fixture Flask application."""
+    test_app = main.create_app()
+    test_app.config["TESTING"] = True  # so we get better error messages.
+    return test_app
+
+
+@pytest.mark.parametrize(
+    ("token", "header", "status"),
+    [
+        (None, f"Bearer {ADMIN_TOKEN}", HTTPStatus.FORBIDDEN),
+        (ADMIN_TOKEN, None, HTTPStatus.UNAUTHORIZED),
+        (ADMIN_TOKEN, "Bearer guess", HTTPStatus.UNAUTHORIZED),
+        (ADMIN_TOKEN, f"Bearer {ADMIN_TOKEN}", HTTPStatus.OK),
+    ],
+)
+def test_admin_token_is_required(
+    app: flask_app.Flask,
+    client: FlaskClient,
+    token: str | None,
+    header: str | None,
+    status: HTTPStatus,
+) -> None:
+    """Admin endpoints are disabled without a token and need it when there is one."""
+    # ARRANGE
+    app.config["ADMIN_TOKEN"] = token
+    headers = {"Authorization": header} if header else {}
+    url = flask.url_for("admin.SlowQueriesEndpoint")
+    # ACT
+    response = client.get(url, headers=headers)
+    # ASSERT
+    assert response.status_code == status
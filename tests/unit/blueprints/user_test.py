@@ -10,8 +10,11 @@ from flask import app as flask_app
 from flask.testing import FlaskClient
 from aloysius_parker import main
 from aloysius_parker.database import user
+from aloysius_parker.database.db import database
 from sqlalchemy.orm import scoping
 
+from tests.unit.statements import capture_statements
+
 
 @pytest.fixture()
 def app() -> flask_app.Flask:
@@ -51,3 +54,204 @@ def test_get_user_not_found(invalid_id: Any, client: FlaskClient) -> None:
     # ASSERT
     assert response.status_code == HTTPStatus.NOT_FOUND
     assert "not found" in response.json["error"]
+
+
+@pytest.fixture(name="pen_pals")
+def create_pen_pals(client: FlaskClient) -> tuple[str, str, str]:
+    """Create two users and a message between them, returning all three IDs."""
+    author = {"name": "Pen", "email": "pen@gmail.com"}
+    recipient = {"name": "Pal", "email": "pal@gmail.com"}
+    author_id = client.post("/users", json=author).json["id"]
+    recipient_id = client.post("/users", json=recipient).json["id"]
+    message = {"author_id": author_id, "content": "Hello"}
+    response = client.post(f"/user/{recipient_id}/messages", json=message)
+    return author_id, recipient_id, response.json["id"]
+
+
+def test_get_messages_is_one_statement(
+    client: FlaskClient, pen_pals: tuple[str, str, str]
+) -> None:
+    """Fetching an inbox checks the user and reads the page in one statement."""
+    # ARRANGE
+    _, recipient_id, _ = pen_pals
+    url = flask.url_for("user.UserMessagesEndpoint", user_id=recipient_id)
+    # ACT
+    with capture_statements(database.engine) as statements:
+        response = client.get(url)
+    # ASSERT
+    assert response.status_code == HTTPStatus.OK
+    assert len(statements) == 1
+
+
+def test_send_message_is_one_statement(
+    client: FlaskClient, pen_pals: tuple[str, str, str]
+) -> None:
+    """Sending a message checks both users and inserts in one statement."""
+    # ARRANGE
+    author_id, recipient_id, _ = pen_pals
+    url = flask.url_for("user.UserMessagesEndpoint", user_id=recipient_id)
+    # ACT
+    with capture_statements(database.engine) as statements:
+        response = client.post(url, json={"author_id": author_id, "content": "Hi"})
+    # ASSERT
+    assert response.status_code == HTTPStatus.CREATED
+    assert len(statements) == 1
+
+
+def test_delete_message_is_one_statement(
+    client: FlaskClient, pen_pals: tuple[str, str, str]
+) -> None:
+    """Deleting a message finds and removes it in one statement."""
+    # ARRANGE
+    _, recipient_id, message_id = pen_pals
+    url = flask.url_for(
+        "user.UserMessagesEndpoint", user_id=recipient_id, message_id=message_id
+    )
+    # ACT
+    with capture_statements(database.engine) as statements:
+        response = client.delete(url)
+    # ASSERT
+    assert response.status_code == HTTPStatus.NO_CONTENT
+    assert len(statements) == 1
+
+
+def test_bulk_delete_is_one_statement(
+    client: FlaskClient, pen_pals: tuple[str, str, str]
+) -> None:
+    """Deleting a list of messages is one set-based statement, not one per message."""
+    # ARRANGE
+    _, recipient_id, message_id = pen_pals
+    url = flask.url_for("user.UserMessagesDeleteEndpoint", user_id=recipient_id)
+    body = {"message_ids": [message_id, "missing", "also missing"]}
+    # ACT
+    with capture_statements(database.engine) as statements:
+        response = client.post(url, json=body)
+    # ASSERT
+    assert response.json == {
+        "deleted": 1,
+        "unknown_message_ids": ["also missing", "missing"],
+    }
+    assert len(statements) == 1
+
+
+def test_sent_message_reads_back_the_same(
+    client: FlaskClient, pen_pals: tuple[str, str, str]
+) -> None:
+    """The message returned by a send is the message the inbox then returns."""
+    # ARRANGE
+    author_id, recipient_id, _ = pen_pals
+    url = flask.url_for("user.UserMessagesEndpoint", user_id=recipient_id)
+    # ACT
+    sent = client.post(url, json={"author_id": author_id, "content": "Hi"}).json
+    inbox = client.get(url).json
+    # ASSERT
+    assert inbox[0] == sent
+
+
+def test_send_message_to_unknown_recipient(
+    client: FlaskClient, pen_pals: tuple[str, str, str]
+) -> None:
+    """Nothing is sent when the recipient does not exist."""
+    # ARRANGE
+    author_id, _, _ = pen_pals
+    url = flask.url_for("user.UserMessagesEndpoint", user_id="0" * 32)
+    # ACT
+    response = client.post(url, json={"author_id": author_id, "content": "Hi"})
+    # ASSERT
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_unchanged_user_is_not_modified(
+    client: FlaskClient, pen_pals: tuple[str, str, str]
+) -> None:
+    """A user that has not changed since the last GET answers 304."""
+    # ARRANGE
+    author_id, _, _ = pen_pals
+    url = flask.url_for("user.UserEndpoint", user_id=author_id)
+    etag = client.get(url).headers["ETag"]
+    # ACT
+    unchanged = client.get(url, headers={"If-None-Match": etag})
+    client.patch(url, json={"name": "Quill", "email": "quill@gmail.com"})
+    changed = client.get(url, headers={"If-None-Match": etag})
+    # ASSERT
+    assert unchanged.status_code == HTTPStatus.NOT_MODIFIED
+    assert not unchanged.data
+    assert changed.status_code == HTTPStatus.OK
+    assert changed.json["name"] == "Quill"
+
+
+@pytest.mark.parametrize(
+    "if_none_match", ["W/{etag}", '"other", {etag}', "*"], ids=["weak", "list", "any"]
+)
+def test_if_none_match_compares_weakly(
+    client: FlaskClient, pen_pals: tuple[str, str, str], if_none_match: str
+) -> None:
+    """A weak tag, one of a list, or * matches the current representation."""
+    # ARRANGE
+    author_id, _, _ = pen_pals
+    url = flask.url_for("user.UserEndpoint", user_id=author_id)
+    etag = client.get(url).headers["ETag"]
+    # ACT
+    response = client.get(
+        url, headers={"If-None-Match": if_none_match.format(etag=etag)}
+    )
+    # ASSERT
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_unchanged_inbox_is_not_modified(
+    client: FlaskClient, pen_pals: tuple[str, str, str]
+) -> None:
+    """An unchanged inbox answers 304 without reading any messages."""
+    # ARRANGE
+    author_id, recipient_id, _ = pen_pals
+    url = flask.url_for("user.UserMessagesEndpoint", user_id=recipient_id)
+    etag = client.get(url).headers["ETag"]
+    # ACT
+    with capture_statements(database.engine) as statements:
+        unchanged = client.get(url, headers={"If-None-Match": etag})
+    client.post(url, json={"author_id": author_id, "content": "Still there?"})
+    changed = client.get(url, headers={"If-None-Match": etag})
+    # ASSERT
+    assert unchanged.status_code == HTTPStatus.NOT_MODIFIED
+    assert len(statements) == 1
+    assert "messages" not in statements[0][0]
+    assert changed.status_code == HTTPStatus.OK
+    assert changed.json[0]["content"] == "Still there?"
+
+
+def test_count_messages_reads_no_messages(
+    client: FlaskClient, pen_pals: tuple[str, str, str]
+) -> None:
+    """Counting a user's messages is a lookup of the user, not a scan of messages."""
+    # ARRANGE
+    _, recipient_id, _ = pen_pals
+    url = flask.url_for("user.UserMessagesCountEndpoint", user_id=recipient_id)
+    # ACT
+    with capture_statements(database.engine) as statements:
+        response = client.get(url)
+    missing = client.get(
+        flask.url_for("user.UserMessagesCountEndpoint", user_id="missing")
+    )
+    # ASSERT
+    assert response.status_code == HTTPStatus.OK
+    assert response.json == {"received": 1, "sent": 0}
+    assert len(statements) == 1
+    assert "messages" not in statements[0][0]
+    assert missing.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_get_user_with_counts(
+    client: FlaskClient, pen_pals: tuple[str, str, str]
+) -> None:
+    """The message counts are added to the user only when asked for."""
+    # ARRANGE
+    author_id, _, _ = pen_pals
+    url = flask.url_for("user.UserEndpoint", user_id=author_id)
+    # ACT
+    plain = client.get(url)
+    counted = client.get(url, query_string={"counts": "true"})
+    # ASSERT
+    assert "message_counts" not in plain.json
+    assert counted.json["message_counts"] == {"received": 0, "sent": 1}
+    assert counted.headers["ETag"] != plain.headers["ETag"]
@@ -0,0 +1,61 @@
+"""Confirm the database comes from the environment and SQLite files are tuned."""
+
+from pathlib import Path
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from flask import app as flask_app
+from sqlalchemy import text
+from aloysius_parker import main
+from aloysius_parker.config.database import SQLITE_PRAGMAS
+from aloysius_parker.database.db import database
+
+POOL_SIZE: int = 3
+
+
+# region Fixtures and helper functions
+@pytest.fixture()
+def app(monkeypatch: MonkeyPatch, tmp_path: Path) -> flask_app.Flask:
+    """Create a test fixture Flask application using a database file."""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'aloysius.db'}")
+    monkeypatch.setenv("DATABASE_POOL_SIZE", str(POOL_SIZE))
+    test_app = main.create_app()
+    test_app.config["TESTING"] = True  # so we get better error messages.
+    return test_app
+
+
+def pragma(name: str) -> str | int:
+    """Return the value of a pragma on a connection from the pool."""
+    return database.session.execute(text(f"PRAGMA {name}")).scalar()
+
+
+# endregion
+
+
+def test_database_file_from_environment(app: flask_app.Flask, tmp_path: Path) -> None:
+    """The tables are created in the file named by DATABASE_URL."""
+    # ASSERT
+    assert (tmp_path / "aloysius.db").exists()
+    assert database.engine.pool.size() == POOL_SIZE
+
+
+def test_pragmas_are_set_on_each_connection(app: flask_app.Flask) -> None:
+    """Every connection to the file uses WAL and the other pragmas."""
+    # ACT
+    database.engine.dispose()
+    # ASSERT
+    assert pragma("journal_mode") == "wal"
+    assert pragma("synchronous") == 1  # NORMAL
+    assert pragma("busy_timeout") == SQLITE_PRAGMAS["busy_timeout"]
+    assert pragma("cache_size") == SQLITE_PRAGMAS["cache_size"]
+
+
+def test_in_memory_by_default(monkeypatch: MonkeyPatch) -> None:
+    """Without DATABASE_URL the database is in memory and left as SQLite sets it."""
+    # ARRANGE
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    # ACT
+    with main.create_app().app_context():
+        # ASSERT
+        assert database.engine.url.database == ":memory:"
+        assert pragma("journal_mode") == "memory"
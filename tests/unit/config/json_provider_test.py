@@ -0,0 +1,55 @@
+"""Confirm the JSON provider encodes models the same with or without orjson."""
+
+from datetime import datetime, timezone
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from flask import app as flask_app
+from sqlalchemy import select
+from aloysius_parker import main
+from aloysius_parker.config import json_provider
+from aloysius_parker.database.db import database
+from aloysius_parker.database.message import Message
+from aloysius_parker.database.user import User
+
+
+# region Fixtures and helper functions
+@pytest.fixture()
+def app() -> flask_app.Flask:
+    """Create a test fixture Flask application."""
+    test_app = main.create_app()
+    test_app.config["TESTING"] = True  # so we get better error messages.
+    return test_app
+
+
+# endregion
+
+
+@pytest.mark.parametrize("timestamp_seconds", [0.0, 0.123456])
+def test_models_are_encoded_like_to_json(
+    app: flask_app.Flask, monkeypatch: MonkeyPatch, timestamp_seconds: float
+) -> None:
+    """Both encoders write a message exactly as its to_json representation."""
+    # ARRANGE
+    message = Message("adam", "eve", "Hello")
+    message.timestamp = datetime.fromtimestamp(timestamp_seconds, timezone.utc)
+    # ACT
+    fast: bytes = app.json.response([message]).data
+    monkeypatch.setattr(json_provider, "orjson", None)
+    standard: bytes = app.json.response([message]).data
+    # ASSERT
+    assert fast == standard
+    assert app.json.loads(fast) == [message.to_json()]
+
+
+def test_rows_are_encoded_by_name(app: flask_app.Flask) -> None:
+    """A Row tuple is written as an object keyed by column name."""
+    # ARRANGE
+    user = User("Adam", "adam@gmail.com")
+    database.session.add(user)
+    database.session.commit()
+    row = database.session.execute(select(User.id, User.name)).one()
+    # ACT
+    encoded: str = app.json.dumps(row)
+    # ASSERT
+    assert app.json.loads(encoded) == {"id": user.id, "name": "Adam"}
@@ -0,0 +1,40 @@
+"""Confirm the handlers only cache users when the environment asks for it."""
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from aloysius_parker import main
+from aloysius_parker.handler import user as user_handler
+
+CACHE_SIZE: int = 100
+CACHE_TTL: float = 5.0
+
+
+@pytest.mark.parametrize(
+    ("size", "ttl"), [(None, None), ("0", None), (str(CACHE_SIZE), "0")]
+)
+def test_cache_is_off_unless_sized(
+    monkeypatch: MonkeyPatch, size: str | None, ttl: str | None
+) -> None:
+    """By default, or with a size or TTL of 0, users are not cached."""
+    # ARRANGE
+    for name, value in (("USER_CACHE_SIZE", size), ("USER_CACHE_TTL", ttl)):
+        if value is None:
+            monkeypatch.delenv(name, raising=False)
+        else:
+            monkeypatch.setenv(name, value)
+    # ACT
+    main.create_app()
+    # ASSERT
+    assert user_handler.USERS.cache is None
+
+
+def test_cache_is_sized_from_environment(monkeypatch: MonkeyPatch) -> None:
+    """The size and time to live come from the environment."""
+    # ARRANGE
+    monkeypatch.setenv("USER_CACHE_SIZE", str(CACHE_SIZE))
+    monkeypatch.setenv("USER_CACHE_TTL", str(CACHE_TTL))
+    # ACT
+    main.create_app()
+    # ASSERT
+    cache = user_handler.USERS.cache
+    assert (cache.max_size, cache.ttl) == (CACHE_SIZE, CACHE_TTL)
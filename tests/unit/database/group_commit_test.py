@@ -0,0 +1,176 @@
+"""Confirm concurrent message sends are committed together when group commit is on."""
+
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import prometheus_client
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from flask import app as flask_app
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import StaticPool
+from aloysius_parker import main
+from aloysius_parker.database import group_commit
+from aloysius_parker.database.db import database
+from aloysius_parker.database.message import Message
+from aloysius_parker.database.user import User
+from aloysius_parker.database.user_repository import UserRepository
+
+SENDERS: int = 16
+
+
+# region Fixtures and helper functions
+@pytest.fixture()
+def app(monkeypatch: MonkeyPatch, tmp_path: Path) -> flask_app.Flask:
+    """Create a test fixture Flask application with group commit on a file."""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'aloysius.db'}")
+    monkeypatch.setenv("MESSAGE_GROUP_COMMIT", "true")
+    monkeypatch.setenv("MESSAGE_GROUP_COMMIT_MAX_WAIT_MS", "100")
+    test_app = main.create_app()
+    test_app.config["TESTING"] = True  # so we get better error messages.
+    return test_app
+
+
+@pytest.fixture(name="pen_pals")
+def create_pen_pals(app: flask_app.Flask) -> tuple[str, str]:
+    """Create two users to send messages between."""
+    repository = UserRepository(database)
+    adam, eve = User("Adam", "adam@gmail.com"), User("Eve", "eve@mail.ru")
+    repository.create_user(adam)
+    repository.create_user(eve)
+    return adam.id, eve.id
+
+
+def batches() -> float:
+    """Return the number of group commits so far."""
+    return prometheus_client.REGISTRY.get_sample_value(
+        "message_group_commit_batch_size_count"
+    )
+
+
+def concurrently(count: int, target) -> list:
+    """Call the target with each number up to count, each in its own thread."""
+    results: list = [None] * count
+
+    def call(number: int) -> None:
+        try:
+            results[number] = target(number)
+        except Exception as e:  # kept for the test to check
+            results[number] = e
+
+    threads = [threading.Thread(target=call, args=(n,)) for n in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+# endregion
+
+
+def test_concurrent_sends_share_commits(
+    app: flask_app.Flask, pen_pals: tuple[str, str]
+) -> None:
+    """Every message is committed, in fewer commits than messages."""
+    # ARRANGE
+    before: float = batches()
+
+    def send(number: int) -> Message | None:
+        with app.app_context():
+            return UserRepository(database).send_user_message(*pen_pals, f"{number}")
+
+    # ACT
+    sent: list = concurrently(SENDERS, send)
+    # ASSERT
+    assert all(isinstance(message, Message) for message in sent)
+    assert database.session.scalar(select(func.count(Message.id))) == SENDERS
+    assert batches() - before < SENDERS
+
+
+def test_unknown_recipient_is_not_sent(
+    app: flask_app.Flask, pen_pals: tuple[str, str]
+) -> None:
+    """The guard on both users existing still applies in a batch."""
+    # ACT
+    message = UserRepository(database).send_user_message(pen_pals[0], "0" * 32, "Hi")
+    # ASSERT
+    assert message is None
+
+
+def test_failed_insert_does_not_fail_the_batch(
+    app: flask_app.Flask, pen_pals: tuple[str, str]
+) -> None:
+    """An insert that fails is reported to its sender alone."""
+    # ARRANGE
+    writer = group_commit.queue_for(database.engine)
+    rows: list[dict] = [
+        {"id": "duplicate", "author_id": pen_pals[0], "recipient_id": pen_pals[1]},
+        {"id": "duplicate", "author_id": pen_pals[0], "recipient_id": pen_pals[1]},
+        {"id": "unique", "author_id": pen_pals[0], "recipient_id": pen_pals[1]},
+    ]
+    # ACT
+    results: list = concurrently(
+        len(rows),
+        lambda number: writer.submit(
+            insert(Message).values(
+                content=f"{number}",
+                timestamp=datetime.now(timezone.utc),
+                **rows[number],
+            )
+        ),
+    )
+    # ASSERT
+    errors: list = [result for result in results if isinstance(result, Exception)]
+    assert [type(error) for error in errors] == [IntegrityError]
+    assert database.session.scalar(select(func.count(Message.id))) == len(rows) - 1
+
+
+def test_unexpected_error_fails_the_batch_not_the_writer(
+    app: flask_app.Flask, pen_pals: tuple[str, str], monkeypatch: MonkeyPatch
+) -> None:
+    """A batch failing other than in the database fails its sends, not later ones."""
+    # ARRANGE
+    writer = group_commit.queue_for(database.engine)
+    repository = UserRepository(database)
+    commit = writer._commit
+
+    def fail_once(batch: list) -> None:
+        monkeypatch.setattr(writer, "_commit", commit)
+        raise RuntimeError("not a database error")
+
+    monkeypatch.setattr(writer, "_commit", fail_once)
+    # ACT
+    with pytest.raises(RuntimeError):
+        repository.send_user_message(*pen_pals, "Lost")
+    message = repository.send_user_message(*pen_pals, "Hello")
+    # ASSERT
+    assert isinstance(message, Message)
+
+
+def test_send_gives_up_after_the_timeout(
+    app: flask_app.Flask, pen_pals: tuple[str, str], monkeypatch: MonkeyPatch
+) -> None:
+    """A sender is not left waiting on a batch that does not commit."""
+    # ARRANGE
+    writer = group_commit.queue_for(database.engine)
+    commit = writer._commit
+    monkeypatch.setattr(writer, "timeout", 0.1)
+    monkeypatch.setattr(
+        writer, "_commit", lambda batch: time.sleep(0.5) or commit(batch)
+    )
+    # ACT / ASSERT
+    with pytest.raises(TimeoutError):
+        UserRepository(database).send_user_message(*pen_pals, "Slow")
+
+
+def test_refused_for_an_in_memory_database() -> None:
+    """Every thread shares an in-memory database's one connection."""
+    # ARRANGE
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    # ACT / ASSERT
+    with pytest.raises(ValueError):
+        group_commit.enable(engine)
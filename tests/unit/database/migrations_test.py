@@ -0,0 +1,312 @@
+"""Confirm the migrations index the hot queries and upgrade old databases in place."""
+
+import re
+import threading
+from pathlib import Path
+from typing import Callable
+
+import pytest
+from flask import app as flask_app
+from aloysius_parker import main
+from aloysius_parker.database import migrations, user_purge
+from aloysius_parker.database.db import database
+from aloysius_parker.database.user import User
+from aloysius_parker.database.user_repository import UserRepository
+from _pytest.monkeypatch import MonkeyPatch
+from sqlalchemy import Engine, create_engine, inspect
+
+from tests.unit.statements import capture_statements
+
+
+# region Fixtures and helper functions
+@pytest.fixture()
+def app() -> flask_app.Flask:
+    """Create a test fixture Flask application."""
+    test_app = main.create_app()
+    test_app.config["TESTING"] = True  # so we get better error messages.
+    return test_app
+
+
+@pytest.fixture(name="users")
+def seed_users(app: flask_app.Flask) -> tuple[User, User]:
+    """Add two users who have exchanged a message."""
+    adam, eve = User("Adam", "adam@gmail.com"), User("Eve", "eve@mail.ru")
+    repository = UserRepository(database)
+    repository.create_user(adam)
+    repository.create_user(eve)
+    repository.send_user_message(adam.id, eve.id, "Hello")
+    return adam, eve
+
+
+def query_plans(action: Callable) -> list[str]:
+    """Run the action and return the plan of each query on messages it issued."""
+    with capture_statements(database.engine) as statements:
+        action()
+
+    connection = database.session.connection()
+    return [
+        " / ".join(
+            row[-1]
+            for row in connection.exec_driver_sql(
+                f"EXPLAIN QUERY PLAN {statement}", parameters
+            )
+        )
+        for statement, parameters in statements
+        if statement.lstrip().startswith(("SELECT", "DELETE"))
+        and re.search(r"\bmessages\b", statement)
+    ]
+
+
+# endregion
+
+
+def test_inbox_page_uses_index(users: tuple[User, User]) -> None:
+    """Fetching an inbox seeks the recipient index instead of scanning messages."""
+    # ARRANGE
+    repository = UserRepository(database)
+    _, eve = users
+    # ACT
+    plans = query_plans(lambda: repository.get_user_messages(eve.id, 10))
+    # ASSERT
+    assert "ix_messages_recipient_timestamp_id" in plans[0]
+    assert "SCAN messages" not in plans[0]
+
+
+def test_message_delete_lookup_uses_index(users: tuple[User, User]) -> None:
+    """Looking up the message to delete does not scan messages."""
+    # ARRANGE
+    repository = UserRepository(database)
+    _, eve = users
+    # ACT
+    plans = query_plans(lambda: repository.delete_user_message(eve.id, "missing"))
+    # ASSERT
+    assert plans
+    assert all("SCAN messages" not in plan.split(" / ") for plan in plans)
+
+
+def test_fetch_messages_uses_index(users: tuple[User, User]) -> None:
+    """Searching a user's messages uses the full-text index, not a LIKE scan."""
+    # ARRANGE
+    _, eve = users
+    # ACT
+    plans = query_plans(lambda: eve.fetch_messages(contains="hello"))
+    # ASSERT
+    assert "SCAN messages_fts VIRTUAL TABLE" in plans[0]
+    assert "SCAN messages" not in plans[0].split(" / ")
+
+
+def test_upgrade_existing_database_in_place(tmp_path: Path) -> None:
+    """A database created before migrations existed gains the indexes and a version."""
+    # ARRANGE
+    engine: Engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE users (id VARCHAR PRIMARY KEY, name VARCHAR, email VARCHAR)"
+        )
+        connection.exec_driver_sql(
+            "CREATE TABLE messages (id VARCHAR PRIMARY KEY, content VARCHAR(250), "
+            "author_id VARCHAR, recipient_id VARCHAR, timestamp DATETIME)"
+        )
+        connection.exec_driver_sql("INSERT INTO users VALUES ('1', 'Adam', 'a@b.c')")
+    latest: int = migrations.MIGRATIONS[-1][0]
+    # ACT
+    version = migrations.upgrade(engine)
+    again = migrations.upgrade(engine)
+    # ASSERT
+    indexes = {index["name"] for index in inspect(engine).get_indexes("messages")}
+    assert version == again == latest
+    assert "ix_messages_recipient_timestamp_id" in indexes
+    assert "ix_messages_author_recipient_timestamp" in indexes
+    assert "ix_messages_timestamp_id" in indexes
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("SELECT name FROM users").scalar() == "Adam"
+    engine.dispose()
+
+
+def test_message_counts_follow_inserts_and_deletes(users: tuple[User, User]) -> None:
+    """The counts on each user are kept up to date as messages come and go."""
+    # ARRANGE
+    repository = UserRepository(database)
+    adam, eve = users
+    reply = repository.send_user_message(eve.id, adam.id, "Hi")
+    repository.send_user_message(adam.id, eve.id, "How are you?")
+    # ACT
+    repository.delete_user_message(adam.id, reply.id)
+    # ASSERT
+    assert repository.get_message_counts(adam.id) == {"received": 0, "sent": 2}
+    assert repository.get_message_counts(eve.id) == {"received": 2, "sent": 0}
+    assert repository.get_message_counts("missing") is None
+
+
+def test_upgrade_counts_existing_messages(tmp_path: Path) -> None:
+    """Upgrading a database counts the messages it already holds."""
+    # ARRANGE
+    engine: Engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE users (id VARCHAR PRIMARY KEY, name VARCHAR, email VARCHAR)"
+        )
+        connection.exec_driver_sql(
+            "CREATE TABLE messages (id VARCHAR PRIMARY KEY, content VARCHAR(250), "
+            "author_id VARCHAR, recipient_id VARCHAR, timestamp DATETIME)"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO users VALUES ('1', 'Adam', 'a@b.c'), ('2', 'Eve', 'e@b.c')"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO messages VALUES ('m1', 'Hi', '1', '2', '2024-01-01'), "
+            "('m2', 'Hello', '1', '2', '2024-01-02')"
+        )
+    # ACT
+    migrations.upgrade(engine)
+    # ASSERT
+    with engine.connect() as connection:
+        counts = connection.exec_driver_sql(
+            "SELECT id, received_count, sent_count FROM users ORDER BY id"
+        ).all()
+    assert [tuple(row) for row in counts] == [("1", 0, 2), ("2", 2, 0)]
+    engine.dispose()
+
+
+def test_upgrade_queues_orphaned_messages(tmp_path: Path) -> None:
+    """Messages of users deleted before purges were recorded are queued for purging."""
+    # ARRANGE
+    engine: Engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE users (id VARCHAR PRIMARY KEY, name VARCHAR, email VARCHAR)"
+        )
+        connection.exec_driver_sql(
+            "CREATE TABLE messages (id VARCHAR PRIMARY KEY, content VARCHAR(250), "
+            "author_id VARCHAR, recipient_id VARCHAR, timestamp DATETIME)"
+        )
+        connection.exec_driver_sql("INSERT INTO users VALUES ('1', 'Adam', 'a@b.c')")
+        connection.exec_driver_sql(
+            "INSERT INTO messages VALUES ('m1', 'Hi', '1', 'gone', '2024-01-01')"
+        )
+    # ACT
+    migrations.upgrade(engine)
+    # ASSERT
+    assert user_purge.pending(engine) == ["gone"]
+    engine.dispose()
+
+
+def test_upgrade_keeps_pending_purges(tmp_path: Path) -> None:
+    """Purges recorded before finished ones were kept are still pending."""
+    # ARRANGE
+    engine: Engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE users (id VARCHAR PRIMARY KEY, name VARCHAR, email VARCHAR)"
+        )
+        connection.exec_driver_sql(
+            "CREATE TABLE messages (id VARCHAR PRIMARY KEY, content VARCHAR(250), "
+            "author_id VARCHAR, recipient_id VARCHAR, timestamp DATETIME)"
+        )
+        connection.exec_driver_sql(
+            "CREATE TABLE pending_user_purges "
+            "(user_id VARCHAR PRIMARY KEY, requested_at DATETIME NOT NULL)"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO pending_user_purges VALUES ('gone', '2024-01-01')"
+        )
+    # ACT
+    migrations.upgrade(engine)
+    # ASSERT
+    assert user_purge.pending(engine) == ["gone"]
+    user_purge.purge_user(engine, "gone")
+    assert user_purge.pending(engine) == []
+    engine.dispose()
+
+
+def test_messages_are_sequenced_as_committed(users: tuple[User, User]) -> None:
+    """Each message sent to a user takes the next place in their inbox."""
+    # ARRANGE
+    repository = UserRepository(database)
+    adam, eve = users
+    # ACT
+    repository.send_user_message(adam.id, eve.id, "Are you there?")
+    # ASSERT
+    sequences = [
+        message.sequence
+        for message in repository.get_user_messages_since(eve.id, 0, 10)
+    ]
+    assert sequences == [1, 2]
+    assert repository.get_inbox_version(eve.id) == sequences[-1]
+
+
+def test_upgrade_sequences_existing_messages(tmp_path: Path) -> None:
+    """Messages already in an inbox are sequenced oldest first."""
+    # ARRANGE
+    engine: Engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE users (id VARCHAR PRIMARY KEY, name VARCHAR, email VARCHAR)"
+        )
+        connection.exec_driver_sql(
+            "CREATE TABLE messages (id VARCHAR PRIMARY KEY, content VARCHAR(250), "
+            "author_id VARCHAR, recipient_id VARCHAR, timestamp DATETIME)"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO users VALUES ('1', 'Adam', 'a@b.c'), ('2', 'Eve', 'e@f.g')"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO messages VALUES ('m2', 'Later', '1', '2', '2024-01-02'), "
+            "('m1', 'Hi', '1', '2', '2024-01-01')"
+        )
+    # ACT
+    migrations.upgrade(engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO messages (id, content, author_id, recipient_id, timestamp) "
+            "VALUES ('m3', 'Hello?', '1', '2', '2023-12-31')"
+        )
+        sequences = connection.exec_driver_sql(
+            "SELECT id, sequence FROM messages ORDER BY sequence"
+        ).all()
+    # ASSERT
+    assert [tuple(row) for row in sequences] == [("m1", 1), ("m2", 2), ("m3", 3)]
+    engine.dispose()
+
+
+def test_failed_migration_leaves_no_schema_changes(
+    tmp_path: Path, monkeypatch: MonkeyPatch
+) -> None:
+    """Tables created before a migration fails are rolled back with it."""
+    # ARRANGE
+    engine: Engine = create_engine(f"sqlite:///{tmp_path / 'aloysius.db'}")
+
+    def fail(connection) -> None:
+        raise RuntimeError("migration failed")
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [(1, "fail", fail)])
+    # ACT
+    with pytest.raises(RuntimeError):
+        migrations.set_up(engine)
+    # ASSERT
+    assert not inspect(engine).get_table_names()
+    engine.dispose()
+
+
+def test_concurrent_set_ups_wait_for_each_other(tmp_path: Path) -> None:
+    """Processes starting together on a fresh file do not race to create tables."""
+    # ARRANGE
+    url: str = f"sqlite:///{tmp_path / 'aloysius.db'}"
+    results: list = []
+
+    def set_up() -> None:
+        engine: Engine = create_engine(url, connect_args={"timeout": 30})
+        try:
+            results.append(migrations.set_up(engine))
+        except Exception as e:  # kept for the test to check
+            results.append(e)
+        engine.dispose()
+
+    threads = [threading.Thread(target=set_up) for _ in range(4)]
+    # ACT
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # ASSERT
+    assert results == [migrations.MIGRATIONS[-1][0]] * len(threads)
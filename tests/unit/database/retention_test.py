@@ -0,0 +1,148 @@
+"""Confirm the retention policy purges old messages in chunks, or only counts them."""
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import prometheus_client
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from flask import app as flask_app
+from sqlalchemy import func, select, update
+from aloysius_parker import main
+from aloysius_parker.database import retention
+from aloysius_parker.database.db import database
+from aloysius_parker.database.message import Message
+from aloysius_parker.database.user import User
+from aloysius_parker.database.user_repository import UserRepository
+
+from tests.unit.statements import capture_statements
+
+OLD_MESSAGES: int = 5
+NEW_MESSAGES: int = 3
+CHUNK_SIZE: int = 2
+
+
+# region Fixtures and helper functions
+@pytest.fixture()
+def app(monkeypatch: MonkeyPatch, tmp_path: Path) -> flask_app.Flask:
+    """Create a test fixture Flask application on a database file."""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'aloysius.db'}")
+    test_app = main.create_app()
+    test_app.config["TESTING"] = True  # so we get better error messages.
+    return test_app
+
+
+@pytest.fixture(name="pen_pals")
+def create_pen_pals(app: flask_app.Flask) -> tuple[str, str]:
+    """Create two users, the second with a year old and some new messages."""
+    repository = UserRepository(database)
+    adam, eve = User("Adam", "adam@gmail.com"), User("Eve", "eve@mail.ru")
+    repository.create_user(adam)
+    repository.create_user(eve)
+    old: list[str] = [
+        repository.send_user_message(adam.id, eve.id, f"Old {number}").id
+        for number in range(OLD_MESSAGES)
+    ]
+    for number in range(NEW_MESSAGES):
+        repository.send_user_message(adam.id, eve.id, f"New {number}")
+    database.session.execute(
+        update(Message)
+        .where(Message.id.in_(old))
+        .values(timestamp=datetime.now(timezone.utc) - timedelta(days=365))
+    )
+    database.session.commit()
+    return adam.id, eve.id
+
+
+def message_count() -> int:
+    """Return the number of messages left."""
+    return database.session.scalar(select(func.count(Message.id)))
+
+
+def sample(name: str) -> float:
+    """Return the current value of a retention metric."""
+    return prometheus_client.REGISTRY.get_sample_value(name) or 0.0
+
+
+# endregion
+
+
+def test_dry_run_only_counts(app: flask_app.Flask, pen_pals: tuple[str, str]) -> None:
+    """A dry run reports what would be purged and leaves every message."""
+    # ARRANGE
+    policy = retention.RetentionPolicy(max_age=timedelta(days=30))
+    # ACT
+    purgeable = retention.purge(database.engine, policy, dry_run=True)
+    # ASSERT
+    assert purgeable == OLD_MESSAGES
+    assert sample("message_retention_purgeable") == OLD_MESSAGES
+    assert message_count() == OLD_MESSAGES + NEW_MESSAGES
+
+
+def test_purge_by_age_in_chunks(
+    app: flask_app.Flask, pen_pals: tuple[str, str]
+) -> None:
+    """Expired messages are deleted a chunk at a time and the counts follow."""
+    # ARRANGE
+    policy = retention.RetentionPolicy(max_age=timedelta(days=30))
+    before: float = sample("message_retention_purged_total")
+    purges: float = sample("message_retention_purge_seconds_count")
+    # ACT
+    purged = retention.purge(database.engine, policy, chunk_size=CHUNK_SIZE)
+    # ASSERT
+    assert purged == OLD_MESSAGES
+    assert message_count() == NEW_MESSAGES
+    assert sample("message_retention_purged_total") - before == OLD_MESSAGES
+    assert sample("message_retention_purge_seconds_count") - purges == 1
+    counts = UserRepository(database).get_message_counts(pen_pals[1])
+    assert counts == {"received": NEW_MESSAGES, "sent": 0}
+
+
+def test_purge_keeps_newest_per_recipient(
+    app: flask_app.Flask, pen_pals: tuple[str, str]
+) -> None:
+    """Only the newest messages up to the maximum are kept in each inbox."""
+    # ARRANGE
+    policy = retention.RetentionPolicy(max_per_recipient=NEW_MESSAGES)
+    # ACT
+    purged = retention.purge(database.engine, policy, chunk_size=CHUNK_SIZE)
+    # ASSERT
+    contents = database.session.scalars(select(Message.content)).all()
+    assert purged == OLD_MESSAGES
+    assert sorted(contents) == [f"New {number}" for number in range(NEW_MESSAGES)]
+
+
+def test_expired_chunk_seeks_the_timestamp_index(
+    app: flask_app.Flask, pen_pals: tuple[str, str]
+) -> None:
+    """Finding expired messages searches the age index rather than every message."""
+    # ARRANGE
+    query = retention.expired(datetime.now(timezone.utc), CHUNK_SIZE)
+    with capture_statements(database.engine) as statements:
+        database.session.execute(query)
+    (statement, parameters), *_ = statements
+    # ACT
+    plan = [
+        row[-1]
+        for row in database.session.connection().exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}", parameters
+        )
+    ]
+    # ASSERT
+    assert plan[0].startswith("SEARCH messages USING COVERING INDEX")
+    assert "ix_messages_timestamp_id" in plan[0]
+    assert not any(step.startswith("SCAN messages") for step in plan)
+
+
+def test_worker_purges_in_the_background(
+    app: flask_app.Flask, pen_pals: tuple[str, str]
+) -> None:
+    """An enabled worker purges straight away and stops when asked."""
+    # ARRANGE
+    policy = retention.RetentionPolicy(max_age=timedelta(days=30))
+    # ACT
+    worker = retention.enable(database.engine, policy, chunk_size=CHUNK_SIZE)
+    worker.stop()
+    # ASSERT
+    assert retention.worker_for(database.engine) is worker
+    assert message_count() == NEW_MESSAGES
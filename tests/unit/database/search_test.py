@@ -0,0 +1,101 @@
+"""Confirm that message search ranks, pages, stays in sync and falls back to LIKE."""
+
+import json
+from http import HTTPStatus
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from flask import app as flask_app
+from flask.testing import FlaskClient
+from aloysius_parker import main
+from aloysius_parker.database import search
+from aloysius_parker.database.db import database
+from aloysius_parker.database.user import User
+from aloysius_parker.database.user_repository import UserRepository
+
+# How many of the messages in Eve's inbox mention apples.
+APPLE_MESSAGES: int = 3
+
+
+# region Fixtures and helper functions
+@pytest.fixture()
+def app() -> flask_app.Flask:
+    """Create a test fixture Flask application."""
+    test_app = main.create_app()
+    test_app.config["TESTING"] = True  # so we get better error messages.
+    return test_app
+
+
+@pytest.fixture(name="inbox")
+def fill_inbox(app: flask_app.Flask) -> tuple[UserRepository, str]:
+    """Send a few messages to one user and one to another, returning the first."""
+    repository = UserRepository(database)
+    adam, eve, cain = (
+        User("Adam", "adam@gmail.com"),
+        User("Eve", "eve@mail.ru"),
+        User("Cain", "cain@gmail.com"),
+    )
+    for user in (adam, eve, cain):
+        repository.create_user(user)
+    for content in ("apple pie", "apple apple apple", "snake", 'the "apple" "tree'):
+        repository.send_user_message(adam.id, eve.id, content)
+    repository.send_user_message(adam.id, cain.id, "apple")
+    return repository, eve.id
+
+
+# endregion
+
+
+def test_search_ranks_best_match_first(inbox: tuple[UserRepository, str]) -> None:
+    """Only the recipient's matching messages come back, the best match first."""
+    # ARRANGE
+    repository, eve_id = inbox
+    # ACT
+    results = repository.search_user_messages(eve_id, ["apple"], 10)
+    # ASSERT
+    assert [message.content for message, _ in results][0] == "apple apple apple"
+    assert len(results) == APPLE_MESSAGES
+    assert all(message.recipient_id == eve_id for message, _ in results)
+
+
+def test_search_index_follows_deletes(inbox: tuple[UserRepository, str]) -> None:
+    """A deleted message can no longer be found."""
+    # ARRANGE
+    repository, eve_id = inbox
+    (snake, _), *_ = repository.search_user_messages(eve_id, ["snake"], 10)
+    # ACT
+    repository.delete_user_message(eve_id, snake.id)
+    # ASSERT
+    assert not repository.search_user_messages(eve_id, ["snake"], 10)
+
+
+def test_search_falls_back_to_like(
+    inbox: tuple[UserRepository, str], monkeypatch: MonkeyPatch
+) -> None:
+    """Without the full-text index, searching still finds substrings."""
+    # ARRANGE
+    repository, eve_id = inbox
+    monkeypatch.setattr(search, "has_search_index", lambda connection: False)
+    # ACT
+    results = repository.search_user_messages(eve_id, ["ppl", "pie"], 10)
+    # ASSERT
+    assert [message.content for message, _ in results] == ["apple pie"]
+
+
+def test_search_pages_with_cursor(
+    inbox: tuple[UserRepository, str], client: FlaskClient
+) -> None:
+    """Searching over HTTP pages through every match, quotes and all."""
+    # ARRANGE
+    _, eve_id = inbox
+    url = f'/user/{eve_id}/messages?q="apple"&limit=1'
+    # ACT
+    seen: list[str] = []
+    response = client.get(url)
+    while response.status_code == HTTPStatus.OK:
+        seen += [message["content"] for message in response.json]
+        if not (cursor := json.loads(response.headers["X-Pagination"])["next_cursor"]):
+            break
+        response = client.get(f"{url}&cursor={cursor}")
+    # ASSERT
+    assert len(seen) == len(set(seen)) == APPLE_MESSAGES
@@ -0,0 +1,119 @@
+"""Confirm the user cache evicts, expires and is invalidated by writes."""
+
+import prometheus_client
+import pytest
+from flask import app as flask_app
+from aloysius_parker import main
+from aloysius_parker.database.db import database
+from aloysius_parker.database.user import User
+from aloysius_parker.database.user_cache import MISSING, UserCache
+from aloysius_parker.database.user_repository import UserRepository
+
+
+# region Fixtures and helper functions
+class FakeClock:
+    """A clock that only moves when told to."""
+
+    def __init__(self) -> None:
+        """Start the clock at zero."""
+        self.now: float = 0.0
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+
+def sample(name: str) -> float:
+    """Return the current value of a Prometheus counter."""
+    return prometheus_client.REGISTRY.get_sample_value(name)
+
+
+@pytest.fixture()
+def app() -> flask_app.Flask:
+    """Create a test fixture Flask application."""
+    test_app = main.create_app()
+    test_app.config["TESTING"] = True  # so we get better error messages.
+    return test_app
+
+
+# endregion
+
+
+def test_least_recently_used_is_evicted() -> None:
+    """The entry read longest ago makes room for a new one."""
+    # ARRANGE
+    cache = UserCache(max_size=2)
+    evictions = sample("user_cache_evictions_total")
+    cache.put("a", {"id": "a"})
+    cache.put("b", {"id": "b"})
+    cache.get("a")
+    # ACT
+    cache.put("c", {"id": "c"})
+    # ASSERT
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == {"id": "a"}
+    assert sample("user_cache_evictions_total") == evictions + 1
+
+
+def test_entries_expire() -> None:
+    """Entries, including cached misses, are forgotten after the time to live."""
+    # ARRANGE
+    clock = FakeClock()
+    cache = UserCache(ttl=10, clock=clock)
+    cache.put("nobody", None)
+    # ACT
+    before = cache.get("nobody")
+    clock.now = 11
+    after = cache.get("nobody")
+    # ASSERT
+    assert before is None
+    assert after is MISSING
+
+
+def test_repository_reads_through_and_invalidates(app: flask_app.Flask) -> None:
+    """Repeat reads skip the database and writes are seen by the next read."""
+    # ARRANGE
+    repository = UserRepository(database, UserCache())
+    user = User("Adam", "adam@gmail.com")
+    repository.create_user(user)
+    user_id: str = user.id
+    hits = sample("user_cache_hits_total")
+    # ACT
+    repository.get_user(user_id)
+    repository.get_user(user_id)
+    repository.update_user(user_id, User("Eden", None))
+    renamed = repository.get_user(user_id)
+    repository.delete_user(user_id)
+    # ASSERT
+    assert sample("user_cache_hits_total") == hits + 1
+    assert renamed.name == "Eden"
+    assert repository.get_user(user_id) is None
+
+
+def test_read_racing_an_invalidation_is_not_cached() -> None:
+    """A snapshot read before the key was invalidated is dropped, others are kept."""
+    # ARRANGE
+    cache = UserCache(max_size=1)
+    stale = cache.generation()
+    cache.invalidate("a")
+    # ACT
+    cache.put("a", {"id": "a", "name": "Adam"}, stale)
+    cache.put("b", {"id": "b"}, stale)
+    cache.invalidate("b")
+    cache.put("a", {"id": "a", "name": "Adam"}, stale)
+    cache.put("c", {"id": "c"}, cache.generation())
+    # ASSERT
+    assert cache.get("a") is MISSING
+    assert cache.get("c") == {"id": "c"}
+
+
+def test_cache_hit_is_not_validated_again(app: flask_app.Flask) -> None:
+    """A cached user is rebuilt from the snapshot as it is."""
+    # ARRANGE
+    cache = UserCache()
+    repository = UserRepository(database, cache)
+    cache.put((database.engine, "legacy"), {"id": "legacy", "name": "Adam"})
+    # ACT
+    user = repository.get_user("legacy")
+    # ASSERT
+    assert user.to_json() == {"id": "legacy", "name": "Adam", "email": None}
@@ -0,0 +1,59 @@
+"""Confirm the inbox hub wakes the recipient's subscribers only."""
+
+from aloysius_parker.extensions.inbox_hub import InboxHub
+
+
+def test_wake_reaches_subscribers_of_the_recipients() -> None:
+    """Each subscriber to the recipients is woken, and no one else."""
+    # ARRANGE
+    hub = InboxHub()
+    first, second, third, other = (
+        hub.subscribe("eve"),
+        hub.subscribe("eve"),
+        hub.subscribe("abel"),
+        hub.subscribe("cain"),
+    )
+    # ACT
+    woken: int = hub.wake("eve", "abel")
+    # ASSERT
+    assert woken == len([first, second, third])
+    assert first.wait(timeout=0) and second.wait(timeout=0) and third.wait(timeout=0)
+    assert not other.wait(timeout=0)
+
+
+def test_wake_all_reaches_every_subscriber() -> None:
+    """Waking every subscriber reaches them whoever they subscribed to."""
+    # ARRANGE
+    hub = InboxHub()
+    subscriptions = [hub.subscribe("eve"), hub.subscribe("cain")]
+    # ACT
+    woken: int = hub.wake_all()
+    # ASSERT
+    assert woken == len(subscriptions)
+    assert all(subscription.wait(timeout=0) for subscription in subscriptions)
+
+
+def test_closed_subscriptions_are_not_woken() -> None:
+    """A subscription stops being woken when it is closed."""
+    # ARRANGE
+    hub = InboxHub()
+    with hub.subscribe("eve") as subscription:
+        pass
+    # ACT
+    woken: int = hub.wake("eve") + hub.wake_all()
+    # ASSERT
+    assert woken == 0
+    assert not subscription.wait(timeout=0)
+
+
+def test_wakes_coalesce() -> None:
+    """Any number of wakes before the subscriber looks make one, never a backlog."""
+    # ARRANGE
+    hub = InboxHub()
+    subscription = hub.subscribe("eve")
+    # ACT
+    for _ in range(10_000):
+        hub.wake("eve")
+    # ASSERT
+    assert subscription.wait(timeout=0)
+    assert not subscription.wait(timeout=0)
@@ -0,0 +1,126 @@
+"""Confirm requests are only profiled when asked to, and the profiles are written."""
+
+import json
+import pstats
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from flask import app as flask_app
+from flask.testing import FlaskClient
+from aloysius_parker import main
+from aloysius_parker.extensions import profiling
+
+ADMIN_TOKEN: str = "let-me-in"
+ADMIN: dict[str, str] = {"Authorization": f"Bearer {ADMIN_TOKEN}"}
+
+
+# region Fixtures and helper functions
+@pytest.fixture()
+def app(monkeypatch: MonkeyPatch, tmp_path: Path) -> flask_app.Flask:
+    """Create a test fixture Flask application writing profiles to a directory."""
+    monkeypatch.setenv("ADMIN_TOKEN", ADMIN_TOKEN)
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    test_app = main.create_app()
+    test_app.config["TESTING"] = True  # so we get better error messages.
+    return test_app
+
+
+# endregion
+
+
+def test_signed_header_is_verified() -> None:
+    """Only an unexpired header signed with the key is accepted."""
+    # ARRANGE
+    now: float = time.time()
+    valid = profiling.sign(ADMIN_TOKEN, int(now) + 60)
+    expired = profiling.sign(ADMIN_TOKEN, int(now) - 1)
+    forged = profiling.sign("guess", int(now) + 60)
+    # ACT
+    results = [
+        profiling.verify(ADMIN_TOKEN, value) for value in (valid, expired, forged)
+    ]
+    # ASSERT
+    assert results == [True, False, False]
+    assert not profiling.verify(None, valid)
+
+
+def test_signed_request_writes_pstats(client: FlaskClient, tmp_path: Path) -> None:
+    """A request with a signed X-Profile header is profiled with cProfile."""
+    # ARRANGE
+    header = profiling.sign(ADMIN_TOKEN, int(time.time()) + 60)
+    # ACT
+    plain = client.get("/users")
+    profiled = client.get("/users", headers={profiling.HEADER: header})
+    # ASSERT
+    assert profiling.FILE_HEADER not in plain.headers
+    stats = pstats.Stats(str(tmp_path / profiled.headers[profiling.FILE_HEADER]))
+    assert stats.total_calls
+
+
+def test_armed_profiler_samples_to_speedscope(
+    app: flask_app.Flask, client: FlaskClient, tmp_path: Path
+) -> None:
+    """An admin can profile the next request, here with the stack sampler."""
+    # ARRANGE
+    app.extensions["profiler"].profile_format = profiling.SPEEDSCOPE
+    client.post("/admin/profiling", json={"requests": 1}, headers=ADMIN)
+    # ACT
+    profiled = client.get("/users")
+    after = client.get("/users")
+    # ASSERT
+    name = profiled.headers[profiling.FILE_HEADER]
+    speedscope = json.loads((tmp_path / name).read_text())
+    assert speedscope["profiles"][0]["type"] == "sampled"
+    assert profiling.FILE_HEADER not in after.headers
+    status = client.get("/admin/profiling", headers=ADMIN).json
+    assert status["armed"] == 0
+    assert status["profiles"] == [name]
+
+
+def test_only_the_latest_profiles_are_kept(
+    app: flask_app.Flask, client: FlaskClient, tmp_path: Path
+) -> None:
+    """Older profiles are deleted and the status lists the newest first."""
+    # ARRANGE
+    profiler = app.extensions["profiler"]
+    profiler.max_profiles = 2
+    client.post("/admin/profiling", json={"requests": 3}, headers=ADMIN)
+    # ACT
+    names = [client.get("/users").headers[profiling.FILE_HEADER] for _ in range(3)]
+    # ASSERT
+    assert sorted(path.name for path in tmp_path.iterdir()) == names[1:]
+    status = client.get("/admin/profiling", headers=ADMIN).json
+    assert status["profiles"] == names[:0:-1]
+
+
+def test_sampled_requests_share_one_sampler_thread() -> None:
+    """Threads recorded at the same time are sampled by the same thread."""
+    # ARRANGE
+    sampler = profiling.StackSampler()
+    started, release = threading.Barrier(3), threading.Event()
+    recordings: list[profiling.StackRecording] = []
+
+    def record() -> None:
+        with sampler.record(threading.get_ident()) as recording:
+            started.wait()
+            release.wait()
+        recordings.append(recording)
+
+    threads = [threading.Thread(target=record) for _ in range(2)]
+    # ACT
+    for thread in threads:
+        thread.start()
+    started.wait()
+    time.sleep(0.05)
+    samplers = [
+        thread for thread in threading.enumerate() if thread.name == "request-profiler"
+    ]
+    release.set()
+    for thread in threads:
+        thread.join()
+    # ASSERT
+    assert len(samplers) == 1
+    assert all(recording.samples for recording in recordings)
@@ -0,0 +1,82 @@
+"""Confirm SQL statements are counted and timed per endpoint and fingerprint."""
+
+import flask
+import prometheus_client
+import pytest
+from flask import app as flask_app
+from flask.testing import FlaskClient
+from aloysius_parker import main
+from aloysius_parker.extensions.query_metrics import fingerprint
+
+USER_ENDPOINT: str = "user.UserEndpoint"
+GET_USER: str = "SELECT ... FROM users WHERE users.id = ?"
+
+
+# region Fixtures and helper functions
+@pytest.fixture()
+def app() -> flask_app.Flask:
+    """Create a test fixture Flask application."""
+    test_app = main.create_app()
+    test_app.config["TESTING"] = True  # so we get better error messages.
+    return test_app
+
+
+def sample(name: str, **labels: str) -> float:
+    """Return the current value of a metric, 0 if it has not been recorded."""
+    return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+# endregion
+
+
+@pytest.mark.parametrize(
+    ("statement", "expected"),
+    [
+        ("SELECT users.id,\n  users.name FROM users WHERE users.id = ?", GET_USER),
+        (
+            "SELECT messages.id FROM messages WHERE messages.id IN (?, ?, ?) LIMIT 10",
+            "SELECT ... FROM messages WHERE messages.id IN (?) LIMIT ?",
+        ),
+        (
+            "INSERT INTO users (id, name) VALUES (?, ?), (?, ?), (?, ?)",
+            "INSERT INTO users (id, name) VALUES (?)",
+        ),
+        (
+            "UPDATE users SET name='O''Neil' WHERE id = 7",
+            "UPDATE users SET name=? WHERE id = ?",
+        ),
+    ],
+)
+def test_fingerprint_is_the_same_for_every_call(statement: str, expected: str) -> None:
+    """Literals, lists of values and selected columns do not split a fingerprint."""
+    # ACT
+    result = fingerprint(statement)
+    # ASSERT
+    assert result == expected
+
+
+def test_statements_are_recorded_against_the_endpoint(client: FlaskClient) -> None:
+    """Each request counts its statements under its endpoint."""
+    # ARRANGE
+    user_id = client.post(
+        "/users", json={"name": "Adam", "email": "adam@gmail.com"}
+    ).json["id"]
+    url = flask.url_for(USER_ENDPOINT, user_id=user_id)
+    statements = sample(
+        "sql_statements_total", endpoint=USER_ENDPOINT, fingerprint=GET_USER
+    )
+    requests = sample("sql_statements_per_request_count", endpoint=USER_ENDPOINT)
+    # ACT
+    client.get(url)
+    # ASSERT
+    assert (
+        sample("sql_statements_total", endpoint=USER_ENDPOINT, fingerprint=GET_USER)
+        == statements + 1
+    )
+    assert sample(
+        "sql_statement_seconds_count", endpoint=USER_ENDPOINT, fingerprint=GET_USER
+    )
+    assert (
+        sample("sql_statements_per_request_count", endpoint=USER_ENDPOINT)
+        == requests + 1
+    )
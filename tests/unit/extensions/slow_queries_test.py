@@ -0,0 +1,94 @@
+"""Confirm slow statements are logged with their plans and redacted parameters."""
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from flask import app as flask_app
+from flask.testing import FlaskClient
+from sqlalchemy import text
+from aloysius_parker import main
+from aloysius_parker.database.db import database
+from aloysius_parker.extensions import slow_queries
+
+ADMIN_TOKEN: str = "let-me-in"
+
+
+# region Fixtures and helper functions
+@pytest.fixture()
+def app(monkeypatch: MonkeyPatch) -> flask_app.Flask:
+    """Create a test fixture Flask application logging every statement as slow."""
+    monkeypatch.setenv("SLOW_QUERY_SECONDS", "0")
+    monkeypatch.setenv("ADMIN_TOKEN", ADMIN_TOKEN)
+    test_app = main.create_app()
+    test_app.config["TESTING"] = True  # so we get better error messages.
+    return test_app
+
+
+def slow_queries_log(client: FlaskClient) -> list[dict]:
+    """Read the slow query log through the admin endpoint."""
+    headers = {"Authorization": f"Bearer {ADMIN_TOKEN}"}
+    return client.get("/admin/slow-queries", headers=headers).json
+
+
+# endregion
+
+
+def test_slow_inbox_read_is_logged_with_its_plan(client: FlaskClient) -> None:
+    """The log holds the endpoint, the ID parameter and the index the plan uses."""
+    # ARRANGE
+    user_id = client.post(
+        "/users", json={"name": "Adam", "email": "adam@gmail.com"}
+    ).json["id"]
+    # ACT
+    client.get(f"/user/{user_id}/messages")
+    # ASSERT
+    entry = next(
+        entry
+        for entry in slow_queries_log(client)
+        if entry["endpoint"] == "user.UserMessagesEndpoint"
+    )
+    assert user_id in entry["parameters"]
+    assert any("ix_messages_recipient_timestamp_id" in step for step in entry["plan"])
+    assert not entry["full_scan"]
+
+
+def test_full_scan_of_messages_is_flagged(app: flask_app.Flask) -> None:
+    """A statement reading every message is flagged and its text is redacted."""
+    # ACT
+    database.session.execute(
+        text("SELECT id FROM messages WHERE content = :content"),
+        {"content": "my secret"},
+    )
+    # ASSERT
+    entry = app.extensions["slow_queries"].entries()[0]
+    assert entry["full_scan"]
+    assert entry["parameters"] == [slow_queries.REDACTED]
+
+
+@pytest.mark.parametrize(
+    ("step", "full_scan"),
+    [
+        ("SCAN messages", True),
+        ("SCAN messages USING INDEX ix_messages_timestamp_id", True),
+        ("SCAN messages USING COVERING INDEX ix_messages_timestamp_id", True),
+        ("SEARCH messages USING INDEX ix_messages_recipient_timestamp_id", False),
+        ("SCAN messages_fts VIRTUAL TABLE INDEX 0:M3", False),
+        ("SCAN users", False),
+    ],
+)
+def test_every_scan_of_messages_is_flagged(step: str, full_scan: bool) -> None:
+    """Scanning messages through an index still reads every row."""
+    # ACT
+    flagged: bool = slow_queries.is_full_scan(["USE TEMP B-TREE FOR ORDER BY", step])
+    # ASSERT
+    assert flagged == full_scan
+
+
+def test_ring_buffer_keeps_the_latest() -> None:
+    """Only the most recent entries are kept, newest first."""
+    # ARRANGE
+    log = slow_queries.SlowQueryLog(threshold=0, capacity=2)
+    # ACT
+    for number in range(3):
+        log.record(f"SELECT {number}", (), 1.0)
+    # ASSERT
+    assert [entry["statement"] for entry in log.entries()] == ["SELECT 2", "SELECT 1"]
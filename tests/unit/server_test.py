@@ -0,0 +1,93 @@
+"""Confirm gunicorn is sized from the CPUs and workers replace inherited connections."""
+
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from flask import Flask
+from aloysius_parker import server
+from aloysius_parker.database.db import database
+
+
+# region Fixtures and helper functions
+def forked_worker(flask_api: Flask, preload_app: bool = True) -> tuple:
+    """Return stand ins for the gunicorn arbiter and a worker serving the app."""
+    arbiter = SimpleNamespace(cfg=SimpleNamespace(preload_app=preload_app))
+    worker = SimpleNamespace(app=SimpleNamespace(wsgi=lambda: flask_api))
+    return arbiter, worker
+
+
+def database_app(uri: str) -> Flask:
+    """Create a bare Flask app using the database at the URI."""
+    flask_api = Flask(__name__)
+    flask_api.config["SQLALCHEMY_DATABASE_URI"] = uri
+    database.init_app(flask_api)
+    return flask_api
+
+
+# endregion
+
+
+@pytest.mark.parametrize(
+    ("worker_class", "workers", "threads"), [("sync", 9, 1), ("gthread", 5, 8)]
+)
+def test_sized_from_cpu_count(worker_class: str, workers: int, threads: int) -> None:
+    """Workers and threads follow the CPU count unless they are given."""
+    # ACT
+    sized: dict = server.options(worker_class, cpu_count=4)
+    given: dict = server.options(worker_class, workers=2, threads=3, cpu_count=4)
+    # ASSERT
+    assert (sized["workers"], sized["threads"]) == (workers, threads)
+    assert (given["workers"], given["threads"]) == (2, 3)
+    assert sized["preload_app"]
+
+
+def test_pool_sized_from_threads(monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    """Every thread of a worker can hold a connection, unless the pool is given."""
+    # ARRANGE
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'aloysius.db'}")
+    for variable in server.pool_settings(0):
+        monkeypatch.setenv(variable, "")
+        monkeypatch.delenv(variable)
+    settings: dict = server.options("gthread", threads=24, cpu_count=4)
+    # ACT
+    sized: Flask = server.Server(settings).load()
+    monkeypatch.setenv("DATABASE_POOL_SIZE", "3")
+    given: Flask = server.Server(settings).load()
+    # ASSERT
+    with sized.app_context():
+        assert database.engine.pool.size() == 24
+        assert database.engine.pool._max_overflow == 24
+    with given.app_context():
+        assert database.engine.pool.size() == 3
+
+
+def test_worker_disposes_inherited_connections(tmp_path: Path) -> None:
+    """After a preloaded fork the worker's engine gets a fresh pool."""
+    # ARRANGE
+    flask_api = database_app(f"sqlite:///{tmp_path / 'aloysius.db'}")
+    with flask_api.app_context():
+        inherited = database.engine.pool
+    # ACT
+    server.post_fork(*forked_worker(flask_api))
+    # ASSERT
+    with flask_api.app_context():
+        assert database.engine.pool is not inherited
+
+
+@pytest.mark.parametrize(
+    ("uri", "preload_app"),
+    [("sqlite:///:memory:", True), ("sqlite:///{tmp_path}/aloysius.db", False)],
+)
+def test_connections_are_kept(uri: str, preload_app: bool, tmp_path: Path) -> None:
+    """In-memory databases, and apps loaded after the fork, keep their pool."""
+    # ARRANGE
+    flask_api = database_app(uri.format(tmp_path=tmp_path))
+    with flask_api.app_context():
+        inherited = database.engine.pool
+    # ACT
+    server.post_fork(*forked_worker(flask_api, preload_app))
+    # ASSERT
+    with flask_api.app_context():
+        assert database.engine.pool is inherited
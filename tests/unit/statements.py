@@ -0,0 +1,25 @@
+"""Capture the SQL statements sent to the database, to count or explain them."""
+
+import contextlib
+from typing import Generator
+
+from sqlalchemy import Engine, event
+
+
+@contextlib.contextmanager
+def capture_statements(engine: Engine) -> Generator[list[tuple], None, None]:
+    """Collect each (statement, parameters) executed on the engine in the block.
+
+    Transaction control such as BEGIN and COMMIT is not included.
+    """
+    statements: list[tuple] = []
+
+    def capture(conn, cursor, statement, parameters, *_):
+        """Record the statement as it is sent to the database."""
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)